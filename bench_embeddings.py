@@ -0,0 +1,93 @@
+# bench_embeddings.py
+"""
+Throughput and retrieval agreement of the embedding backends on the chunks in
+the aks_chunks collection. PyTorch (SentenceTransformer) is the baseline; each
+ONNX variant reports docs/sec and recall@k of its top-k against the baseline's
+top-k for the same queries.
+
+    python embeddings.py                          # export onnx_models/<model> once
+    python bench_embeddings.py --limit 5000 --k 10
+"""
+import time
+import argparse
+
+import numpy as np
+
+import embeddings
+from embed_index_events import COL_NAME, get_collection
+
+
+def load_docs(limit: int):
+    got = get_collection().get(limit=limit, include=["documents"])
+    return [d for d in got["documents"] if d]
+
+
+def query_texts(docs, n: int, seed: int = 7):
+    """Short, realistic queries: the MESSAGE (or raw text) of a sampled chunk's first line."""
+    rnd = np.random.default_rng(seed)
+    picks = rnd.choice(len(docs), size=min(n, len(docs)), replace=False)
+    out = []
+    for i in picks:
+        line = docs[i].splitlines()[0]
+        out.append(line.split("MESSAGE=", 1)[-1].strip() or line)
+    return out
+
+
+def top_k(doc_vecs, query_vecs, k: int):
+    d = doc_vecs / np.clip(np.linalg.norm(doc_vecs, axis=1, keepdims=True), 1e-12, None)
+    q = query_vecs / np.clip(np.linalg.norm(query_vecs, axis=1, keepdims=True), 1e-12, None)
+    sims = q @ d.T
+    k = min(k, d.shape[0])
+    part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    return [set(row) for row in part]
+
+
+def run(name, model, docs, queries, batch_size: int):
+    model.encode(docs[:batch_size], batch_size=batch_size)  # warm-up: graph init, allocator
+    started = time.perf_counter()
+    doc_vecs = model.encode(docs, batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    query_vecs = model.encode(queries, batch_size=batch_size)
+    print(f"{name:<12} {len(docs):>8,} docs  {elapsed:8.2f}s  {len(docs) / elapsed:>10,.1f} docs/sec")
+    return np.asarray(doc_vecs), np.asarray(query_vecs), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=embeddings.DEFAULT_MODEL)
+    parser.add_argument("--limit", type=int, default=2000, help="Chunks read from the collection")
+    parser.add_argument("--queries", type=int, default=200, help="Queries sampled from those chunks")
+    parser.add_argument("--k", type=int, default=10, help="Recall@k against the torch top-k")
+    parser.add_argument("--batch_size", type=int, default=64)
+    args = parser.parse_args()
+
+    docs = load_docs(args.limit)
+    if not docs:
+        print(f"[ERROR] No documents in {COL_NAME}; run embed_index_events.py first")
+        return
+    queries = query_texts(docs, args.queries)
+    print(f"[INFO] {args.model}: {len(docs):,} chunks, {len(queries)} queries, k={args.k}")
+
+    base_docs, base_queries, base_time = run(
+        "torch", embeddings.load_model(args.model, "torch"), docs, queries, args.batch_size
+    )
+    baseline = top_k(base_docs, base_queries, args.k)
+
+    export = embeddings.onnx_dir(args.model)
+    if not (export / "export.json").exists():
+        embeddings.export_onnx(args.model, export)
+
+    for label, quantized in (("onnx fp32", False), ("onnx int8", True)):
+        model = embeddings.OnnxEncoder(export, quantized=quantized)
+        doc_vecs, query_vecs, elapsed = run(label, model, docs, queries, args.batch_size)
+        hits = top_k(doc_vecs, query_vecs, args.k)
+        recall = np.mean([len(a & b) / len(b) for a, b in zip(hits, baseline)])
+        cos = np.mean(
+            (doc_vecs * base_docs).sum(axis=1)
+            / np.clip(np.linalg.norm(doc_vecs, axis=1) * np.linalg.norm(base_docs, axis=1), 1e-12, None)
+        )
+        print(f"{'':<12} speedup x{base_time / elapsed:.2f}  recall@{args.k} {recall:.4f}  mean cos vs torch {cos:.4f}")
+
+
+if __name__ == "__main__":
+    main()
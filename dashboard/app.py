@@ -2,18 +2,15 @@
 import streamlit as st
 import requests
 import json
+import time
 import pandas as pd
 from pathlib import Path
 from db import init_db, save_history, load_history
-import re
-
-def extract_reason(raw):
-    if not raw:
-        return ""
-    match = re.search(r"REASON=([A-Za-z0-9_-]+)", raw)
-    return match.group(1) if match else ""
+from helpers import facet_counts
 
 API_URL = "http://localhost:8001"
+TIME_WINDOWS = {"All time": None, "Last hour": 3600, "Last 6 hours": 6 * 3600,
+                "Last 24 hours": 24 * 3600, "Last 7 days": 7 * 24 * 3600}
 
 # ---------------------------------------------------------
 # Streamlit Setup
@@ -124,26 +121,37 @@ with st.sidebar:
     st.header("🔍 Filters")
 
     with st.expander("Basic Filters", expanded=True):
-        ns_filter = st.text_input(
+        # Options come from the pre-aggregated /facets counts (no collection scan)
+        ns_counts = facet_counts("namespaces")
+        pod_counts = facet_counts("pods", st.session_state.get("ns_filter", ""))
+        reason_counts = facet_counts("reasons")
+        for key, counts in (("ns_filter", ns_counts), ("pod_filter", pod_counts), ("reason_filter", reason_counts)):
+            if st.session_state.get(key) not in counts:
+                st.session_state[key] = ""
+
+        def with_count(counts):
+            return lambda name: f"{name} ({counts[name]:,})" if name else "All"
+
+        ns_filter = st.selectbox(
             "Namespace",
-            value=st.session_state.get("ns_filter", ""),
-            placeholder="e.g. kube-system",
+            [""] + list(ns_counts),
+            format_func=with_count(ns_counts),
             on_change=auto_refresh,
             key="ns_filter",
         )
 
-        pod_filter = st.text_input(
+        pod_filter = st.selectbox(
             "Pod Name",
-            value=st.session_state.get("pod_filter", ""),
-            placeholder="Search pod",
+            [""] + list(pod_counts),
+            format_func=with_count(pod_counts),
             on_change=auto_refresh,
             key="pod_filter",
         )
 
-        reason_filter = st.text_input(
+        reason_filter = st.selectbox(
             "Reason",
-            value=st.session_state.get("reason_filter", ""),
-            placeholder="Warning / FailedScheduling / BackOff",
+            [""] + list(reason_counts),
+            format_func=with_count(reason_counts),
             on_change=auto_refresh,
             key="reason_filter",
         )
@@ -152,14 +160,32 @@ with st.sidebar:
         search_text = st.text_input(
             "Vector Search",
             value=st.session_state.get("search_text", ""),
-            placeholder="Search log content using embeddings...",
+            placeholder="Search log content or an exact reason (e.g. OOMKilled)...",
             on_change=auto_refresh,
             key="search_text",
         )
+        st.selectbox(
+            "Search mode", ["hybrid", "vector", "lexical"],
+            key="search_mode",
+            on_change=auto_refresh,
+            help="hybrid fuses exact reason/message matches with embedding similarity",
+        )
+        st.slider(
+            "Min severity", 0, 10, 0,
+            key="min_severity",
+            on_change=auto_refresh,
+            help="Skip chunks whose severity_hint is lower (0 = no filter)",
+        )
+        st.selectbox(
+            "Time window", list(TIME_WINDOWS),
+            key="time_window",
+            on_change=auto_refresh,
+            help="Only chunks with timestamps overlapping the window (log incidents)",
+        )
 
     with st.expander("Sorting & Pagination"):
         sort_by = st.selectbox(
-            "Sort By", ["start_ts", "namespace", "pod", "severity_hint", "id"],
+            "Sort By", ["start_ts", "relevance", "namespace", "pod", "severity_hint", "id"],
             key="sort_by",
         )
 
@@ -184,6 +210,12 @@ def fetch_logs():
         "pod": st.session_state.get("pod_filter") or None,
         "reason": st.session_state.get("reason_filter") or None,
         "q": st.session_state.get("search_text") or None,
+        "mode": st.session_state.get("search_mode") or None,
+        "min_severity": st.session_state.get("min_severity") or None,
+        "since": (
+            time.time() - TIME_WINDOWS[st.session_state["time_window"]]
+            if TIME_WINDOWS.get(st.session_state.get("time_window")) else None
+        ),
         "sort_by": st.session_state.get("sort_by"),
         "order": st.session_state.get("order"),
         "limit": int(st.session_state.get("limit")),
@@ -203,6 +235,39 @@ def fetch_logs():
         return {"count": 0, "items": []}
 
 
+# ---------------------------------------------------------
+# Stream diagnosis (Server-Sent Events)
+# ---------------------------------------------------------
+def iter_sse(resp):
+    """Yield (event, data) pairs from a text/event-stream response."""
+    event = "message"
+    for line in resp.iter_lines(decode_unicode=True):
+        if not line:
+            event = "message"
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:"):].strip())
+
+
+def stream_diagnosis(payload):
+    """Yield (event, data) pairs from POST /diagnose/stream."""
+    with requests.post(
+        f"{API_URL}/diagnose/stream", json=payload, stream=True, timeout=(10, 180)
+    ) as resp:
+        resp.raise_for_status()
+        yield from iter_sse(resp)
+
+
+def stream_batch(batch_id):
+    """Yield (event, data) pairs from GET /diagnose/batch/{batch_id}/stream."""
+    with requests.get(
+        f"{API_URL}/diagnose/batch/{batch_id}/stream", stream=True, timeout=(10, 600)
+    ) as resp:
+        resp.raise_for_status()
+        yield from iter_sse(resp)
+
+
 # ---------------------------------------------------------
 # Load logs
 # ---------------------------------------------------------
@@ -234,6 +299,7 @@ for it in items:
         "node": meta.get("node", ""),
         "reason": meta.get("reason", ""),
         "severity_hint": meta.get("severity_hint", ""),
+        "copies": meta.get("dup_count") or 1,
         "raw_doc": doc,
         "full_meta": meta,
     })
@@ -242,11 +308,11 @@ for it in items:
 # ---------------------------------------------------------
 # Display table
 # ---------------------------------------------------------
-st.subheader(f"Logs ({logs_resp['count']}) — Select a row to diagnose")
+st.subheader(f"Logs ({logs_resp['count']}) — Select rows to diagnose")
 
 df = pd.DataFrame(rows)[[
     "Select", "id", "timestamp", "namespace",
-    "message", "pod", "node", "reason", "severity_hint",
+    "message", "pod", "node", "reason", "severity_hint", "copies",
 ]]
 
 table = st.data_editor(
@@ -263,6 +329,52 @@ if selected_rows.empty:
     st.info("Select a log above to view details.")
     st.stop()
 
+# ---------------------------------------------------------
+# Batch diagnosis (several rows selected)
+# ---------------------------------------------------------
+if len(selected_rows) > 1:
+    batch_ids = list(selected_rows["id"])
+    if st.button(f"Diagnose {len(batch_ids)} Selected Logs", width="stretch"):
+        st.subheader("Batch Diagnosis")
+        try:
+            resp = requests.post(f"{API_URL}/diagnose/batch", json={"chunk_ids": batch_ids}, timeout=60)
+            resp.raise_for_status()
+            batch = resp.json()
+        except Exception as e:
+            st.error(f"Batch diagnosis failed: {e}")
+            st.stop()
+
+        # several rows can share one job (identical evidence); errors come back per row
+        job_rows = {}
+        for row in batch["jobs"]:
+            if row["job_id"] is None:
+                st.error(f"{row['chunk_id']}: {row['error']}")
+            else:
+                job_rows.setdefault(row["job_id"], []).append(row["chunk_id"])
+
+        progress = st.progress(0.0, text=f"0/{len(job_rows)} diagnoses")
+        finished = 0
+        try:
+            for event, data in stream_batch(batch["batch_id"]):
+                if event != "job":
+                    continue
+                finished += 1
+                progress.progress(finished / len(job_rows), text=f"{finished}/{len(job_rows)} diagnoses")
+                chunk_ids = job_rows.get(data["job_id"], [])
+                with st.expander(", ".join(chunk_ids), expanded=finished == 1):
+                    if data["status"] == "error":
+                        st.error(f"Diagnosis failed: {data.get('error')}")
+                        continue
+                    st.markdown(data["diagnosis"] or "No diagnosis returned.")
+                    if data.get("cached"):
+                        st.caption("Served from the diagnosis cache")
+                if data["diagnosis"]:
+                    for cid in chunk_ids:
+                        save_history(cid, data["diagnosis"])
+        except Exception as e:
+            st.error(f"Batch diagnosis failed: {e}")
+    st.stop()
+
 selected_id = selected_rows.iloc[0]["id"]
 selected_row = next(r for r in rows if r["id"] == selected_id)
 
@@ -281,20 +393,35 @@ st.json(selected_row["full_meta"])
 # Diagnose
 # ---------------------------------------------------------
 if st.button("Diagnose Selected Log", width="stretch"):
-    with st.spinner("Running analysis…"):
-        try:
-            payload = {"chunk_id": selected_id}
-            resp = requests.post(f"{API_URL}/diagnose", json=payload, timeout=180)
-            resp.raise_for_status()
-            data = resp.json()
-
-            st.subheader("Diagnosis Result")
-            st.markdown(data.get("diagnosis", "No diagnosis returned."))
+    st.subheader("Diagnosis Result")
+    placeholder = st.empty()
+    placeholder.info("Running analysis…")
+    diagnosis = ""
+    packed = None
+    try:
+        for event, data in stream_diagnosis({"chunk_id": selected_id}):
+            if event == "error":
+                st.error(f"Diagnosis failed: {data.get('detail')}")
+                break
+            if event == "done":
+                diagnosis = data.get("diagnosis", diagnosis)
+                packed = data.get("packed")
+            else:
+                diagnosis += data.get("token", "")
+                placeholder.markdown(diagnosis + "▌")
+
+        placeholder.markdown(diagnosis or "No diagnosis returned.")
+        if packed:
+            st.caption(
+                f"Evidence sent: {packed['items']}/{packed['items_available']} items, "
+                f"{packed['tokens']}/{packed['budget']} tokens"
+            )
 
-            save_history(selected_id, data.get("diagnosis", ""))
+        if diagnosis:
+            save_history(selected_id, diagnosis)
 
-        except Exception as e:
-            st.error(f"Diagnosis failed: {e}")
+    except Exception as e:
+        st.error(f"Diagnosis failed: {e}")
 
 
 # ---------------------------------------------------------
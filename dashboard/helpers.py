@@ -1,14 +1,34 @@
-import chromadb
+import requests
 
-CHROMA_PATH = "../chroma_store"
+API_URL = "http://localhost:8001"
 
-client = chromadb.PersistentClient(path=CHROMA_PATH)
-collection = client.get_collection("aks_chunks")
+# Last /facets response and its ETag: re-polled on every rerun, but the API
+# answers 304 (no body) until the indexer changes the counts.
+_facets = {"etag": None, "body": None}
 
-def load_namespaces():
-    metas = collection.get(include=["metadatas"])["metadatas"]
-    return sorted(set(m.get("namespace") for m in metas if m.get("namespace")))
 
-def load_pods(namespace: str):
-    metas = collection.get(include=["metadatas"])["metadatas"]
-    return sorted(set(m.get("pod") for m in metas if m.get("namespace") == namespace and m.get("pod")))
+def load_facets():
+    headers = {"If-None-Match": _facets["etag"]} if _facets["etag"] else {}
+    try:
+        resp = requests.get(f"{API_URL}/facets", headers=headers, timeout=10)
+        if resp.status_code != 304:
+            resp.raise_for_status()
+            _facets.update(etag=resp.headers.get("ETag"), body=resp.json())
+    except Exception as e:
+        print(f"[WARN] /facets unavailable: {e}")
+    return _facets["body"] or {"total": 0, "namespaces": [], "pods": {}, "reasons": [], "severity": []}
+
+
+def facet_counts(kind: str, namespace: str = ""):
+    """name -> chunk count, for labelling dropdown options."""
+    facets = load_facets()
+    if kind == "pods":
+        items = facets["pods"].get(namespace, []) if namespace else [
+            p for ns_pods in facets["pods"].values() for p in ns_pods
+        ]
+    else:
+        items = facets[kind]
+    counts = {}
+    for f in items:
+        counts[f["name"]] = counts.get(f["name"], 0) + f["count"]
+    return counts
@@ -0,0 +1,128 @@
+# diagnosis_cache.py
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+
+
+def diagnosis_fingerprint(evidence, payload: dict) -> str:
+    """
+    Hash of everything that determines an LLM answer: evidence ids and text,
+    the rendered prompt messages (template included), model and sampling params.
+    """
+    key = {
+        "evidence": [[e["id"], e["doc"]] for e in evidence],
+        "messages": payload.get("messages"),
+        "model": payload.get("model"),
+        "temperature": payload.get("temperature"),
+        "max_tokens": payload.get("max_tokens"),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class DiagnosisCache:
+    """SQLite-backed fingerprint -> LLM output cache with size and age eviction."""
+
+    def __init__(self, path: Path, max_entries: int = 5000, max_age: float = 7 * 24 * 3600):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_llm_seconds = 0.0
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def _init_db(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS diagnosis_cache (
+            fingerprint TEXT PRIMARY KEY,
+            kind TEXT,
+            response TEXT,
+            llm_seconds REAL,
+            created_ts REAL,
+            last_hit_ts REAL,
+            hits INTEGER DEFAULT 0
+        )
+        """)
+        conn.commit()
+        conn.close()
+
+    def get(self, fingerprint: str):
+        """Return the cached response text, or None on a miss or expired entry."""
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT response, llm_seconds, created_ts FROM diagnosis_cache WHERE fingerprint = ?",
+            (fingerprint,)
+        ).fetchone()
+
+        if row is not None and now - row[2] > self.max_age:
+            conn.execute("DELETE FROM diagnosis_cache WHERE fingerprint = ?", (fingerprint,))
+            conn.commit()
+            row = None
+
+        if row is None:
+            conn.close()
+            with self._lock:
+                self.misses += 1
+            return None
+
+        conn.execute(
+            "UPDATE diagnosis_cache SET last_hit_ts = ?, hits = hits + 1 WHERE fingerprint = ?",
+            (now, fingerprint)
+        )
+        conn.commit()
+        conn.close()
+
+        with self._lock:
+            self.hits += 1
+            self.saved_llm_seconds += row[1] or 0.0
+        return row[0]
+
+    def put(self, fingerprint: str, kind: str, response: str, llm_seconds: float):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO diagnosis_cache "
+            "(fingerprint, kind, response, llm_seconds, created_ts, last_hit_ts, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0)",
+            (fingerprint, kind, response, llm_seconds, now, now)
+        )
+        self._evict(conn, now)
+        conn.commit()
+        conn.close()
+
+    def _evict(self, conn, now: float):
+        # age first, then least-recently-hit entries beyond max_entries
+        conn.execute("DELETE FROM diagnosis_cache WHERE created_ts < ?", (now - self.max_age,))
+        conn.execute("""
+            DELETE FROM diagnosis_cache WHERE fingerprint IN (
+                SELECT fingerprint FROM diagnosis_cache
+                ORDER BY last_hit_ts DESC
+                LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        entries = conn.execute("SELECT COUNT(*) FROM diagnosis_cache").fetchone()[0]
+        conn.close()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "max_age": self.max_age,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "saved_llm_seconds": round(self.saved_llm_seconds, 2),
+            }
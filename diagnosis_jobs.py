@@ -0,0 +1,196 @@
+# diagnosis_jobs.py
+import time
+import uuid
+import asyncio
+
+
+class QueueFullError(Exception):
+    """Raised when a batch does not fit in the bounded job queue."""
+
+
+class DiagnosisJob:
+    """One LLM generation, shared by every batch item that coalesced onto it."""
+
+    def __init__(self, fingerprint: str, evidence, payload: dict, extra: dict, kind: str = "diagnose"):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fingerprint = fingerprint
+        self.evidence = evidence
+        self.payload = payload
+        self.extra = extra
+        self.status = "queued"  # queued -> running -> done | error
+        self.result = None
+        self.cached = False
+        self.error = None
+        self.requests = 1
+        self.created_ts = time.time()
+        self.started_ts = None
+        self.finished_ts = None
+        self.done = asyncio.Event()
+
+    def finish(self, result: str = None, cached: bool = False, error: str = None):
+        self.status = "error" if error is not None else "done"
+        self.result, self.cached, self.error = result, cached, error
+        self.finished_ts = time.time()
+        # evidence/prompt are only needed to generate; the result keeps its own copy
+        self.payload = None
+        self.done.set()
+
+    def to_dict(self) -> dict:
+        out = {
+            "job_id": self.id,
+            "status": self.status,
+            "requests": self.requests,
+            "created_ts": self.created_ts,
+            "started_ts": self.started_ts,
+            "finished_ts": self.finished_ts,
+        }
+        if self.status == "done":
+            out.update({"diagnosis": self.result, **self.extra, "cached": self.cached})
+        elif self.status == "error":
+            out["error"] = self.error
+        return out
+
+
+class JobQueue:
+    """
+    Bounded asyncio queue of diagnosis generations drained by a fixed pool of
+    workers, each running `run(job) -> text` (which goes through LLMClient).
+    /diagnose/batch items and /diagnose/incident map prompts share it.
+
+    Jobs are keyed by the diagnosis fingerprint: evidence + prompt that is
+    already queued or running is coalesced onto the existing job instead of
+    starting a second generation. Jobs live in memory (one API process) and
+    are kept for `retention` seconds after finishing so callers can poll them.
+    """
+
+    def __init__(self, run, workers: int = 1, max_queued: int = 200, retention: float = 3600.0):
+        self._run = run
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self._queue = None
+        self._tasks = []
+        self._jobs = {}
+        self._inflight = {}  # fingerprint -> queued/running job
+        self._batches = {}  # batch id -> (created_ts, [job ids])
+        self.generated = 0
+        self.coalesced = 0
+
+    def _ensure_workers(self):
+        # Created lazily so the queue and workers live on the serving event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queued)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status, job.started_ts = "running", time.time()
+            try:
+                job.finish(await self._run(job))
+                self.generated += 1
+            except asyncio.CancelledError:
+                job.finish(error="cancelled: API shutting down")
+                raise
+            except Exception as e:
+                job.finish(error=getattr(e, "detail", None) or str(e) or type(e).__name__)
+            finally:
+                self._inflight.pop(job.fingerprint, None)
+                self._queue.task_done()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for jid in [j.id for j in self._jobs.values() if j.finished_ts and j.finished_ts < cutoff]:
+            del self._jobs[jid]
+        for bid in [b for b, (ts, _) in self._batches.items() if ts < cutoff]:
+            del self._batches[bid]
+
+    def submit_batch(self, specs):
+        """
+        specs: list of dicts with kind, fingerprint, evidence, payload, extra
+        and cached (a diagnosis-cache hit, or None to generate; force_refresh
+        callers pass None); None entries are skipped. Returns
+        (batch_id, [(job, coalesced) or None per spec]).
+        Nothing is enqueued if the new generations do not all fit.
+        """
+        self._ensure_workers()
+        self._prune()
+
+        plan, fresh = [], {}
+        for spec in specs:
+            if spec is None:
+                plan.append(None)
+                continue
+            fp = spec["fingerprint"]
+            existing = self._inflight.get(fp) or fresh.get(fp)
+            if existing is not None:
+                existing.requests += 1
+                self.coalesced += 1
+                plan.append((existing, True))
+                continue
+            job = DiagnosisJob(fp, spec["evidence"], spec["payload"], spec["extra"], spec["kind"])
+            if spec.get("cached") is not None:
+                job.finish(spec["cached"], cached=True)
+            else:
+                fresh[fp] = job
+            plan.append((job, False))
+
+        free = self.max_queued - self._queue.qsize()
+        if len(fresh) > free:
+            # undo the coalescing counts taken above
+            for entry in plan:
+                if entry and entry[1]:
+                    entry[0].requests -= 1
+                    self.coalesced -= 1
+            raise QueueFullError(f"{len(fresh)} new jobs but only {free} of {self.max_queued} queue slots free")
+
+        for job in fresh.values():
+            self._inflight[job.fingerprint] = job
+            self._queue.put_nowait(job)
+        for entry in plan:
+            if entry:
+                self._jobs[entry[0].id] = entry[0]
+
+        batch_id = uuid.uuid4().hex
+        self._batches[batch_id] = (time.time(), [e[0].id for e in plan if e])
+        return batch_id, plan
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def batch(self, batch_id: str):
+        """Distinct jobs of a batch in submission order, or None if unknown/expired."""
+        entry = self._batches.get(batch_id)
+        if entry is None:
+            return None
+        jobs = [self._jobs[j] for j in dict.fromkeys(entry[1]) if j in self._jobs]
+        return jobs
+
+    async def as_completed(self, jobs):
+        """Yield `jobs` as they finish (already finished ones first)."""
+        async def wait(job):
+            await job.done.wait()
+            return job
+
+        for fut in asyncio.as_completed([wait(j) for j in jobs]):
+            yield await fut
+
+    def stats(self) -> dict:
+        by_status = {}
+        for job in self._jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queued": self.max_queued,
+            "jobs": by_status,
+            "generated": self.generated,
+            "coalesced": self.coalesced,
+        }
+
+    async def aclose(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks, self._queue = [], None
@@ -1,69 +1,406 @@
 # embed_index_events.py
+import os
 import json
+import time
+import argparse
+from itertools import islice
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
-import chromadb
+
+import numpy as np
+
+import embeddings
+import index_manifest
+import lexical_index
+import near_dup
+import vector_store
+from timestamps import to_epoch
 
 # ---- CONFIG ----
-MODEL_NAME = "sentence-transformers/paraphrase-MiniLM-L3-v2"  # Fast CPU embedding model
+MODEL_NAME = embeddings.DEFAULT_MODEL  # shared with rag_api.py (EMBED_MODEL)
 INPUT_FILE = Path("processed/event_chunks.jsonl")
 PERSIST_DIR = Path("chroma_store")
+VECTOR_BACKEND = vector_store.VECTOR_BACKEND  # chroma (default) | numpy, same env as rag_api.py
+COL_NAME = "aks_chunks"
+MANIFEST_PATH = index_manifest.MANIFEST_PATH  # sidecar next to chroma_store
+LEXICAL_PATH = lexical_index.LEXICAL_PATH  # BM25 inverted index over reason/message tokens
 BATCH_SIZE = 2000  # must be < 5461 limit
+CHROMA_MAX_BATCH = 5461
+ENCODE_BATCH_SIZE = 64  # sentences per forward pass
 
-# ---- Load Embedding Model ----
-print("[INFO] Loading embedding model:", MODEL_NAME)
-model = SentenceTransformer(MODEL_NAME)
 
-# ---- Initialize Chroma ----
-client = chromadb.PersistentClient(path=str(PERSIST_DIR))
-COL_NAME = "aks_chunks"
-collection = client.get_or_create_collection(name=COL_NAME)
+# ---- Load Embedding Model ----
+# Loaded inside index_chunks() rather than at import time: the multi-process
+# encode pool spawns workers that re-import this module.
+def load_model():
+    return embeddings.get_model(MODEL_NAME)
 
-def index_chunks():
-    if not INPUT_FILE.exists():
-        print(f"[ERROR] Missing: {INPUT_FILE}")
-        return
 
-    lines = INPUT_FILE.read_text().splitlines()
-    print(f"[INFO] Total Chunks: {len(lines)}")
+# ---- Initialize vector store ----
+def get_collection(backend: str = VECTOR_BACKEND):
+    return vector_store.open_collection(COL_NAME, backend, chroma_path=PERSIST_DIR)
 
-    # Split into batches to satisfy Chroma constraints
-    for batch_start in range(0, len(lines), BATCH_SIZE):
-        batch = lines[batch_start: batch_start + BATCH_SIZE]
 
-        ids, docs, embeddings, metas = [], [], [], []
+def recreate_collection(backend: str = VECTOR_BACKEND):
+    return vector_store.drop_collection(COL_NAME, backend, chroma_path=PERSIST_DIR)
 
-        print(f"[INFO] Processing batch {batch_start} → {batch_start + len(batch)}")
 
-        for i, line in enumerate(batch):
+def iter_chunks(path: Path):
+    """Lazily yield (line_no, entry, text) for every non-empty chunk in the JSONL file."""
+    with path.open("r", encoding="utf-8") as fh:
+        for line_no, line in enumerate(fh):
+            line = line.strip()
+            if not line:
+                continue
             entry = json.loads(line)
             text = entry.get("context_text", "").strip()
             if not text:
                 continue
+            yield line_no, entry, text
+
+
+def batched(iterable, size: int):
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def encode_texts(model, texts, encode_batch_size: int, pool=None):
+    if pool is not None:
+        return model.encode_multi_process(texts, pool, batch_size=encode_batch_size)
+    return model.encode(
+        texts,
+        batch_size=encode_batch_size,
+        show_progress_bar=False,
+        convert_to_numpy=True,
+    )
+
+
+def norm(s):
+    return s.strip().lower() if s else ""
+
+
+def to_severity(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def chunk_metadata(entry: dict) -> dict:
+    # Chroma metadata values must be scalars, so None becomes ""
+    namespace = entry.get("namespace") or ""
+    pod = entry.get("pod") or ""
+    reason = entry.get("reason") or ""
+    start_epoch = to_epoch(entry.get("start_ts") or "")
+    return {
+        "namespace": namespace,
+        "pod": pod,
+        "node": entry.get("node") or "",
+        "object": entry.get("object") or "",
+        "reason": reason,
+        "severity_hint": entry.get("severity_hint", ""),
+        "start_ts": entry.get("start_ts") or "",
+        "end_ts": entry.get("end_ts") or "",
+        # sub-chunks of one oversized group share parent_id, ordered by part
+        "parent_id": entry.get("parent_id") or entry.get("id") or "",
+        "part": entry.get("part", 1),
+        "parts": entry.get("parts", 1),
+        # near-duplicates collapsed into this chunk by --dedup (comma-separated ids);
+        # on a member stub, the representative whose vector it shares
+        "dup_count": 1 + len(entry.get("member_ids") or []),
+        "member_ids": ",".join(entry.get("member_ids") or []),
+        "dup_of": entry.get("dup_of") or "",
+        # numeric copies: severity and time-range filters become range predicates
+        # in the store (0 = unknown), and start_ts sorting is numeric
+        "severity": to_severity(entry.get("severity_hint")),
+        "start_epoch": start_epoch,
+        "end_epoch": to_epoch(entry.get("end_ts") or "") or start_epoch,
+        # lowercase copies so /logs equality filters run inside Chroma
+        "namespace_norm": norm(namespace),
+        "pod_norm": norm(pod),
+        "reason_norm": norm(reason),
+    }
+
+
+def chunk_row(cid: str, entry: dict, text: str):
+    """(id, text, metadata, content_hash, meta_hash) as written to the store and manifest."""
+    meta = chunk_metadata(entry)
+    return cid, text, meta, index_manifest.content_hash(text), index_manifest.meta_hash(meta)
+
+
+def stub_row(cid: str, entry: dict, text: str, rep: str, rep_hash: str):
+    """
+    chunk_row() of a --dedup member: its own text and metadata, stored with
+    its representative's vector. The hash covers the representative's, so a
+    re-embedded representative rewrites its stubs.
+    """
+    meta = chunk_metadata({**entry, "dup_of": rep})
+    return cid, text, meta, index_manifest.content_hash(f"{rep_hash}\n{text}"), index_manifest.meta_hash(meta)
+
+
+def sync_rows(collection, manifest, lex, source: str, rows, encode, record_all: bool = False, lex_all: bool = False,
+              vectors=None):
+    """
+    Write one batch of chunk_row() rows: new or re-worded chunks are embedded
+    with encode(texts) and upserted, metadata-only changes are updated in
+    place, unchanged chunks are skipped. record_all / lex_all re-record every
+    row in the manifest / lexical index (backfills). vectors(rows), when given,
+    supplies the vectors instead of encode (member stubs). Returns (to_embed, to_update).
+    """
+    known = index_manifest.lookup(manifest, [r[0] for r in rows])
+
+    to_embed, to_update = [], []
+    for row in rows:
+        cid, _, _, chash, mhash = row
+        prev = known.get(cid)
+        if prev is None or prev[0] != chash or prev[2] != MODEL_NAME:
+            to_embed.append(row)
+        elif prev[1] != mhash:
+            to_update.append(row)
+
+    if to_embed:
+        docs = [r[1] for r in to_embed]
+        embedded = vectors(to_embed) if vectors is not None else encode(docs)
+        collection.upsert(
+            ids=[r[0] for r in to_embed],
+            documents=docs,
+            embeddings=embedded.tolist(),
+            metadatas=[r[2] for r in to_embed]
+        )
+
+    # Same text, same model: only the metadata moved, no re-encode needed
+    if to_update:
+        collection.update(
+            ids=[r[0] for r in to_update],
+            metadatas=[r[2] for r in to_update]
+        )
+
+    index_manifest.record(
+        manifest,
+        source,
+        [(r[0], r[3], r[4], MODEL_NAME, r[2]) for r in (rows if record_all else to_embed + to_update)]
+    )
+    lexical_index.upsert(lex, [r[:3] for r in (rows if lex_all else to_embed + to_update)])
+    return to_embed, to_update
+
+
+def forget_ids(collection, manifest, lex, ids):
+    collection.delete(ids=ids)
+    index_manifest.forget(manifest, ids)
+    lexical_index.forget(lex, ids)
+
+
+def plan_dedup(input_file: Path, max_distance: int = near_dup.MAX_DISTANCE):
+    """First pass of --dedup: {representative id: [member ids]} over the whole input."""
+    started = time.perf_counter()
+    items = (
+        (entry.get("id", f"chunk_{line_no}"), entry.get("namespace") or "", entry.get("severity_hint"), text)
+        for line_no, entry, text in iter_chunks(input_file)
+    )
+    groups = near_dup.find_duplicates(items, max_distance)
+    collapsed = sum(len(m) for m in groups.values())
+    print(f"[INFO] Near-duplicates: {collapsed} chunks collapsed into {len(groups)} representatives "
+          f"({time.perf_counter() - started:.1f}s)")
+    return groups
 
-            vec = model.encode(text).tolist()
-
-            chunk_id = entry.get("id", f"chunk_{batch_start+i}")
-            ids.append(chunk_id)
-            docs.append(text)
-            embeddings.append(vec)
-
-            metas.append({
-                "namespace": entry.get("namespace", ""),
-                "object": entry.get("object", ""),
-                "severity_hint": entry.get("severity_hint", ""),
-            })
-
-        if ids:
-            collection.upsert(
-                ids=ids,
-                documents=docs,
-                embeddings=embeddings,
-                metadatas=metas
+
+def write_stubs(collection, manifest, lex, source: str, input_file: Path, rep_of: dict, rep_hashes: dict,
+                batch_size: int, record_all: bool = False, lex_all: bool = False):
+    """Second pass of --dedup, after the representatives are stored: sync every member stub."""
+    def rep_vectors(rows):
+        reps = [r[2]["dup_of"] for r in rows]
+        got = collection.get(ids=sorted(set(reps)), include=["embeddings"])
+        by_id = dict(zip(got["ids"], got["embeddings"]))
+        return np.asarray([by_id[rep] for rep in reps])
+
+    written = 0
+    for batch in batched(iter_chunks(input_file), batch_size):
+        rows = []
+        for line_no, entry, text in batch:
+            cid = entry.get("id", f"chunk_{line_no}")
+            if cid in rep_of:
+                rep = rep_of[cid]
+                rows.append(stub_row(cid, entry, text, rep, rep_hashes.get(rep, "")))
+        if rows:
+            to_embed, _ = sync_rows(collection, manifest, lex, source, rows, None,
+                                    record_all=record_all, lex_all=lex_all, vectors=rep_vectors)
+            written += len(to_embed)
+    return written
+
+
+def delete_stale(collection, manifest, lex, source: str, seen_ids, batch_size: int):
+    """Drop chunks previously indexed from `source` that are no longer in it."""
+    stale = sorted(index_manifest.all_ids(manifest, source) - seen_ids)
+    for part in batched(stale, batch_size):
+        forget_ids(collection, manifest, lex, part)
+    return len(stale)
+
+
+def index_chunks(
+    input_file: Path = INPUT_FILE,
+    batch_size: int = BATCH_SIZE,
+    encode_batch_size: int = ENCODE_BATCH_SIZE,
+    workers: int = 0,
+    full: bool = False,
+    vector_backend: str = VECTOR_BACKEND,
+    dedup: bool = False,
+    dedup_distance: int = near_dup.MAX_DISTANCE,
+):
+    if not input_file.exists():
+        print(f"[ERROR] Missing: {input_file}")
+        return
+
+    if batch_size >= CHROMA_MAX_BATCH:
+        raise ValueError(f"batch_size must be < {CHROMA_MAX_BATCH} (Chroma upsert limit)")
+
+    collection = get_collection(vector_backend)
+
+    # Vectors from two models are not comparable: switching models means a full rebuild
+    stamped, _ = embeddings.collection_model(collection)
+    if stamped and stamped != MODEL_NAME and not full:
+        print(f"[ERROR] {COL_NAME} was embedded with {stamped}; re-run with --full to re-embed with {MODEL_NAME}")
+        return
+
+    # --full rebuilds from scratch: rows the manifest no longer tracks (chunks
+    # gone from the input, other sources) would otherwise stay behind as orphans
+    if full and collection.count() > 0:
+        print(f"[INFO] Dropping {COL_NAME} ({collection.count()} rows, embedded with {stamped or 'unknown model'})")
+        collection = recreate_collection(vector_backend)
+
+    manifest = index_manifest.open_manifest(MANIFEST_PATH)
+    source = str(input_file.resolve())
+
+    lex = lexical_index.open_index(LEXICAL_PATH)
+
+    # A wiped/new chroma_store invalidates whatever the manifest remembers
+    if full or collection.count() == 0:
+        index_manifest.reset(manifest)
+        lexical_index.reset(lex)
+
+    # Manifests from before the facet columns re-record every row once
+    facet_backfill = index_manifest.missing_facets(manifest)
+
+    # An empty lexical index next to a populated collection is (re)built from
+    # every row, without re-embedding the unchanged ones
+    lex_backfill = lexical_index.count(lex) == 0
+
+    # Model (and pool) are only started once a chunk actually needs encoding,
+    # so a no-op re-index never pays the model load.
+    model = pool = None
+
+    # Near-duplicate members are not embedded; their representative lists them.
+    # Each member is kept as a stub (own text and metadata, the representative's
+    # vector) so pod filters, facets and lookups by id still find it.
+    groups = plan_dedup(input_file, dedup_distance) if dedup else {}
+    rep_of = {m: rep for rep, ids in groups.items() for m in ids}
+    rep_hashes = {}
+
+    def encode(texts):
+        nonlocal model, pool
+        if model is None:
+            model = load_model()
+            if workers > 1 and not hasattr(model, "start_multi_process_pool"):
+                print(f"[WARN] {embeddings.registry.backend} backend has no multi-process pool; "
+                      "encoding in-process (ONNX Runtime already uses all cores)")
+            elif workers > 1:
+                print(f"[INFO] Starting multi-process encode pool with {workers} workers")
+                pool = model.start_multi_process_pool(target_devices=["cpu"] * workers)
+        return encode_texts(model, texts, encode_batch_size, pool)
+
+    seen_ids = set()
+    total = embedded = meta_updated = 0
+    started = time.perf_counter()
+    try:
+        # Split into batches to satisfy Chroma constraints
+        for batch in batched(iter_chunks(input_file), batch_size):
+            rows = []
+            for line_no, entry, text in batch:
+                cid = entry.get("id", f"chunk_{line_no}")
+                seen_ids.add(cid)
+                if cid in rep_of:
+                    continue
+                if cid in groups:
+                    entry = {**entry, "member_ids": groups[cid]}
+                rows.append(chunk_row(cid, entry, text))
+                if cid in groups:
+                    rep_hashes[cid] = rows[-1][3]
+
+            to_embed, to_update = sync_rows(
+                collection, manifest, lex, source, rows, encode,
+                record_all=facet_backfill, lex_all=lex_backfill,
+            )
+
+            total += len(rows)
+            embedded += len(to_embed)
+            meta_updated += len(to_update)
+            elapsed = time.perf_counter() - started
+            print(
+                f"[✓] Batch {len(rows)} | embedded {len(to_embed)} | metadata {len(to_update)} "
+                f"| unchanged {len(rows) - len(to_embed) - len(to_update)} "
+                f"| total {total} | {total / elapsed:.1f} chunks/sec"
             )
-            print(f"[✓] Indexed batch size: {len(ids)}")
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
 
+    if model is not None:
+        embeddings.stamp_collection(
+            collection, MODEL_NAME, model.get_sentence_embedding_dimension(), embeddings.registry.backend
+        )
+
+    if rep_of:
+        stubs = write_stubs(collection, manifest, lex, source, input_file, rep_of, rep_hashes, batch_size,
+                            record_all=facet_backfill, lex_all=lex_backfill)
+        print(f"[✓] Member stubs {len(rep_of)} | written {stubs}")
+
+    deleted = delete_stale(collection, manifest, lex, source, seen_ids, batch_size)
+    if hasattr(collection, "persist"):  # the NumPy store buffers writes in memory
+        collection.persist()
+    manifest.close()
+    lex.close()
+
+    print(f"[INFO] Total Chunks: {total} | embedded {embedded} | metadata-only {meta_updated} | deleted {deleted}")
     print("\n🎉 [SUCCESS] Finished embedding ALL event logs into ChromaDB!\n")
 
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default=str(INPUT_FILE), help="Chunks JSONL to embed")
+    parser.add_argument("--batch_size", type=int, default=BATCH_SIZE, help=f"Chunks per Chroma upsert (< {CHROMA_MAX_BATCH})")
+    parser.add_argument("--encode_batch_size", type=int, default=ENCODE_BATCH_SIZE, help="Sentences per model forward pass")
+    parser.add_argument("--multiprocess", action="store_true", help="Encode with a process pool across CPU cores")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Encode pool size when --multiprocess is set")
+    parser.add_argument("--full", action="store_true", help="Drop the collection and manifest and re-embed every chunk")
+    parser.add_argument("--backend", choices=embeddings.BACKENDS, default=embeddings.DEFAULT_BACKEND,
+                        help="Embedding backend (default: EMBED_BACKEND or torch)")
+    parser.add_argument("--vector_backend", choices=vector_store.VECTOR_BACKENDS, default=VECTOR_BACKEND,
+                        help="Vector store (default: VECTOR_BACKEND or chroma)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Embed one representative per group of near-duplicate chunks (SimHash)")
+    parser.add_argument("--dedup_distance", type=int, default=near_dup.MAX_DISTANCE,
+                        help=f"Max differing SimHash bits for --dedup (< {near_dup.BANDS})")
+    args = parser.parse_args()
+    embeddings.registry.backend = args.backend
+
+    if args.batch_size >= CHROMA_MAX_BATCH:
+        parser.error(f"--batch_size must be < {CHROMA_MAX_BATCH}")
+    if not 0 <= args.dedup_distance < near_dup.BANDS:
+        parser.error(f"--dedup_distance must be in [0, {near_dup.BANDS})")
+
+    index_chunks(
+        input_file=Path(args.input),
+        batch_size=args.batch_size,
+        encode_batch_size=args.encode_batch_size,
+        workers=args.workers if args.multiprocess else 0,
+        full=args.full,
+        vector_backend=args.vector_backend,
+        dedup=args.dedup,
+        dedup_distance=args.dedup_distance,
+    )
+
+
 if __name__ == "__main__":
-    index_chunks()
+    main()
@@ -0,0 +1,293 @@
+# embeddings.py
+import os
+import json
+import threading
+from pathlib import Path
+
+# One default for the indexer and the API, so query vectors match indexed vectors
+DEFAULT_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/paraphrase-MiniLM-L3-v2")
+# "torch" (SentenceTransformer) or "onnx" (ONNX Runtime, int8 dynamic quantization)
+DEFAULT_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+BACKENDS = ("torch", "onnx")
+ONNX_DIR = Path(os.getenv("EMBED_ONNX_DIR", "onnx_models"))
+
+# Collection metadata keys recording what the stored vectors were made with
+META_MODEL = "embed_model"
+META_DIM = "embed_dim"
+META_BACKEND = "embed_backend"
+
+
+class EmbeddingModelMismatch(Exception):
+    """Raised when a collection was embedded with a different model than the one querying it."""
+
+
+# ---- ONNX backend ----
+def onnx_dir(name: str) -> Path:
+    return ONNX_DIR / name.replace("/", "__")
+
+
+def pooling_mode(st) -> str:
+    for module in st:
+        if hasattr(module, "get_pooling_mode_str"):  # sentence-transformers 2.x
+            return module.get_pooling_mode_str()
+        if isinstance(getattr(module, "pooling_mode", None), str):
+            return module.pooling_mode
+    return "mean"
+
+
+def export_onnx(name: str, out_dir: Path = None, quantize: bool = True) -> Path:
+    """
+    Export a SentenceTransformer's transformer to ONNX (model.onnx) and, with
+    quantize=True, an int8 dynamically quantized copy (model.int8.onnx).
+    Pooling/normalization settings and the tokenizer are saved alongside.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out = Path(out_dir or onnx_dir(name))
+    out.mkdir(parents=True, exist_ok=True)
+    st = SentenceTransformer(name, device="cpu")
+    hf = st[0].auto_model.eval()
+    tokenizer = st.tokenizer
+
+    sample = tokenizer(["kubectl get events"], return_tensors="pt")
+    inputs = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in sample]
+    axes = {k: {0: "batch", 1: "seq"} for k in inputs + ["token_embeddings"]}
+    class TokenEmbeddings(torch.nn.Module):
+        # positional ONNX inputs -> keyword call: forward() argument order varies across transformers releases
+        def __init__(self):
+            super().__init__()
+            self.hf = hf
+
+        def forward(self, *args):
+            return self.hf(**dict(zip(inputs, args)))[0]
+
+    print(f"[INFO] Exporting {name} -> {out / 'model.onnx'}")
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings().eval(), tuple(sample[k] for k in inputs), str(out / "model.onnx"),
+            input_names=inputs, output_names=["token_embeddings"],
+            dynamic_axes=axes, opset_version=17, dynamo=False,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        print(f"[INFO] Quantizing (int8 dynamic) -> {out / 'model.int8.onnx'}")
+        quantize_dynamic(str(out / "model.onnx"), str(out / "model.int8.onnx"), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(str(out))
+    pooling = pooling_mode(st)
+    if pooling not in ("mean", "cls"):
+        raise ValueError(f"{name}: pooling mode {pooling!r} is not supported by the ONNX backend")
+    (out / "export.json").write_text(json.dumps({
+        "model": name,
+        "pooling": pooling,
+        "normalize": any(type(m).__name__ == "Normalize" for m in st),
+        "max_seq_length": st.max_seq_length,
+        "dim": st.get_sentence_embedding_dimension(),
+    }, indent=2))
+    return out
+
+
+class OnnxEncoder:
+    """SentenceTransformer-compatible encode() on ONNX Runtime (CPU)."""
+
+    def __init__(self, path: Path, quantized: bool = True):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = Path(path)
+        cfg = json.loads((path / "export.json").read_text())
+        self.name = cfg["model"]
+        self.pooling = cfg["pooling"]
+        self.normalize = cfg["normalize"]
+        self.max_seq_length = cfg["max_seq_length"]
+        self.dim = cfg["dim"]
+        model_file = path / ("model.int8.onnx" if quantized else "model.onnx")
+        self.session = ort.InferenceSession(str(model_file), providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(str(path))
+
+    @classmethod
+    def load(cls, name: str, quantized: bool = True):
+        """Load the export for `name`, exporting it first if there is none yet."""
+        path = onnx_dir(name)
+        if not (path / "export.json").exists():
+            export_onnx(name, path)
+        return cls(path, quantized)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, **kwargs):
+        import numpy as np
+
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        # length-sorted batches pad less, like SentenceTransformer.encode
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            enc = self.tokenizer(
+                [texts[i] for i in idx], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np",
+            )
+            feed = {k: enc[k].astype(np.int64) for k in self.input_names}
+            tokens = self.session.run(None, feed)[0]
+            if self.pooling == "cls":
+                vecs = tokens[:, 0]
+            else:
+                mask = enc["attention_mask"][..., None].astype(np.float32)
+                vecs = (tokens * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                vecs = vecs / np.clip(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12, None)
+            out[idx] = vecs
+        return out[0] if single else out
+
+
+def max_seq_length(name: str):
+    """
+    The model's max_seq_length (sentence_bert_config.json, from a local model
+    directory or the Hugging Face cache/hub) without loading the model, or
+    None when it cannot be read.
+    """
+    try:
+        path = Path(name) / "sentence_bert_config.json"
+        if not path.exists():
+            from huggingface_hub import hf_hub_download
+            path = Path(hf_hub_download(name, "sentence_bert_config.json"))
+        return int(json.loads(path.read_text())["max_seq_length"])
+    except Exception:
+        return None
+
+
+def load_model(name: str, backend: str = DEFAULT_BACKEND):
+    if backend == "onnx":
+        return OnnxEncoder.load(name)
+    if backend != "torch":
+        raise ValueError(f"unknown embedding backend {backend!r} (expected one of {BACKENDS})")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name)
+
+
+class ModelRegistry:
+    """
+    Process-wide, thread-safe registry of embedding models on one backend.
+
+    Models load on first use (sentence_transformers / torch / onnxruntime are
+    only imported then), or ahead of time from a background warm_up() thread.
+    Callers that never embed, such as unfiltered /logs, never wait on a load.
+    Other lazily loaded models (the LLM tokenizer) pass their own loader.
+    """
+
+    def __init__(self, backend: str = DEFAULT_BACKEND, loader=None, kind: str = "embedding model"):
+        self.backend = backend
+        self.kind = kind
+        self._loader = loader
+        self._models = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str = DEFAULT_MODEL):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            if name not in self._models:
+                if self._loader is None:
+                    print(f"[INFO] Loading {self.kind}: {name} ({self.backend})")
+                else:
+                    print(f"[INFO] Loading {self.kind}: {name}")
+                try:
+                    self._models[name] = self._loader(name) if self._loader else load_model(name, self.backend)
+                    self._errors.pop(name, None)
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+            return self._models[name]
+
+    def is_ready(self, name: str = DEFAULT_MODEL) -> bool:
+        return name in self._models
+
+    def warm_up(self, name: str = DEFAULT_MODEL, background: bool = True):
+        """Load `name` now; with background=True in a daemon thread so startup does not block."""
+        def load():
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"[WARN] {self.kind.capitalize()} warm-up failed for {name}: {e}")
+
+        if not background:
+            load()
+            return None
+        t = threading.Thread(target=load, name=f"warm-up {name}", daemon=True)
+        t.start()
+        return t
+
+    def dimension(self, name: str = DEFAULT_MODEL) -> int:
+        return self.get(name).get_sentence_embedding_dimension()
+
+    def status(self) -> dict:
+        return {
+            "backend": self.backend,
+            "loaded": sorted(self._models),
+            "errors": dict(self._errors),
+        }
+
+
+registry = ModelRegistry()
+
+
+def get_model(name: str = DEFAULT_MODEL):
+    return registry.get(name)
+
+
+# ---- Collection stamping ----
+def collection_model(collection):
+    """(model name, dimension) recorded on the collection, or (None, None) if unstamped."""
+    meta = collection.metadata or {}
+    return meta.get(META_MODEL), meta.get(META_DIM)
+
+
+def stamp_collection(collection, name: str, dim: int, backend: str = DEFAULT_BACKEND):
+    """
+    Record the embedding model, dimension and backend in the collection
+    metadata. Backends of one model share a vector space (see
+    bench_embeddings.py for the recall check), so only the model is enforced.
+    """
+    meta = collection.metadata or {}
+    if meta.get(META_MODEL) == name and meta.get(META_DIM) == dim and meta.get(META_BACKEND) == backend:
+        return
+    # hnsw:* settings are fixed at creation; Chroma rejects them in modify()
+    meta = {k: v for k, v in meta.items() if not k.startswith("hnsw:")}
+    meta.update({META_MODEL: name, META_DIM: dim, META_BACKEND: backend})
+    collection.modify(metadata=meta)
+
+
+def check_collection(collection, name: str):
+    """Raise EmbeddingModelMismatch if the collection was embedded with another model."""
+    stamped, dim = collection_model(collection)
+    if stamped and stamped != name:
+        raise EmbeddingModelMismatch(
+            f"collection '{collection.name}' was embedded with {stamped} (dim {dim}), "
+            f"but queries use {name}; re-index with --full or set EMBED_MODEL={stamped}"
+        )
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export an embedding model for the onnx backend")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--out", default=None, help=f"Output directory (default: {ONNX_DIR}/<model>)")
+    parser.add_argument("--no_quantize", action="store_true", help="Skip the int8 copy")
+    args = parser.parse_args()
+
+    out = export_onnx(args.model, Path(args.out) if args.out else None, quantize=not args.no_quantize)
+    print(f"[✓] Exported {args.model} -> {out}")
+
+
+if __name__ == "__main__":
+    main()
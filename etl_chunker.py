@@ -1,72 +1,367 @@
 # etl_chunker.py
-import json, uuid, os
-from datetime import datetime, timedelta
+import json, os, heapq, argparse, tempfile, shutil, zlib
+from functools import partial
+from multiprocessing import Pool
+from bisect import bisect_left, bisect_right
+from collections import deque
+from datetime import timedelta
 from pathlib import Path
 
+from timestamps import parse_iso
+
 RAW_DIR = Path("samples/raw")
 OUT_DIR = Path("processed")
 OUT_DIR.mkdir(exist_ok=True, parents=True)
+OUT_FILE = OUT_DIR / "log_chunks.jsonl"  # same shape as event_chunks.jsonl, fed to embed_index_events.py
 WINDOW_MINUTES = 5
+RUN_SIZE = 200_000  # records per in-memory sort run before spilling to disk
+MERGE_FAN_IN = 64  # sorted runs open at once while merging; more take extra passes
 
 ERROR_KEYS = ["OOMKilled","CrashLoopBackOff","ImagePullBackOff","ERROR","Exception","DiskPressure","evicting"]
+# same 2-8 scale as parse_events.derive_severity
+ERROR_SEVERITY = {"OOMKilled": 8, "ImagePullBackOff": 8, "CrashLoopBackOff": 7, "DiskPressure": 7,
+                  "evicting": 7, "Exception": 6, "ERROR": 5}
+
+def parse_record(line: str):
+    rec = json.loads(line)
+    rec.setdefault("cluster","local")
+    rec.setdefault("namespace","default")
+    rec.setdefault("pod","unknown")
+    rec.setdefault("node","unknown")
+    rec.setdefault("message","")
+    rec["timestamp"] = parse_iso(rec["timestamp"])
+    return rec
 
-def parse_ts(ts: str):
-    return datetime.fromisoformat(ts.replace("Z","+00:00"))
+def iter_file(path: Path):
+    with path.open('r', encoding='utf-8') as fh:
+        for line in fh:
+            line=line.strip()
+            if not line: continue
+            yield parse_record(line)
 
 def load_logs():
     logs = []
-    for f in RAW_DIR.glob("*.json"):
-        with f.open('r', encoding='utf-8') as fh:
-            for line in fh:
-                line=line.strip()
-                if not line: continue
-                rec = json.loads(line)
-                rec.setdefault("cluster","local")
-                rec.setdefault("namespace","default")
-                rec.setdefault("pod","unknown")
-                rec.setdefault("node","unknown")
-                rec.setdefault("message","")
-                rec["timestamp"] = parse_ts(rec["timestamp"])
-                logs.append(rec)
+    for f in sorted(RAW_DIR.glob("*.json")):
+        logs.extend(iter_file(f))
     return sorted(logs, key=lambda r: r["timestamp"])
 
-def is_error_line(msg: str):
-    if not msg: return False
+# ---- Streaming ingestion ----
+def _ts_key(r):
+    return r["timestamp"]
+
+def _spill(run, spill_dir: Path) -> Path:
+    fd, name = tempfile.mkstemp(dir=spill_dir, suffix=".jsonl")
+    out = Path(name)
+    with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+        for r in run:
+            fh.write(json.dumps({**r, "timestamp": r["timestamp"].isoformat()}) + "\n")
+    return out
+
+def sorted_runs(records, spill_dir: Path, run_size: int = RUN_SIZE):
+    """
+    External sort, phase one: cut `records` into time-sorted runs of at most
+    run_size records, every run spilled to spill_dir. Returns the run paths.
+    """
+    runs, run = [], []
+    for rec in records:
+        run.append(rec)
+        if len(run) >= run_size:
+            run.sort(key=_ts_key)
+            runs.append(_spill(run, spill_dir))
+            run = []
+    if run:
+        run.sort(key=_ts_key)
+        runs.append(_spill(run, spill_dir))
+    return runs
+
+def _read_run(path: Path):
+    # a spilled run is read exactly once: drop it as soon as it is merged
+    yield from iter_file(path)
+    path.unlink()
+
+def merge_runs(streams, spill_dir: Path, fan_in: int = MERGE_FAN_IN):
+    """
+    heapq.merge over `streams` (zero-argument callables returning time-ordered
+    iterators) with at most fan_in of them open at once; larger sets are first
+    merged fan_in at a time into longer runs on disk. Ties keep stream order.
+    """
+    streams = list(streams)
+    while len(streams) > fan_in:
+        streams = [
+            partial(_read_run, _spill(heapq.merge(*[s() for s in streams[i:i + fan_in]], key=_ts_key), spill_dir))
+            for i in range(0, len(streams), fan_in)
+        ]
+    return heapq.merge(*[s() for s in streams], key=_ts_key)
+
+def iter_logs(files=None, presorted: bool = False, run_size: int = RUN_SIZE):
+    """
+    Yield every record from `files` (default RAW_DIR/*.json) in timestamp order
+    by k-way merging time-ordered iterators. Files already in time order are
+    streamed as-is with presorted=True; otherwise all files share one run
+    buffer of run_size records that is sorted and spilled whenever it fills,
+    so memory stays bounded by run_size however many files there are.
+    """
+    files = list(files) if files is not None else sorted(RAW_DIR.glob("*.json"))
+    spill_dir = Path(tempfile.mkdtemp(prefix="etl_runs_"))
+    try:
+        if presorted:
+            streams = [partial(iter_file, f) for f in files]
+        else:
+            records = (rec for f in files for rec in iter_file(f))
+            streams = [partial(_read_run, p) for p in sorted_runs(records, spill_dir, run_size)]
+        yield from merge_runs(streams, spill_dir)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+def error_key(msg: str):
+    if not msg: return None
     for k in ERROR_KEYS:
         if k in msg:
-            return True
-    return False
+            return k
+    return None
+
+def is_error_line(msg: str):
+    return error_key(msg) is not None
+
+def incident_windows(recs, window):
+    """
+    Yield (start, end, first_error) for one pod's time-sorted records, merging
+    error windows [ts - window, ts + window] that overlap or touch.
+    """
+    cur = None
+    for r in recs:
+        if not is_error_line(r["message"]):
+            continue
+        ts = r["timestamp"]
+        if cur and ts - window <= cur[1]:
+            cur[1] = ts + window
+            continue
+        if cur:
+            yield tuple(cur)
+        cur = [ts - window, ts + window, r]
+    if cur:
+        yield tuple(cur)
+
+def build_chunk(first, start, end, context):
+    texts = "\n".join(f"{l['timestamp'].isoformat()} {l['node']} {l['namespace']} {l['pod']} {l['message']}" for l in context)
+    keys = [k for k in (error_key(l["message"]) for l in context) if k]
+    reason = max(keys, key=lambda k: ERROR_SEVERITY[k]) if keys else None
+    return {
+        # deterministic: the same incident keeps its id across ETL runs
+        "id": f"{first['namespace']}-pod/{first['pod']}-{int(first['timestamp'].timestamp())}",
+        "cluster": first["cluster"],
+        "namespace": first["namespace"],
+        "pod": first["pod"],
+        "node": first["node"],
+        "object": f"pod/{first['pod']}",
+        "reason": reason,
+        "start_ts": start.isoformat(),
+        "end_ts": end.isoformat(),
+        "severity_hint": ERROR_SEVERITY.get(reason, 3),
+        "context_text": texts
+    }
 
 def make_chunks(logs):
-    chunks = []
+    """
+    One chunk per incident: overlapping ±WINDOW_MINUTES windows around a pod's
+    error lines are merged, and context lines come from a per-pod time-sorted
+    index via bisect instead of rescanning every log line.
+    """
+    window = timedelta(minutes=WINDOW_MINUTES)
+    by_pod = {}
     for r in logs:
+        by_pod.setdefault((r["namespace"], r["pod"]), []).append(r)
+
+    incidents = []
+    for recs in by_pod.values():
+        recs.sort(key=lambda r: r["timestamp"])  # no-op cost for load_logs() output
+        times = [r["timestamp"] for r in recs]
+        for start, end, first in incident_windows(recs, window):
+            context = recs[bisect_left(times, start): bisect_right(times, end)]
+            incidents.append((start, build_chunk(first, start, end, context)))
+
+    incidents.sort(key=lambda x: (x[0], x[1]["id"]))
+    return [c for _, c in incidents]
+
+def stream_chunks(records, window_minutes: int = WINDOW_MINUTES):
+    """
+    Sliding-window counterpart of make_chunks() for a time-ordered record stream.
+
+    Yields the same incident chunks, each as soon as no later error can extend
+    it. Only the last `window` of lines per active pod plus open incidents are
+    held, so memory is bounded by window size x active pods.
+    """
+    window = timedelta(minutes=window_minutes)
+    recent = {}    # pod key -> deque of that pod's lines within `window` of its newest line
+    open_inc = {}  # pod key -> [start, end, first_error, lines]
+    closing = []   # heap of (end + window, seq, pod key, end)
+    seq = 0
+    now = None
+
+    def close(key):
+        start, end, first, lines = open_inc.pop(key)
+        return build_chunk(first, start, end, [l for l in lines if l["timestamp"] <= end])
+
+    for n, r in enumerate(records, 1):
+        now = r["timestamp"]
+
+        # an incident is final once nothing at or after `now` can fall in end + window
+        while closing and closing[0][0] < now:
+            _, _, key, end = heapq.heappop(closing)
+            inc = open_inc.get(key)
+            if inc is not None and inc[1] == end:
+                yield close(key)
+
+        key = (r["namespace"], r["pod"])
+        buf = recent.setdefault(key, deque())
+        buf.append(r)
+        while buf[0]["timestamp"] < now - window:
+            buf.popleft()
+
+        inc = open_inc.get(key)
         if is_error_line(r["message"]):
-            ts = r["timestamp"]
-            start = ts - timedelta(minutes=WINDOW_MINUTES)
-            end = ts + timedelta(minutes=WINDOW_MINUTES)
-            context = [l for l in logs if start <= l["timestamp"] <= end and l["pod"]==r["pod"]]
-            texts = "\n".join(f"{l['timestamp'].isoformat()} {l['node']} {l['namespace']} {l['pod']} {l['message']}" for l in context)
-            chunk = {
-                "id": str(uuid.uuid4()),
-                "cluster": r["cluster"],
-                "namespace": r["namespace"],
-                "pod": r["pod"],
-                "node": r["node"],
-                "start_ts": start.isoformat(),
-                "end_ts": end.isoformat(),
-                "content": texts
-            }
-            chunks.append(chunk)
-    return chunks
+            if inc is not None:
+                inc[1] = now + window
+                inc[3].append(r)
+            else:
+                inc = open_inc[key] = [now - window, now + window, r, list(buf)]
+            seq += 1
+            heapq.heappush(closing, (inc[1] + window, seq, key, inc[1]))
+        elif inc is not None:
+            inc[3].append(r)
+
+        # drop buffers of pods that went quiet so memory tracks active pods only
+        if n % 10_000 == 0:
+            for k in [k for k, b in recent.items() if b[-1]["timestamp"] < now - window]:
+                del recent[k]
+
+    for key in sorted(open_inc, key=lambda k: open_inc[k][0]):
+        yield close(key)
+
+# ---- Parallel ETL: partition by pod, chunk partitions in a process pool ----
+def partition_of(rec, partitions: int) -> int:
+    # stable across processes, unlike hash()
+    return zlib.crc32(f"{rec['namespace']}/{rec['pod']}".encode("utf-8")) % partitions
+
+def partition_files(task):
+    """
+    Pool worker: split a contiguous share of the raw files by pod partition
+    into time-sorted runs on disk. The partition buffers span the worker's
+    files and are spilled together every run_size records, so the number of
+    runs grows with the data volume, not the number of files.
+    Returns [(partition, worker, seq, run_path), ...].
+    """
+    paths, spill_dir, partitions, run_size, worker = task
+    spill_dir = Path(spill_dir)
+    buckets = [[] for _ in range(partitions)]
+    buffered = 0
+    runs = []
+
+    def flush():
+        seq = len(runs)
+        for j, bucket in enumerate(buckets):
+            if bucket:
+                bucket.sort(key=_ts_key)
+                part_dir = spill_dir / f"p{j:04d}"
+                part_dir.mkdir(exist_ok=True)
+                runs.append((j, worker, seq, str(_spill(bucket, part_dir))))
+                buckets[j] = []
+
+    for path in paths:
+        for rec in iter_file(Path(path)):
+            buckets[partition_of(rec, partitions)].append(rec)
+            buffered += 1
+            if buffered >= run_size:
+                flush()
+                buffered = 0
+    flush()
+    return runs
+
+def chunk_partition(task):
+    """Pool worker: merge one partition's sorted runs (in source order) and chunk them."""
+    run_paths, spill_dir = task
+    merged = merge_runs([partial(_read_run, Path(p)) for p in run_paths], Path(spill_dir))
+    return list(stream_chunks(merged))
+
+def parallel_chunks(files, workers: int, partitions: int = None, run_size: int = RUN_SIZE):
+    """
+    Yield chunks for `files` using a process pool: files are parsed and
+    partitioned by pod in parallel, then each pod partition is merged and
+    chunked in parallel. Every pod lands in exactly one partition, so incident
+    windows spanning several source files are still merged correctly.
+
+    Each worker gets a contiguous slice of `files` and runs are merged in
+    (worker, seq) order, so records with equal timestamps keep their source
+    order and the output matches make_chunks().
+    """
+    files = [str(f) for f in files]
+    partitions = partitions or workers * 4
+    share = max(1, -(-len(files) // workers))
+    spill_dir = Path(tempfile.mkdtemp(prefix="etl_parts_"))
+    try:
+        with Pool(workers) as pool:
+            by_part = {}
+            tasks = [
+                (files[i:i + share], str(spill_dir), partitions, run_size, n)
+                for n, i in enumerate(range(0, len(files), share))
+            ]
+            for runs in pool.imap_unordered(partition_files, tasks):
+                for j, worker, seq, run_path in runs:
+                    by_part.setdefault(j, []).append((worker, seq, run_path))
+
+            parts = [([p for _, _, p in sorted(by_part[j])], str(spill_dir / f"p{j:04d}")) for j in sorted(by_part)]
+            for chunks in pool.imap(chunk_partition, parts):
+                yield from chunks
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+def write_chunks(chunks, out_file: Path, append: bool = False) -> int:
+    """
+    Single writer: one JSON chunk per line. With append, earlier chunks are
+    kept unless a new chunk has the same id (ids are deterministic, so
+    re-running over the same raw files replaces rather than duplicates them).
+    The file is rewritten via a temp file and swapped in at the end.
+    """
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=out_file.parent, prefix=out_file.name, suffix=".tmp")
+    ids = set()
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            for c in chunks:
+                if c["id"] in ids: continue
+                ids.add(c["id"])
+                fh.write(json.dumps(c, ensure_ascii=False) + "\n")
+            if append and out_file.exists():
+                with out_file.open('r', encoding='utf-8') as old:
+                    for line in old:
+                        line = line.strip()
+                        if line and json.loads(line).get("id") not in ids:
+                            fh.write(line + "\n")
+        os.replace(tmp, out_file)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return len(ids)
 
 def main():
-    logs = load_logs()
-    chunks = make_chunks(logs)
-    for c in chunks:
-        out = OUT_DIR / f"{c['id']}.json"
-        with out.open('w', encoding='utf-8') as fh:
-            json.dump(c, fh, ensure_ascii=False, indent=2)
-    print(f"[ETL] Created {len(chunks)} chunks -> {OUT_DIR}")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stream", action="store_true", help="Bounded-memory k-way merge + sliding-window chunking")
+    parser.add_argument("--presorted", action="store_true", help="Raw files are already in timestamp order (skip external sort)")
+    parser.add_argument("--run_size", type=int, default=RUN_SIZE, help="Records per sort run spilled to disk")
+    parser.add_argument("--workers", type=int, default=1, help="Process pool size; > 1 partitions the work by pod")
+    parser.add_argument("--out", default=str(OUT_FILE), help="Output chunks JSONL")
+    parser.add_argument("--append", action="store_true", help="Merge into --out (same-id chunks replaced) instead of overwriting it")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        chunks = parallel_chunks(sorted(RAW_DIR.glob("*.json")), args.workers, run_size=args.run_size)
+    elif args.stream:
+        chunks = stream_chunks(iter_logs(presorted=args.presorted, run_size=args.run_size))
+    else:
+        chunks = make_chunks(load_logs())
+
+    n = write_chunks(chunks, Path(args.out), append=args.append)
+    print(f"[ETL] Created {n} chunks -> {args.out}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,91 @@
+# evidence_packer.py
+import re
+
+from parse_events import derive_severity
+
+EVIDENCE_SEPARATOR = "\n\n---\n\n"
+FIELD_RE = re.compile(r"\b(TYPE|REASON|MESSAGE)=(.*?)(?= [A-Z_]+=|$)")
+COUNT_RE = re.compile(r" COUNT=(\d+) MESSAGE=")
+
+
+def line_severity(line: str) -> int:
+    # event lines are "KEY=value ..." (parse_events); raw log lines are scored on their text
+    fields = {k.lower(): v for k, v in FIELD_RE.findall(line)}
+    return derive_severity(fields or {"message": line})
+
+
+def compress_chunk(doc: str):
+    """
+    Collapse duplicate lines (repeats become COUNT=n, existing counts add up)
+    and order the rest by severity, most severe first. Returns the lines.
+    """
+    counts = {}
+    for line in (doc or "").splitlines():
+        if not line.strip():
+            continue
+        m = COUNT_RE.search(line)
+        n = int(m.group(1)) if m else 1
+        base = COUNT_RE.sub(" MESSAGE=", line, count=1) if m else line
+        counts[base] = counts.get(base, 0) + n
+
+    lines = []
+    for line, n in counts.items():
+        if n > 1:
+            line = (line.replace(" MESSAGE=", f" COUNT={n} MESSAGE=", 1)
+                    if " MESSAGE=" in line else f"{line} (x{n})")
+        lines.append(line)
+    # stable: equal severities keep their original order
+    return sorted(lines, key=line_severity, reverse=True)
+
+
+def pack_evidence(evidence, header, budget: int, count_tokens):
+    """
+    Fill `budget` tokens with evidence in relevance order. Each item is its
+    header plus compressed lines; the first item that does not fit is cut at a
+    line boundary and everything after it is left out. count_tokens maps a
+    list of texts to their counts (token_counter); every header and line is
+    measured in one call.
+
+    Returns (text, stats) where stats reports what was actually sent.
+    """
+    compressed = [compress_chunk(e["doc"]) for e in evidence]
+    heads = [header(e) for e in evidence]
+    counts = iter(count_tokens([EVIDENCE_SEPARATOR, *heads, *(l for lines in compressed for l in lines)]))
+    sep_tokens = next(counts)
+    head_tokens = [next(counts) for _ in heads]
+    line_tokens = [[next(counts) for _ in lines] for lines in compressed]
+    blocks = []
+    used = 0
+    lines_sent = 0
+
+    for head, head_n, lines, ns in zip(heads, head_tokens, compressed, line_tokens):
+        cost = head_n + (sep_tokens if blocks else 0)
+        kept = []
+        for line, n in zip(lines, ns):
+            n += 1
+            if used + cost + n > budget:
+                break
+            kept.append(line)
+            cost += n
+        if not blocks and lines and not kept:
+            # never send the top hit empty: keep its first line, cut to the budget (~4 chars/token)
+            kept = [lines[0][:max(0, budget - cost) * 4]]
+            cost += count_tokens(kept)[0]
+        elif used + cost > budget or (lines and not kept):
+            break
+
+        blocks.append(head + "\n".join(kept))
+        used += cost
+        lines_sent += len(kept)
+        if len(kept) < len(lines):
+            break
+
+    text = EVIDENCE_SEPARATOR.join(blocks)
+    return text, {
+        "items": len(blocks),
+        "items_available": len(evidence),
+        "tokens": count_tokens([text])[0],
+        "budget": budget,
+        "lines": lines_sent,
+        "lines_dropped": sum(len(lines) for lines in compressed) - lines_sent,
+    }
@@ -0,0 +1,74 @@
+# incident.py
+from datetime import datetime, timezone
+
+from timestamps import parse_iso
+
+INCIDENT_WINDOW = 900  # seconds per time bucket when clustering chunks
+CLUSTER_MAX_CHUNKS = 8  # chunks per map prompt; larger clusters are split in time order
+
+
+def chunk_epoch(meta: dict):
+    """Start time of a chunk as epoch seconds, or None if it has no parseable timestamp."""
+    for key in ("start_epoch", "start_ts", "timestamp"):
+        value = meta.get(key)
+        if value in (None, ""):
+            continue
+        if isinstance(value, (int, float)):
+            if value > 0:  # 0 = unknown (timestamps.to_epoch)
+                return float(value)
+            continue
+        try:
+            return parse_iso(value).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def cluster_chunks(evidence, window: float = INCIDENT_WINDOW, max_chunks: int = CLUSTER_MAX_CHUNKS):
+    """
+    Group evidence ({id, doc, meta}) into related sets: same namespace, same
+    node and start time in the same `window`-second bucket (chunks without a
+    timestamp share one bucket per namespace/node).
+
+    Members are ordered by (time, id), not by retrieval rank, so a cluster
+    whose chunks did not change renders the same map prompt on the next run
+    and is served from the diagnosis cache. Clusters keep the order of their
+    best-ranked member.
+    """
+    groups = {}
+    for rank, e in enumerate(evidence):
+        meta = e["meta"] or {}
+        ts = chunk_epoch(meta)
+        bucket = int(ts // window) if ts is not None and window > 0 else None
+        key = (meta.get("namespace") or "", meta.get("node") or "", bucket)
+        groups.setdefault(key, {"rank": rank, "members": []})["members"].append((ts, e))
+
+    clusters = []
+    for (ns, node, bucket), group in sorted(groups.items(), key=lambda kv: kv[1]["rank"]):
+        members = sorted(group["members"], key=lambda m: (m[0] is None, m[0] or 0.0, m[1]["id"]))
+        parts = [members[i:i + max_chunks] for i in range(0, len(members), max_chunks)]
+        for n, part in enumerate(parts, 1):
+            times = [ts for ts, _ in part if ts is not None]
+            key = f"{ns or '-'}/{node or '-'}/{bucket if bucket is not None else '-'}"
+            clusters.append({
+                "key": key if len(parts) == 1 else f"{key}#{n}",
+                "namespace": ns,
+                "node": node,
+                "start": min(times) if times else None,
+                "end": max(times) if times else None,
+                "pods": sorted({(e["meta"] or {}).get("pod") or "" for _, e in part} - {""}),
+                "evidence": [e for _, e in part],
+            })
+    return clusters
+
+
+def cluster_label(cluster: dict) -> str:
+    def fmt(ts):
+        return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M UTC") if ts is not None else "?"
+
+    window = f"{fmt(cluster['start'])} – {fmt(cluster['end'])}" if cluster["start"] is not None else "no timestamp"
+    pods = ", ".join(cluster["pods"][:5]) + (f" (+{len(cluster['pods']) - 5})" if len(cluster["pods"]) > 5 else "")
+    return (
+        f"Namespace: {cluster['namespace'] or '-'} | Node: {cluster['node'] or '-'} | Window: {window} | "
+        f"Chunks: {len(cluster['evidence'])} | Pods: {pods or '-'}"
+    )
@@ -0,0 +1,227 @@
+# index_manifest.py
+import json
+import uuid
+import sqlite3
+import hashlib
+from pathlib import Path
+
+MANIFEST_PATH = Path("index_manifest.db")
+SQL_PARAM_LIMIT = 500  # keep IN (...) lists well under SQLite's variable limit
+FACET_COLUMNS = ("namespace", "pod", "reason", "severity")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def meta_hash(meta: dict) -> str:
+    return hashlib.sha256(json.dumps(meta, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def facet_values(meta: dict):
+    """(namespace, pod, reason, severity) of one chunk's metadata, as stored in the manifest."""
+    sev = meta.get("severity_hint")
+    return (
+        meta.get("namespace") or "",
+        meta.get("pod") or "",
+        meta.get("reason") or "",
+        "" if sev is None or sev == "" else str(sev),
+    )
+
+
+def open_manifest(path: Path = MANIFEST_PATH):
+    """Open (and create if missing) the chunk-id -> content hash manifest."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS manifest (
+        id TEXT PRIMARY KEY,
+        source TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        meta_hash TEXT NOT NULL,
+        model TEXT NOT NULL,
+        updated_ts DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    # facet columns were added later; older manifests get them (NULL) in place
+    have = {row[1] for row in conn.execute("PRAGMA table_info(manifest)")}
+    for col in FACET_COLUMNS:
+        if col not in have:
+            conn.execute(f"ALTER TABLE manifest ADD COLUMN {col} TEXT")
+    # per-namespace value counts, kept in step with the manifest rows
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS facets (
+        kind TEXT NOT NULL,
+        namespace TEXT NOT NULL,
+        value TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (kind, namespace, value)
+    )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS manifest_meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute(
+        "INSERT OR IGNORE INTO manifest_meta (key, value) VALUES ('epoch', ?), ('facets_version', '0')",
+        (uuid.uuid4().hex,),
+    )
+    conn.commit()
+    return conn
+
+
+def open_readonly(path: Path = MANIFEST_PATH):
+    """
+    Read-only connection for API readers, or None if there is no manifest
+    (or it predates the facet tables). No DDL and no writes: a reader only
+    takes a shared lock, so it does not queue behind the indexer's writes.
+    """
+    if not path.exists():
+        return None
+    conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if not {"facets", "manifest_meta"} <= tables:
+        conn.close()
+        return None
+    return conn
+
+
+def sql_chunks(seq, size=SQL_PARAM_LIMIT):
+    """Slices of `seq` small enough for one IN (...) list (also used by lexical_index)."""
+    seq = list(seq)
+    for i in range(0, len(seq), size):
+        yield seq[i: i + size]
+
+
+def lookup(conn, ids):
+    """Return {id: (content_hash, meta_hash, model)} for the ids already indexed."""
+    found = {}
+    for part in sql_chunks(ids):
+        marks = ",".join("?" * len(part))
+        cur = conn.execute(
+            f"SELECT id, content_hash, meta_hash, model FROM manifest WHERE id IN ({marks})",
+            part,
+        )
+        for cid, chash, mhash, model in cur.fetchall():
+            found[cid] = (chash, mhash, model)
+    return found
+
+
+def _facet_rows(conn, ids):
+    rows = []
+    for part in sql_chunks(ids):
+        marks = ",".join("?" * len(part))
+        rows.extend(conn.execute(
+            f"SELECT namespace, pod, reason, severity FROM manifest WHERE id IN ({marks}) AND namespace IS NOT NULL",
+            part,
+        ).fetchall())
+    return rows
+
+
+def _apply_facets(conn, values, delta: int):
+    """Add `delta` to the counts of every (namespace, pod, reason, severity) in `values`."""
+    counts = {}
+    for ns, pod, reason, sev in values:
+        for kind, value in (("namespace", ns), ("pod", pod), ("reason", reason), ("severity", sev)):
+            if value:
+                key = (kind, ns, value)
+                counts[key] = counts.get(key, 0) + delta
+    if not counts:
+        return
+    conn.executemany(
+        "INSERT INTO facets (kind, namespace, value, count) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (kind, namespace, value) DO UPDATE SET count = count + excluded.count",
+        [(*key, n) for key, n in counts.items() if n],
+    )
+    conn.execute("DELETE FROM facets WHERE count <= 0")
+    conn.execute(
+        "UPDATE manifest_meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'facets_version'"
+    )
+
+
+def record(conn, source: str, rows):
+    """rows: iterable of (id, content_hash, meta_hash, model, metadata) produced from `source`."""
+    rows = [(cid, chash, mhash, model, facet_values(meta)) for cid, chash, mhash, model, meta in rows]
+    if not rows:
+        return
+    _apply_facets(conn, _facet_rows(conn, [r[0] for r in rows]), -1)
+    conn.executemany(
+        "INSERT OR REPLACE INTO manifest "
+        "(id, source, content_hash, meta_hash, model, namespace, pod, reason, severity, updated_ts) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+        [(cid, source, chash, mhash, model, *facets) for cid, chash, mhash, model, facets in rows],
+    )
+    _apply_facets(conn, [r[4] for r in rows], +1)
+    conn.commit()
+
+
+def missing_facets(conn) -> bool:
+    """True for a manifest written before facet columns existed (rows need re-recording)."""
+    return conn.execute("SELECT 1 FROM manifest WHERE namespace IS NULL LIMIT 1").fetchone() is not None
+
+
+def all_ids(conn, source: str = None):
+    if source is None:
+        return {row[0] for row in conn.execute("SELECT id FROM manifest")}
+    return {row[0] for row in conn.execute("SELECT id FROM manifest WHERE source = ?", (source,))}
+
+
+def part_ids(conn, parent_id: str):
+    """Ids recorded for one chunk group: the parent id itself and its "<parent>#<n>" parts."""
+    # "$" sorts right after "#", so the range covers exactly the "<parent>#" prefix
+    rows = conn.execute(
+        "SELECT id FROM manifest WHERE id = ? OR (id >= ? AND id < ?)",
+        (parent_id, parent_id + "#", parent_id + "$"),
+    )
+    return {row[0] for row in rows}
+
+
+def forget(conn, ids):
+    _apply_facets(conn, _facet_rows(conn, ids), -1)
+    for part in sql_chunks(ids):
+        marks = ",".join("?" * len(part))
+        conn.execute(f"DELETE FROM manifest WHERE id IN ({marks})", part)
+    conn.commit()
+
+
+def reset(conn):
+    conn.execute("DELETE FROM manifest")
+    conn.execute("DELETE FROM facets")
+    conn.execute(
+        "UPDATE manifest_meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'facets_version'"
+    )
+    conn.commit()
+
+
+# ---- Facets ----
+def facets_etag(conn) -> str:
+    """Changes whenever the facet counts do (epoch survives resets, not a deleted manifest)."""
+    meta = dict(conn.execute("SELECT key, value FROM manifest_meta"))
+    return f'"{meta["epoch"]}-{meta["facets_version"]}"'
+
+
+def facets(conn) -> dict:
+    """Namespaces, pods per namespace, reasons and a severity histogram, with chunk counts."""
+    by_kind = {"namespace": {}, "pod": {}, "reason": {}, "severity": {}}
+    pods = {}
+    for kind, ns, value, count in conn.execute("SELECT kind, namespace, value, count FROM facets"):
+        if kind == "pod":
+            pods.setdefault(ns, []).append({"name": value, "count": count})
+        by_kind[kind][value] = by_kind[kind].get(value, 0) + count
+
+    def ranked(counts):
+        return [{"name": k, "count": n} for k, n in sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))]
+
+    def sev_key(value):
+        try:
+            return (0, float(value))
+        except ValueError:
+            return (1, value)
+
+    return {
+        "total": sum(by_kind["namespace"].values()),
+        "namespaces": ranked(by_kind["namespace"]),
+        "pods": {ns: sorted(p, key=lambda x: (-x["count"], x["name"])) for ns, p in sorted(pods.items())},
+        "reasons": ranked(by_kind["reason"]),
+        "severity": [
+            {"severity": int(v) if v.lstrip("-").isdigit() else v, "count": by_kind["severity"][v]}
+            for v in sorted(by_kind["severity"], key=sev_key)
+        ],
+    }
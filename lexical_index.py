@@ -0,0 +1,220 @@
+# lexical_index.py
+import re
+import math
+import sqlite3
+from collections import Counter
+from pathlib import Path
+
+from index_manifest import sql_chunks
+
+LEXICAL_PATH = Path("lexical_index.db")  # sidecar next to chroma_store, built by embed_index_events.py
+BM25_K1 = 1.2
+BM25_B = 0.75
+REASON_PREFIX = "r:"  # field term: a chunk's reason, so exact-reason queries outrank message mentions
+# /logs sort keys served as indexed ORDER BY over the numeric copies (None: id order)
+ORDER_COLUMNS = {None: "id", "id": "id", "start_ts": "start_epoch", "end_ts": "end_epoch", "severity_hint": "severity"}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+LINE_FIELD_RE = re.compile(r"\b(REASON|MESSAGE)=(.*?)(?= [A-Z_]+=|$)")
+
+
+def tokenize(text: str):
+    # "ImagePullBackOff" stays one token; "Back-off" / "0/3 nodes" split on punctuation
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def lexical_text(doc: str) -> str:
+    """REASON and MESSAGE values of event lines (parse_events); raw log lines as-is."""
+    parts = []
+    for line in (doc or "").splitlines():
+        fields = LINE_FIELD_RE.findall(line)
+        parts.extend(v for _, v in fields) if fields else parts.append(line)
+    return "\n".join(parts)
+
+
+def doc_terms(doc: str, reason: str = ""):
+    terms = tokenize(lexical_text(doc))
+    terms += [REASON_PREFIX + t for t in tokenize(reason)]
+    return Counter(terms)
+
+
+def open_index(path: Path = LEXICAL_PATH):
+    """Open (and create if missing) the inverted index."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS docs (
+        id TEXT PRIMARY KEY,
+        length INTEGER NOT NULL,
+        namespace_norm TEXT,
+        pod_norm TEXT,
+        reason_norm TEXT,
+        severity INTEGER,
+        start_epoch REAL,
+        end_epoch REAL,
+        dup_of TEXT
+    );
+    CREATE TABLE IF NOT EXISTS postings (
+        term TEXT NOT NULL,
+        id TEXT NOT NULL,
+        tf INTEGER NOT NULL,
+        PRIMARY KEY (term, id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS postings_id ON postings (id);
+    CREATE INDEX IF NOT EXISTS docs_reason ON docs (reason_norm);
+    """)
+    # numeric and dup_of columns were added later; older indexes get them (NULL) until re-indexed
+    have = {row[1] for row in conn.execute("PRAGMA table_info(docs)")}
+    for col, kind in (("severity", "INTEGER"), ("start_epoch", "REAL"), ("end_epoch", "REAL"), ("dup_of", "TEXT")):
+        if col not in have:
+            conn.execute(f"ALTER TABLE docs ADD COLUMN {col} {kind}")
+    conn.executescript("""
+    CREATE INDEX IF NOT EXISTS docs_start ON docs (start_epoch);
+    CREATE INDEX IF NOT EXISTS docs_end ON docs (end_epoch);
+    CREATE INDEX IF NOT EXISTS docs_severity ON docs (severity);
+    """)
+    conn.commit()
+    return conn
+
+
+def open_readonly(path: Path = LEXICAL_PATH):
+    """
+    Read-only connection for API readers, or None if there is no index (or
+    it predates the numeric/dup_of columns: the next indexer run migrates it).
+    Unlike open_index() it runs no DDL, so a request never creates or locks it.
+    """
+    if not path.exists():
+        return None
+    conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(docs)")}
+    if not {"docs", "postings"} <= tables or not {"severity", "start_epoch", "end_epoch", "dup_of"} <= cols:
+        conn.close()
+        return None
+    return conn
+
+
+def _delete(conn, ids):
+    for part in sql_chunks(ids):
+        marks = ",".join("?" * len(part))
+        conn.execute(f"DELETE FROM postings WHERE id IN ({marks})", part)
+        conn.execute(f"DELETE FROM docs WHERE id IN ({marks})", part)
+
+
+def upsert(conn, rows):
+    """rows: iterable of (id, document, metadata) as stored in the vector collection."""
+    rows = list(rows)
+    _delete(conn, [r[0] for r in rows])
+    for cid, doc, meta in rows:
+        terms = doc_terms(doc, meta.get("reason") or "")
+        conn.execute(
+            "INSERT INTO docs (id, length, namespace_norm, pod_norm, reason_norm, severity, start_epoch, end_epoch, dup_of) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (cid, sum(terms.values()), meta.get("namespace_norm", ""), meta.get("pod_norm", ""),
+             meta.get("reason_norm", ""), meta.get("severity", 0), meta.get("start_epoch", 0.0),
+             meta.get("end_epoch", 0.0), meta.get("dup_of", "")),
+        )
+        conn.executemany(
+            "INSERT INTO postings (term, id, tf) VALUES (?, ?, ?)",
+            [(t, cid, n) for t, n in terms.items()],
+        )
+    conn.commit()
+
+
+def forget(conn, ids):
+    _delete(conn, ids)
+    conn.commit()
+
+
+def reset(conn):
+    conn.execute("DELETE FROM postings")
+    conn.execute("DELETE FROM docs")
+    conn.commit()
+
+
+def count(conn) -> int:
+    return conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+
+def _filter_sql(namespace=None, pod=None, reason=None, min_severity=None, since=None, until=None):
+    clauses, params = [], []
+    for col, value in (("namespace_norm", namespace), ("pod_norm", pod), ("reason_norm", reason)):
+        if value:
+            clauses.append(f"d.{col} = ?")
+            params.append(value)
+    # time range: chunks whose [start_epoch, end_epoch] overlaps [since, until]
+    for clause, value in (("d.severity >= ?", min_severity), ("d.end_epoch >= ?", since),
+                          ("d.start_epoch > 0 AND d.start_epoch <= ?", until)):
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+    return "".join(f" AND {c}" for c in clauses), params
+
+
+def numeric_ready(conn) -> bool:
+    """False while rows written before the numeric columns existed are still un-migrated."""
+    return conn.execute("SELECT 1 FROM docs WHERE start_epoch IS NULL LIMIT 1").fetchone() is None
+
+
+def page(conn, limit: int, offset: int = 0, order_by=None, reverse: bool = False, **filters):
+    """
+    (total, ids) of one filtered, sorted listing page straight from the index.
+    order_by is a /logs sort key from ORDER_COLUMNS; ties fall back to id.
+    """
+    where, params = _filter_sql(**filters)
+    direction = "DESC" if reverse else "ASC"
+    col = ORDER_COLUMNS[order_by]
+    order = f"d.{col} {direction}" + (f", d.id {direction}" if col != "id" else "")
+    total = conn.execute(f"SELECT COUNT(*) FROM docs d WHERE 1=1{where}", params).fetchone()[0]
+    ids = [row[0] for row in conn.execute(
+        f"SELECT d.id FROM docs d WHERE 1=1{where} ORDER BY {order} LIMIT ? OFFSET ?",
+        [*params, limit, offset],
+    )]
+    return total, ids
+
+
+def search(conn, query: str, k: int, distinct: bool = False, **filters):
+    """
+    BM25 top-k over reason/message tokens, optionally restricted to the
+    normalized namespace/pod/reason filters, a minimum severity and a
+    since/until time range (epoch seconds). Returns ([(id, score)], matched)
+    where matched is how many chunks contain at least one query term.
+    distinct=True keeps only the best-scoring chunk of each --dedup group
+    (a representative and its member stubs).
+
+    A query token that is also a chunk's reason matches the r: field term
+    as well, so "OOMKilled" ranks chunks whose reason is OOMKilled first.
+    """
+    tokens = tokenize(query)
+    if not tokens or k <= 0:
+        return [], 0
+    terms = list(dict.fromkeys(tokens + [REASON_PREFIX + t for t in tokens]))
+    where, fparams = _filter_sql(**filters)
+
+    n_docs, avg_len = conn.execute(f"SELECT COUNT(*), AVG(length) FROM docs d WHERE 1=1{where}", fparams).fetchone()
+    if not n_docs:
+        return [], 0
+    avg_len = avg_len or 1.0
+
+    scores, groups = {}, {}
+    for term in terms:
+        rows = conn.execute(
+            f"SELECT p.id, p.tf, d.length, d.dup_of FROM postings p JOIN docs d ON d.id = p.id "
+            f"WHERE p.term = ?{where}",
+            [term, *fparams],
+        ).fetchall()
+        if not rows:
+            continue
+        idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+        for cid, tf, length, dup_of in rows:
+            norm_tf = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len))
+            scores[cid] = scores.get(cid, 0.0) + idf * norm_tf
+            groups[cid] = dup_of or cid
+
+    ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+    if distinct:
+        best = {}
+        for cid, score in ranked:
+            best.setdefault(groups[cid], (cid, score))
+        ranked = list(best.values())
+    return ranked[:k], len(ranked)
@@ -0,0 +1,366 @@
+# live_ingest.py
+"""
+Long-running ingest: consume a Kubernetes event stream and keep the index
+current without re-running parse_events.py + embed_index_events.py.
+
+    kubectl get events -A -w -o json | python live_ingest.py
+    python live_ingest.py --follow events.jsonl            # tail a file (local testing)
+    python live_ingest.py --seed processed/events.jsonl    # index a batch export first
+
+Events are micro-batched (--flush_interval) into their (namespace, object)
+chunks, grouped exactly like parse_events.py; only the chunks they touch are
+rebuilt, and only re-worded chunks are re-embedded. The index is the state:
+a group not in memory is read back from its indexed chunk lines before new
+events join it, so batch-indexed history and earlier runs are kept, and idle
+groups can be dropped from memory (MAX_GROUPS). A bounded queue sits
+between the reader and the embedder: when encoding falls behind, the reader
+stops draining the pipe and kubectl blocks instead of memory growing.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import codecs
+import argparse
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+import embeddings
+import index_manifest
+import lexical_index
+import embed_index_events
+import parse_events
+import timestamps
+
+# ---- CONFIG ----
+FLUSH_INTERVAL = 1.0  # seconds the first event of a micro-batch may wait
+MAX_BATCH_EVENTS = 500  # flush early once this many events are pending
+QUEUE_SIZE = 10000  # events buffered between reader and embedder (backpressure bound)
+LATENCY_TARGET = 5.0  # seconds from event arrival to searchable; a flush over this warns
+MAX_GROUP_EVENTS = 200  # distinct events kept per chunk group (oldest last_seen dropped)
+MAX_GROUPS = 5000  # chunk groups held in memory; least recently touched reload from the index
+POLL_INTERVAL = 0.25  # --follow: seconds between checks for new data
+LIVE_SOURCE = "live"  # manifest source of live chunks (batch re-runs only delete their own)
+
+
+# ---- Input ----
+class StreamReader:
+    """
+    File-like read(n) over a pipe or a tailed file that returns whatever is
+    available, so iter_json_values sees each event as it arrives rather than
+    once a full block has been buffered.
+    """
+
+    def __init__(self, path: Path = None, follow: bool = False, from_start: bool = False,
+                 poll: float = POLL_INTERVAL, stop: threading.Event = None):
+        self.path = path
+        self.follow = follow
+        self.poll = poll
+        self.stop = stop or threading.Event()
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        if path is None:
+            self._fd = sys.stdin.fileno()
+            self._fh = None
+        else:
+            self._fh = open(path, "rb", buffering=0)
+            self._fd = self._fh.fileno()
+            if follow and not from_start:
+                os.lseek(self._fd, 0, os.SEEK_END)
+
+    def _reopen_if_rotated(self):
+        # truncated in place (copytruncate) or replaced by a new file (rename rotation)
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if st.st_ino != os.fstat(self._fd).st_ino:
+            self._fh.close()
+            self._fh = open(self.path, "rb", buffering=0)
+            self._fd = self._fh.fileno()
+        elif st.st_size < os.lseek(self._fd, 0, os.SEEK_CUR):
+            os.lseek(self._fd, 0, os.SEEK_SET)
+
+    def read(self, size: int = 1 << 16) -> str:
+        while not self.stop.is_set():
+            data = os.read(self._fd, size)
+            if data:
+                text = self._decoder.decode(data)
+                if text:
+                    return text
+                continue
+            if not self.follow:
+                break
+            time.sleep(self.poll)
+            self._reopen_if_rotated()
+        return self._decoder.decode(b"", final=True)
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+
+
+def read_events(reader: StreamReader, out: queue.Queue):
+    """Reader thread: parsed events onto `out` as (arrival time, event); None marks the end."""
+    try:
+        for row in parse_events.iter_json_rows(reader, retry_growth=1):
+            # blocks while the queue is full: backpressure onto the producer
+            out.put((time.monotonic(), parse_events.finish_event(row)))
+    except Exception as e:
+        print(f"[ERROR] Event stream failed: {e}")
+    finally:
+        out.put(None)
+
+
+def load_seed(path: Path):
+    """Events JSONL as written by parse_events.py --events_out."""
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+# ---- Chunk state ----
+def event_identity(ev: dict):
+    # a watch re-sends an Event on every count bump; the newest copy replaces the last
+    return ev.get("type"), ev.get("reason"), ev.get("object"), ev.get("message")
+
+
+def seen_epoch(ev: dict) -> float:
+    # batch exports carry relative ages ("5m", "<unknown>"): they parse to 0.0, i.e. oldest
+    return timestamps.to_epoch(ev.get("last_seen") or "")
+
+
+def indexed_events(collection, manifest, key):
+    """Events of one (namespace, object) group as currently indexed, read back from its chunk lines."""
+    ns, objkey = key
+    ids = sorted(index_manifest.part_ids(manifest, f"{ns}-{objkey}"))
+    if not ids:
+        return []
+    got = collection.get(ids=ids, include=["documents"])
+    events = []
+    for doc in got["documents"]:
+        for line in (doc or "").splitlines():
+            ev = parse_events.event_from_line(line)
+            if ev is not None:
+                events.append(ev)
+    return events
+
+
+class LiveGroups:
+    """
+    Events per (namespace, object) group, re-chunked with parse_events' grouping
+    when touched. load(key) returns a group's indexed events the first time it
+    is touched (again after eviction), so a rebuild never drops its history.
+    """
+
+    def __init__(self, max_tokens: int = None, count_tokens=None, max_events: int = MAX_GROUP_EVENTS,
+                 load=None, max_groups: int = MAX_GROUPS):
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        self.max_events = max_events
+        self.max_groups = max_groups
+        self._load = load
+        self.groups = OrderedDict()  # least recently touched first
+
+    def _merge(self, group: dict, ev) -> bool:
+        ident = event_identity(ev)
+        prev = group.get(ident)
+        if prev is not None and seen_epoch(prev) >= seen_epoch(ev):
+            return False  # replayed or out-of-order copy of an event already held
+        group[ident] = ev
+        if len(group) > self.max_events:
+            oldest = min(group, key=lambda k: seen_epoch(group[k]))
+            del group[oldest]
+        return True
+
+    def add(self, events):
+        """Merge events into their groups; returns the set of group keys that changed."""
+        touched = set()
+        for ev in events:
+            key = parse_events.group_key(ev)
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = {}
+                for old in self._load(key) if self._load else ():
+                    self._merge(group, old)
+            self.groups.move_to_end(key)
+            if self._merge(group, ev):
+                touched.add(key)
+        return touched
+
+    def evict(self):
+        """Drop the least recently touched groups over max_groups (they reload from the index)."""
+        evicted = 0
+        while len(self.groups) > self.max_groups:
+            self.groups.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def chunks(self, keys):
+        out = []
+        for key in keys:
+            events = list(self.groups[key].values())
+            chunks = parse_events.group_into_chunks(events, self.max_tokens, self.count_tokens)
+            # watch events carry absolute times: the group's span makes since/until filters work
+            stamps = sorted((seen_epoch(e), e.get("last_seen")) for e in events)
+            stamps = [s for s in stamps if s[0] > 0]
+            for ch in chunks:
+                if stamps:
+                    ch["start_ts"], ch["end_ts"] = stamps[0][1], stamps[-1][1]
+            out.extend(chunks)
+        return out
+
+
+# ---- Indexing loop ----
+def flush(collection, manifest, lex, groups: LiveGroups, pending, encode):
+    touched = groups.add(ev for _, ev in pending)
+    chunks = groups.chunks(touched)
+    rows = [
+        embed_index_events.chunk_row(ch["id"], ch, ch["context_text"].strip())
+        for ch in chunks if ch["context_text"].strip()
+    ]
+    n_embedded = n_updated = 0
+    # sliced like index_chunks: one upsert must stay under Chroma's max batch size
+    for part in embed_index_events.batched(rows, embed_index_events.BATCH_SIZE):
+        to_embed, to_update = embed_index_events.sync_rows(collection, manifest, lex, LIVE_SOURCE, part, encode)
+        n_embedded += len(to_embed)
+        n_updated += len(to_update)
+
+    # a group that now fits in fewer parts leaves its old "#n" ids behind
+    produced = {r[0] for r in rows}
+    stale = set()
+    for parent in {ch["parent_id"] for ch in chunks}:
+        stale |= index_manifest.part_ids(manifest, parent) - produced
+    if stale:
+        embed_index_events.forget_ids(collection, manifest, lex, sorted(stale))
+
+    if hasattr(collection, "persist"):  # the NumPy store buffers writes in memory
+        collection.persist()
+    # only after the write: an evicted group reloads what was just indexed
+    groups.evict()
+    return len(touched), n_embedded, n_updated, len(stale)
+
+
+def run(reader: StreamReader, seed: Path = None, flush_interval: float = FLUSH_INTERVAL,
+        max_batch: int = MAX_BATCH_EVENTS, queue_size: int = QUEUE_SIZE,
+        max_tokens: int = None, tokenizer: str = parse_events.EMBED_TOKENIZER,
+        encode_batch_size: int = embed_index_events.ENCODE_BATCH_SIZE,
+        vector_backend: str = embed_index_events.VECTOR_BACKEND):
+    collection = embed_index_events.get_collection(vector_backend)
+    stamped, _ = embeddings.collection_model(collection)
+    if stamped and stamped != embed_index_events.MODEL_NAME:
+        print(f"[ERROR] {embed_index_events.COL_NAME} was embedded with {stamped}; "
+              f"re-index with embed_index_events.py --full first")
+        return
+
+    manifest = index_manifest.open_manifest(embed_index_events.MANIFEST_PATH)
+    lex = lexical_index.open_index(embed_index_events.LEXICAL_PATH)
+    max_tokens, count_tokens = parse_events.load_chunk_budget(tokenizer, max_tokens) if max_tokens != 0 else (0, None)
+    groups = LiveGroups(
+        max_tokens or None, count_tokens, load=lambda key: indexed_events(collection, manifest, key)
+    )
+
+    # Loaded before reading so the first flush does not pay for it
+    model = embed_index_events.load_model()
+    embeddings.stamp_collection(
+        collection, embed_index_events.MODEL_NAME, model.get_sentence_embedding_dimension(),
+        embeddings.registry.backend,
+    )
+
+    def encode(texts):
+        return embed_index_events.encode_texts(model, texts, encode_batch_size)
+
+    if seed is not None:
+        # indexed as it is read, like any flush: memory never holds events the index lacks,
+        # and a group spread over several slices reloads the earlier ones from the index
+        totals = [0, 0, 0, 0]
+        for batch in embed_index_events.batched(load_seed(seed), embed_index_events.BATCH_SIZE):
+            counts = flush(collection, manifest, lex, groups, [(None, ev) for ev in batch], encode)
+            totals = [t + n for t, n in zip(totals, counts)]
+        print(f"[✓] Seeded {seed} | group updates {totals[0]} | embedded {totals[1]} "
+              f"| metadata {totals[2]} | deleted {totals[3]}")
+
+    events = queue.Queue(maxsize=queue_size)
+    threading.Thread(target=read_events, args=(reader, events), name="event-reader", daemon=True).start()
+    print(f"[INFO] Ingesting into {embed_index_events.COL_NAME} "
+          f"(flush every {flush_interval}s or {max_batch} events, queue {queue_size})")
+
+    pending, done = [], False
+    total_events = 0
+    try:
+        while not done:
+            wait = flush_interval if not pending else max(0.0, pending[0][0] + flush_interval - time.monotonic())
+            try:
+                item = events.get(timeout=wait)
+                if item is None:
+                    done = True
+                else:
+                    pending.append(item)
+            except queue.Empty:
+                pass
+
+            if pending and (done or len(pending) >= max_batch
+                            or time.monotonic() - pending[0][0] >= flush_interval):
+                n_groups, n_embedded, n_updated, n_deleted = flush(
+                    collection, manifest, lex, groups, pending, encode
+                )
+                total_events += len(pending)
+                latency = time.monotonic() - pending[0][0]
+                print(
+                    f"[✓] Flush {len(pending)} events | groups {n_groups} | embedded {n_embedded} "
+                    f"| metadata {n_updated} | deleted {n_deleted} | latency {latency:.2f}s "
+                    f"| queued {events.qsize()} | total {total_events}"
+                )
+                if latency > LATENCY_TARGET:
+                    print(f"[WARN] Flush latency {latency:.1f}s over {LATENCY_TARGET}s; "
+                          "embedder is behind, reader is being throttled")
+                pending = []
+    except KeyboardInterrupt:
+        print("[INFO] Stopping")
+    finally:
+        reader.stop.set()
+        manifest.close()
+        lex.close()
+        reader.close()
+    print(f"[INFO] Ingested {total_events} events")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuously index a Kubernetes event stream")
+    parser.add_argument("--follow", default=None, help="Tail this file instead of reading stdin")
+    parser.add_argument("--from_start", action="store_true", help="With --follow, read the file from the beginning")
+    parser.add_argument("--seed", default=None, help="Events JSONL (parse_events.py --events_out) to index before reading")
+    parser.add_argument("--flush_interval", type=float, default=FLUSH_INTERVAL, help="Max seconds an event waits for its batch")
+    parser.add_argument("--max_batch", type=int, default=MAX_BATCH_EVENTS, help="Events per micro-batch before an early flush")
+    parser.add_argument("--queue_size", type=int, default=QUEUE_SIZE, help="Events buffered before the reader blocks")
+    parser.add_argument("--max_tokens", type=int, default=None,
+                        help="Token budget per chunk (default: model max_seq_length - special tokens; 0 = no splitting)")
+    parser.add_argument("--tokenizer", default=parse_events.EMBED_TOKENIZER, help="Tokenizer used to measure the budget")
+    parser.add_argument("--backend", choices=embeddings.BACKENDS, default=embeddings.DEFAULT_BACKEND,
+                        help="Embedding backend (default: EMBED_BACKEND or torch)")
+    parser.add_argument("--vector_backend", choices=embed_index_events.vector_store.VECTOR_BACKENDS,
+                        default=embed_index_events.VECTOR_BACKEND, help="Vector store (default: VECTOR_BACKEND or chroma)")
+    args = parser.parse_args()
+    embeddings.registry.backend = args.backend
+
+    if args.follow:
+        reader = StreamReader(Path(args.follow), follow=True, from_start=args.from_start)
+    else:
+        reader = StreamReader()
+    run(
+        reader,
+        seed=Path(args.seed) if args.seed else None,
+        flush_interval=args.flush_interval,
+        max_batch=args.max_batch,
+        queue_size=args.queue_size,
+        max_tokens=args.max_tokens,
+        tokenizer=args.tokenizer,
+        vector_backend=args.vector_backend,
+    )
+
+
+if __name__ == "__main__":
+    main()
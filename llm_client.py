@@ -0,0 +1,110 @@
+# llm_client.py
+import json
+import asyncio
+import httpx
+
+from utils_rag import extract_stream_delta
+
+
+class LLMBusyError(Exception):
+    """Raised when no LLM slot frees up within the queue timeout."""
+
+
+class LLMError(Exception):
+    """Raised when the LLM server answers a streaming request with an error."""
+
+
+class LLMClient:
+    """
+    Async client for the OpenAI-compatible local LLM server.
+
+    One pooled keep-alive httpx session is shared by every request, and a
+    semaphore caps how many generations run against the backend at once so
+    slow completions queue here instead of tying up server threads.
+    """
+
+    def __init__(self, url: str, max_concurrency: int = 2, max_connections: int = 8,
+                 connect_timeout: float = 5.0, queue_timeout: float = 120.0):
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.queue_timeout = queue_timeout
+        self._client = None
+        self._sem = None
+
+    def _ensure_client(self):
+        # Created lazily so both live on the event loop that serves requests
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=httpx.Timeout(None, connect=self.connect_timeout),
+            )
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def _acquire(self, wait: bool = False):
+        if wait:
+            await self._sem.acquire()
+            return
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMBusyError(f"all {self.max_concurrency} LLM slots busy for {self.queue_timeout}s")
+
+    async def chat(self, payload: dict, timeout: float, wait: bool = False) -> httpx.Response:
+        """
+        POST one chat completion; `timeout` bounds the generation itself.
+        wait=True queues for a slot without the queue timeout (background jobs).
+        """
+        client = self._ensure_client()
+        await self._acquire(wait)
+        try:
+            return await client.post(
+                self.url,
+                json=payload,
+                timeout=httpx.Timeout(timeout, connect=self.connect_timeout),
+            )
+        finally:
+            self._sem.release()
+
+    async def stream_chat(self, payload: dict, timeout: float):
+        """
+        Yield content deltas of a `stream: true` chat completion as they arrive.
+
+        The concurrency slot is held until the stream finishes or the consumer
+        goes away; `timeout` bounds the wait between chunks, not the whole run.
+        """
+        client = self._ensure_client()
+        await self._acquire()
+        try:
+            async with client.stream(
+                "POST",
+                self.url,
+                json={**payload, "stream": True},
+                timeout=httpx.Timeout(timeout, connect=self.connect_timeout),
+            ) as resp:
+                if resp.status_code != 200:
+                    body = await resp.aread()
+                    raise LLMError(body.decode("utf-8", errors="replace"))
+
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    delta = extract_stream_delta(json.loads(data))
+                    if delta:
+                        yield delta
+        finally:
+            self._sem.release()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._sem = None
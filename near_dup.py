@@ -0,0 +1,114 @@
+# near_dup.py
+import re
+import hashlib
+
+import numpy as np
+
+# ---- CONFIG ----
+MAX_DISTANCE = 3  # SimHash bits two chunks may differ in and still count as copies
+BANDS = 4  # LSH bands of 64 / BANDS bits; with MAX_DISTANCE < BANDS every match shares a band
+BUCKET_COMPARE_LIMIT = 64  # group signatures compared per band bucket (bounds hot buckets)
+
+# Volatile tokens: replicas of one workload differ only in these
+VOLATILE_PATTERNS = [
+    (re.compile(r"\bLAST_SEEN=\S+"), "LAST_SEEN=*"),
+    (re.compile(r"\bCOUNT=\d+"), "COUNT=*"),
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<ts>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I), "<uid>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<ip>"),
+    (re.compile(r"\baks-[a-z0-9]+-\d+-vmss[0-9a-z]{6}\b"), "<node>"),
+    (re.compile(r"\b[0-9a-f]{12,}\b", re.I), "<hex>"),
+    # ReplicaSet / Job / DaemonSet pod suffixes use Kubernetes' vowel-free alphabet
+    (re.compile(r"(?<=[a-z0-9])-[bcdfghjklmnpqrstvwxz2456789]{5,10}(?=\b|-)"), "-*"),
+    (re.compile(r"\b(?:\d+(?:ms|[smhd]))+\b"), "<age>"),
+]
+
+
+def normalize(text: str) -> str:
+    for pattern, repl in VOLATILE_PATTERNS:
+        text = pattern.sub(repl, text)
+    return " ".join(text.lower().split())
+
+
+def _hashes(tokens):
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little") for t in tokens),
+        dtype=np.uint64,
+        count=len(tokens),
+    )
+
+
+def simhash(normalized: str) -> int:
+    """64-bit SimHash over word bigrams of already-normalized text."""
+    words = normalized.split()
+    shingles = [f"{a} {b}" for a, b in zip(words, words[1:])] or words or [""]
+    bits = np.unpackbits(_hashes(shingles).view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(shingles)
+    return int.from_bytes(np.packbits(votes > 0, bitorder="little").tobytes(), "little")
+
+
+def _severity(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def find_duplicates(items, max_distance: int = MAX_DISTANCE, bands: int = BANDS):
+    """
+    items: iterable of (id, namespace, severity_hint, text).
+
+    Chunks of one namespace whose normalized text is identical, or whose
+    SimHash is within max_distance bits of a group's signature (LSH band
+    candidates), are grouped. A group's signature is that of the chunk that
+    opened it and never moves, so matches do not chain: every member is
+    within max_distance of it. Returns {representative id: [member ids]} for
+    groups with more than one chunk; the representative is the most severe
+    member, then the smallest id, so it is stable across runs.
+    """
+    if max_distance >= bands:
+        raise ValueError(f"max_distance must be < bands ({bands}) for the band index to find every match")
+    width = 64 // bands
+    mask = (1 << width) - 1
+
+    ids, sevs, group_of = [], [], []
+    exact, buckets, group_sigs = {}, {}, []
+
+    for cid, ns, sev, text in items:
+        ids.append(cid)
+        sevs.append(_severity(sev))
+        norm = normalize(text)
+
+        key = (ns, hashlib.blake2b(norm.encode("utf-8"), digest_size=16).digest())
+        if key in exact:  # verbatim copy after normalization: no SimHash needed
+            group_of.append(exact[key])
+            continue
+
+        sig = simhash(norm)
+        band_keys = [(ns, band, (sig >> (band * width)) & mask) for band in range(bands)]
+        # only group signatures are indexed: join the closest one within max_distance
+        best, best_distance = None, max_distance + 1
+        for bk in band_keys:
+            for g in buckets.get(bk, ())[-BUCKET_COMPARE_LIMIT:]:
+                d = (sig ^ group_sigs[g]).bit_count()
+                if d < best_distance:
+                    best, best_distance = g, d
+        if best is None:
+            best = len(group_sigs)
+            group_sigs.append(sig)
+            for bk in band_keys:
+                buckets.setdefault(bk, []).append(best)
+        exact[key] = best
+        group_of.append(best)
+
+    members = {}
+    for i, g in enumerate(group_of):
+        members.setdefault(g, []).append(i)
+
+    groups = {}
+    for idx in members.values():
+        if len(idx) < 2:
+            continue
+        rep = min(idx, key=lambda k: (-sevs[k], ids[k]))
+        groups[ids[rep]] = sorted(ids[k] for k in idx if k != rep)
+    return groups
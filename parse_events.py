@@ -5,6 +5,22 @@ import argparse
 from pathlib import Path
 from typing import List, Dict, Any
 
+from embeddings import DEFAULT_MODEL, max_seq_length
+from token_counter import load_tokenizer, load_token_counter, counter_for
+
+# Only the optional --columnar path needs these; imported on first use so
+# importers of the line-oriented helpers (evidence_packer, rag_api) stay light
+np = pd = None
+
+def _columnar():
+    global np, pd
+    if pd is None:
+        try:
+            import numpy as np
+            import pandas as pd
+        except ImportError as e:
+            raise RuntimeError("pandas is required for the columnar path") from e
+
 COLS = ["namespace", "last_seen", "type", "reason", "object", "message"]
 
 def parse_table_line(line: str, col_count: int) -> List[str]:
@@ -15,74 +31,292 @@ def parse_table_line(line: str, col_count: int) -> List[str]:
         parts += [""] * (col_count - len(parts))
     return parts[:col_count]
 
+# kubectl header cell -> event field; cells are separated by 2+ spaces, words within a cell by one
+HEADER_KEYS = {
+    "NAMESPACE": "namespace",
+    "LAST SEEN": "last_seen",
+    "TYPE": "type",
+    "REASON": "reason",
+    "OBJECT": "object",
+    "MESSAGE": "message",
+}
+HEADER_CELL_RE = re.compile(r"\S+(?: \S+)*")
+
+def is_header_line(line: str) -> bool:
+    return line.startswith(("NAMESPACE ", "LAST SEEN ")) and "REASON" in line
+
+def column_layout(header: str):
+    """
+    Derive (field, start, end) slices from a kubectl table header once. kubectl
+    pads every column to its widest cell, so each value starts exactly under
+    its header; the last column (MESSAGE) runs to the end of the line.
+    """
+    cells = list(HEADER_CELL_RE.finditer(header.rstrip()))
+    layout = []
+    for i, m in enumerate(cells):
+        field = HEADER_KEYS.get(m.group(), m.group().lower().replace(" ", "_"))
+        end = cells[i + 1].start() if i + 1 < len(cells) else None
+        layout.append((field, m.start(), end))
+    return layout
+
+def slice_table_line(line: str, layout) -> Dict[str, Any]:
+    return {field: line[start:end].strip() for field, start, end in layout}
+
+def finish_event(row: Dict[str, Any]) -> Dict[str, Any]:
+    # derive pod and resource type from object
+    obj = row.get("object", "")
+    resource = None
+    pod = None
+    if "/" in obj:
+        resource, name = obj.split("/", 1)
+        if resource == "pod":
+            pod = name
+    row["resource"] = resource
+    row["pod"] = pod
+    # simple severity level
+    row["severity_hint"] = derive_severity(row)
+    return row
+
+def event_from_json(obj: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a core/v1 (or events.k8s.io/v1) Event object onto the table columns."""
+    meta = obj.get("metadata") or {}
+    inv = obj.get("involvedObject") or obj.get("regarding") or {}
+    kind = (inv.get("kind") or "").lower()
+    name = inv.get("name") or ""
+    row = {
+        "namespace": meta.get("namespace") or inv.get("namespace") or "",
+        "last_seen": (
+            obj.get("lastTimestamp")
+            or (obj.get("series") or {}).get("lastObservedTime")
+            or obj.get("eventTime")
+            or meta.get("creationTimestamp")
+            or ""
+        ),
+        "type": obj.get("type") or "",
+        "reason": obj.get("reason") or "",
+        "object": f"{kind}/{name}" if kind else name,
+        "message": " ".join((obj.get("message") or obj.get("note") or "").split()),
+    }
+    return row
+
+def iter_json_values(fh, block_size: int = 1 << 16, retry_growth: int = 2):
+    """
+    Stream concatenated JSON values (JSON lines, `kubectl get events -w -o json`
+    output, or one `-o json` List document) from a text file handle.
+
+    A partial value is re-parsed once the buffer has grown retry_growth times;
+    live streams (live_ingest.py) pass 1 so every event is yielded on arrival.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    retry_at = 0  # only re-attempt a partial value once the buffer has grown enough
+    for block in iter(lambda: fh.read(block_size), ""):
+        buf += block
+        if len(buf) < retry_at:
+            continue
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos >= len(buf):
+                break
+            try:
+                value, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break
+            yield value
+        buf = buf[pos:]
+        retry_at = retry_growth * len(buf)
+    if buf.strip():
+        yield decoder.decode(buf.strip())
+
+def iter_json_rows(fh, retry_growth: int = 2):
+    for value in iter_json_values(fh, retry_growth=retry_growth):
+        if isinstance(value, list):
+            value = {"items": value}
+        if not isinstance(value, dict):
+            continue
+        # `--output-watch-events` wraps each object as {"type": "ADDED", "object": {...}}
+        if isinstance(value.get("object"), dict) and "kind" in value["object"]:
+            value = value["object"]
+        items = value.get("items") if "items" in value else [value]
+        for item in items:
+            yield event_from_json(item)
+
+def iter_table_rows(fh):
+    layout = None
+    for line in fh:
+        line = line.rstrip("\n")
+        if not line.strip():
+            continue
+        # the header (re)defines the column offsets, e.g. for concatenated dumps
+        if layout is None or is_header_line(line):
+            layout = column_layout(line)
+            continue
+        row = {c: "" for c in COLS}
+        row.update(slice_table_line(line, layout))
+        yield row
+
+def iter_rows(input_path: Path):
+    """Raw column dicts (no resource/pod/severity yet) from a table or JSON events file."""
+    with input_path.open("r", encoding="utf-8") as fh:
+        first = fh.read(1)
+        while first and first.isspace():
+            first = fh.read(1)
+        fh.seek(0)
+        if first in ("{", "["):
+            yield from iter_json_rows(fh)
+        else:
+            yield from iter_table_rows(fh)
+
+def iter_events(input_path: Path):
+    """
+    Lazily parse events from a `kubectl get events -A` table dump or from
+    `kubectl get events -o json` / JSON-lines output, one line at a time.
+    """
+    for row in iter_rows(input_path):
+        yield finish_event(row)
+
 def parse_events_file(input_path: Path) -> List[Dict[str, Any]]:
-    lines = [l for l in input_path.read_text(encoding="utf-8").splitlines() if l.strip()]
-    if not lines:
-        return []
+    return list(iter_events(input_path))
 
-    header = lines[0]
-    # Use same split logic on header to determine column positions
-    header_cols = re.split(r"\s{2,}", header.strip())
-    col_count = len(header_cols)
-
-    events = []
-    for line in lines[1:]:
-        parts = parse_table_line(line, col_count)
-        row = dict(zip(COLS, parts))
-        # derive pod and resource type from object
-        obj = row.get("object", "")
-        resource = None
-        pod = None
-        if "/" in obj:
-            resource, name = obj.split("/", 1)
-            if resource == "pod":
-                pod = name
-        row["resource"] = resource
-        row["pod"] = pod
-        # simple severity level
-        row["severity_hint"] = derive_severity(row)
-        events.append(row)
-    return events
-
-def derive_severity(ev: Dict[str, Any]) -> int:
-    etype = (ev.get("type") or "").lower()
-    reason = (ev.get("reason") or "").lower()
-    msg = (ev.get("message") or "").lower()
-    if "imagepullbackoff" in msg or "imagepull" in reason:
-        return 8
-    if "failed" in reason or etype == "warning":
-        return 7
-    if "backoff" in reason or "back-off" in msg:
-        return 6
-    if etype == "normal":
-        return 2
-    return 3
-
-def group_into_chunks(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+# (field, op, pattern, severity) checked in order on lowercased values; first match wins
+SEVERITY_RULES = [
+    ("message", "contains", "imagepullbackoff", 8),
+    ("reason", "contains", "imagepull", 8),
+    ("reason", "contains", "failed", 7),
+    ("type", "equals", "warning", 7),
+    ("reason", "contains", "backoff", 6),
+    ("message", "contains", "back-off", 6),
+    ("type", "equals", "normal", 2),
+]
+DEFAULT_SEVERITY = 3
+
+def derive_severity(ev: Dict[str, Any], rules=SEVERITY_RULES) -> int:
+    for field, op, pattern, severity in rules:
+        value = (ev.get(field) or "").lower()
+        if (pattern in value) if op == "contains" else (value == pattern):
+            return severity
+    return DEFAULT_SEVERITY
+
+# ---- Token budget ----
+EMBED_TOKENIZER = DEFAULT_MODEL  # the embedding model's own tokenizer
+EMBED_MAX_SEQ_LENGTH = 128  # used when the model's own max_seq_length cannot be read
+SPECIAL_TOKENS = 2  # [CLS] + [SEP], used when the tokenizer cannot be loaded
+
+def load_chunk_budget(name: str = EMBED_TOKENIZER, max_tokens: int = None):
+    """
+    (max_tokens, count_tokens) for chunks embedded with `name`. Counts exclude
+    special tokens, so the default budget is the model's max_seq_length minus
+    the [CLS]/[SEP] tokens the model adds: a part that fills it is embedded
+    whole instead of being truncated.
+    """
+    tok = load_tokenizer(name)
+    if max_tokens is None:
+        # an unreachable tokenizer means the hub is too: skip a second round of retries
+        seq_len = max_seq_length(name) if tok is not None else None
+        if seq_len is None and tok is not None and tok.model_max_length < 100_000:
+            seq_len = tok.model_max_length  # no sentence-transformers config: the tokenizer's limit
+        special = tok.num_special_tokens_to_add() if tok is not None else SPECIAL_TOKENS
+        max_tokens = (seq_len or EMBED_MAX_SEQ_LENGTH) - special
+        print(f"[INFO] Chunk token budget {max_tokens} ({seq_len or EMBED_MAX_SEQ_LENGTH} max_seq_length - {special} special tokens)")
+    return max_tokens, counter_for(tok)
+
+def dedup_lines(lines: List[str], sevs: List[int]):
+    """
+    Collapse identical event lines, keeping the first position, and tag
+    repeats with COUNT=n ahead of MESSAGE. Returns (lines, sevs).
+    """
+    counts = {}
+    for i, line in enumerate(lines):
+        if line in counts:
+            counts[line][1] += 1
+        else:
+            counts[line] = [i, 1]
+    out_lines, out_sevs = [], []
+    for line, (i, n) in counts.items():
+        if n > 1:
+            line = line.replace(" MESSAGE=", f" COUNT={n} MESSAGE=", 1)
+        out_lines.append(line)
+        out_sevs.append(sevs[i])
+    return out_lines, out_sevs
+
+def split_by_budget(lines: List[str], max_tokens: int, count_tokens) -> List[range]:
+    """Greedy in-order split into line ranges of at most max_tokens (a longer single line stands alone)."""
+    parts = []
+    start, used = 0, 0
+    for i, n in enumerate(count_tokens(lines)):
+        n += 1 if i > start else 0  # the joining newline
+        if i > start and used + n > max_tokens:
+            parts.append(range(start, i))
+            start, used = i, n - 1
+        else:
+            used += n
+    parts.append(range(start, len(lines)))
+    return parts
+
+def build_group_chunks(ns: str, objkey: str, pod, reason, lines: List[str], sevs: List[int],
+                       max_tokens: int = None, count_tokens=None) -> List[Dict[str, Any]]:
+    """
+    Chunks for one (namespace, object) group whose lines are already in
+    severity order: repeated lines are deduplicated, and with max_tokens the
+    group is split into ordered parts sharing parent_id (ids "<parent>#<n>").
+    """
+    parent_id = f"{ns}-{objkey}"
+    lines, sevs = dedup_lines(lines, sevs)
+    if max_tokens and lines:
+        parts = split_by_budget(lines, max_tokens, count_tokens or load_token_counter(EMBED_TOKENIZER))
+    else:
+        parts = [range(len(lines))]
+
+    chunks = []
+    for n, part in enumerate(parts, 1):
+        chunks.append({
+            "id": parent_id if len(parts) == 1 else f"{parent_id}#{n}",
+            "parent_id": parent_id,
+            "part": n,
+            "parts": len(parts),
+            "cluster": "aks-cluster",    # or set externally if you know
+            "namespace": ns,
+            "pod": pod,
+            "object": objkey,
+            "reason": reason,
+            "start_ts": None,            # events don't have absolute time here; optional
+            "end_ts": None,
+            # lines are severity-ordered, so a part's first line is its most severe
+            "severity_hint": max(0, sevs[part.start]) if len(part) else 0,
+            "context_text": "\n".join(lines[part.start:part.stop])
+        })
+    return chunks
+
+def group_key(ev: Dict[str, Any]):
+    """(namespace, object key) of the chunk an event belongs to."""
+    ns = ev.get("namespace") or "default"
+    pod = ev.get("pod")
+    if pod:
+        return ns, f"pod/{pod}"
+    return ns, ev.get("object") or "unknown"
+
+def group_into_chunks(events: List[Dict[str, Any]], max_tokens: int = None, count_tokens=None) -> List[Dict[str, Any]]:
     """
     Group events by (namespace, pod). For non-pod objects (secretstore, clustersecretstore),
-    group by (namespace, object).
+    group by (namespace, object). Groups over max_tokens become several parts.
     """
     groups = {}
     for ev in events:
-        ns = ev.get("namespace") or "default"
-        pod = ev.get("pod")
-        obj = ev.get("object")
-        if pod:
-            key = (ns, f"pod/{pod}")
-        else:
-            key = (ns, obj or "unknown")
-        groups.setdefault(key, []).append(ev)
+        groups.setdefault(group_key(ev), []).append(ev)
 
     chunks = []
     for (ns, objkey), evs in groups.items():
         # sort by severity_hint descending, then keep all
         evs_sorted = sorted(evs, key=lambda e: e.get("severity_hint", 0), reverse=True)
         lines = []
-        max_sev = 0
+        sevs = []
         pod = None
+        # most severe event decides the chunk-level reason
+        reason = evs_sorted[0].get("reason") if evs_sorted else None
         for e in evs_sorted:
-            max_sev = max(max_sev, e.get("severity_hint", 0))
+            sevs.append(e.get("severity_hint", 0))
             if e.get("pod"):
                 pod = e["pod"]
             line = (
@@ -94,19 +328,156 @@ def group_into_chunks(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
                 f"MESSAGE={e.get('message')}"
             )
             lines.append(line)
-        context_text = "\n".join(lines)
-        chunk_id = f"{ns}-{objkey}"
-        chunks.append({
-            "id": chunk_id,
-            "cluster": "aks-cluster",    # or set externally if you know
-            "namespace": ns,
-            "pod": pod,
-            "object": objkey,
-            "start_ts": None,            # events don't have absolute time here; optional
-            "end_ts": None,
-            "severity_hint": max_sev,
-            "context_text": context_text
-        })
+        chunks.extend(build_group_chunks(ns, objkey, pod, reason, lines, sevs, max_tokens, count_tokens))
+    return chunks
+
+EVENT_LINE_RE = re.compile(
+    r"^NAMESPACE=(.*?) LAST_SEEN=(.*?) TYPE=(.*?) REASON=(.*?) OBJECT=(.*?)(?: COUNT=\d+)? MESSAGE=(.*)$"
+)
+
+def event_from_line(line: str):
+    """Event fields of one chunk line (the inverse of group_into_chunks' format), or None."""
+    m = EVENT_LINE_RE.match(line)
+    if m is None:
+        return None
+    # None fields were written as "None"; restoring them reproduces the same line
+    return finish_event({col: (None if v == "None" else v) for col, v in zip(COLS, m.groups())})
+
+# ---- Columnar path (pandas/NumPy) for million-event dumps ----
+def events_frame(rows):
+    """Collect raw rows (iter_rows) or finished event dicts straight into object columns."""
+    _columnar()
+    columns = {c: [] for c in COLS}
+    for row in rows:
+        for c, values in columns.items():
+            values.append(row.get(c))
+    # dtype=object: keep plain Python str/None cells (no string-dtype inference/NA checks)
+    return pd.DataFrame({c: np.array(v, dtype=object) for c, v in columns.items()}, dtype=object)
+
+def _factorize(df, field: str, factors: dict):
+    """
+    (codes, uniques) for one column with None kept as a value, so per-value
+    work runs once per unique. Memoized in `factors` across the columnar steps.
+    """
+    if field not in factors:
+        codes, uniques = pd.factorize(df[field].to_numpy(dtype=object), use_na_sentinel=False)
+        factors[field] = (codes, np.asarray(uniques, dtype=object))
+    return factors[field]
+
+def _missing(v) -> bool:
+    return v is None or v != v
+
+def _as_text(uniques):
+    # what an f-string renders for e.get(field): missing/None -> "None"
+    return np.array(["None" if _missing(u) else str(u) for u in uniques], dtype=object)
+
+def severity_column(df, rules=SEVERITY_RULES, default: int = DEFAULT_SEVERITY, factors: dict = None):
+    """Vectorized derive_severity(): each rule is evaluated per unique value, then broadcast."""
+    factors = {} if factors is None else factors
+    lowered = {}
+    conds = []
+    for field, op, pattern, _ in rules:
+        if field not in lowered:
+            codes, uniques = _factorize(df, field, factors)
+            lowered[field] = (codes, ["" if _missing(u) or not u else str(u).lower() for u in uniques])
+        codes, values = lowered[field]
+        hit = np.fromiter(
+            ((pattern in v) if op == "contains" else (v == pattern) for v in values),
+            dtype=bool, count=len(values)
+        )
+        conds.append(hit[codes])
+    return np.select(conds, [r[3] for r in rules], default=default)
+
+def finish_frame(df, rules=SEVERITY_RULES, factors: dict = None):
+    """Vectorized finish_event(): resource, pod and severity_hint columns."""
+    _columnar()
+    factors = {} if factors is None else factors
+    codes, uniques = _factorize(df, "object", factors)
+    resource_u = np.empty(len(uniques), dtype=object)
+    pod_u = np.empty(len(uniques), dtype=object)
+    for i, obj in enumerate(uniques):
+        if not _missing(obj) and "/" in obj:
+            resource_u[i], name = obj.split("/", 1)
+            pod_u[i] = name if resource_u[i] == "pod" else None
+    df["resource"] = pd.Series(resource_u[codes], index=df.index, dtype=object)
+    df["pod"] = pd.Series(pod_u[codes], index=df.index, dtype=object)
+    factors["pod"] = (codes, pod_u)
+    df["severity_hint"] = severity_column(df, rules, factors=factors)
+    return df
+
+def _combine(*code_arrays):
+    """Dense codes (first-appearance order) for the tuple of several code columns."""
+    codes = code_arrays[0].astype(np.int64)
+    for c in code_arrays[1:]:
+        codes, _ = pd.factorize(codes * (int(c.max()) + 1) + c, sort=False)
+    return codes
+
+def _text_key(values):
+    # merge uniques that render to the same key (e.g. None and "" -> "default")
+    codes, uniques = pd.factorize(values, sort=False)
+    return codes, np.asarray(uniques, dtype=object)
+
+def group_frame_into_chunks(df, factors: dict = None, max_tokens: int = None, count_tokens=None) -> List[Dict[str, Any]]:
+    """
+    Bulk group_into_chunks(): same groups, order and text, byte for byte,
+    but grouping, max-severity and the sorted concatenation run column-wise.
+    """
+    if df.empty:
+        return []
+
+    _columnar()
+    factors = {} if factors is None else factors
+    ns_codes, ns_u = _factorize(df, "namespace", factors)
+    obj_codes, obj_u = _factorize(df, "object", factors)
+    pod_codes, pod_u = _factorize(df, "pod", factors)
+
+    pod_truthy_u = np.array([not _missing(p) and bool(p) for p in pod_u], dtype=bool)
+    has_pod = pod_truthy_u[pod_codes]
+
+    # group keys as integer codes over the (few) unique key strings
+    ns_key_codes, ns_key_u = _text_key(
+        np.array([u if not _missing(u) and u else "default" for u in ns_u], dtype=object))
+    obj_key_codes, obj_key_u = _text_key(np.array(
+        ["pod/" + str(p) if t else "" for p, t in zip(pod_u, pod_truthy_u)]
+        + [u if not _missing(u) and u else "unknown" for u in obj_u], dtype=object))
+    ns_key = ns_key_codes[ns_codes]
+    obj_key = np.where(has_pod, obj_key_codes[pod_codes], obj_key_codes[len(pod_u) + obj_codes])
+
+    # group codes in first-appearance order == dict insertion order
+    codes = _combine(ns_key, obj_key)
+    sev = df["severity_hint"].to_numpy(dtype=np.int64)
+    # stable: group first, then severity descending, ties keep input order
+    order = np.lexsort((-sev, codes))
+
+    # "NAMESPACE=.. OBJECT=.. MESSAGE=" is rendered once per distinct prefix
+    prefix_fields = ("namespace", "last_seen", "type", "reason", "object")
+    field_codes = [_factorize(df, f, factors) for f in prefix_fields]
+    prefix_codes = _combine(*(c for c, _ in field_codes))
+    _, first_of_prefix = np.unique(prefix_codes, return_index=True)
+    ns_t, seen_t, type_t, reason_t, obj_t = (_as_text(u)[c[first_of_prefix]] for c, u in field_codes)
+    prefixes = ("NAMESPACE=" + ns_t + " LAST_SEEN=" + seen_t + " TYPE=" + type_t
+                + " REASON=" + reason_t + " OBJECT=" + obj_t + " MESSAGE=")
+    msg_codes, msg_u = _factorize(df, "message", factors)
+    lines = (prefixes[prefix_codes[order]] + _as_text(msg_u)[msg_codes[order]]).tolist()
+
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    starts = np.concatenate(([0], bounds)).tolist()
+    ends = np.concatenate((bounds, [len(order)])).tolist()
+    sorted_sev = sev[order].tolist()
+    first_rows = order[starts].tolist()
+
+    pod_vals = df["pod"].to_numpy(dtype=object)
+    reason_vals = df["reason"].to_numpy(dtype=object)
+
+    chunks = []
+    for a, b, r in zip(starts, ends, first_rows):
+        reason = reason_vals[r]
+        chunks.extend(build_group_chunks(
+            ns_key_u[ns_key[r]], obj_key_u[obj_key[r]],
+            pod_vals[r] if has_pod[r] else None,
+            None if _missing(reason) else reason,
+            lines[a:b], sorted_sev[a:b], max_tokens, count_tokens,
+        ))
     return chunks
 
 def main():
@@ -114,24 +485,40 @@ def main():
     parser.add_argument("--input", required=True, help="Path to raw AKS events log file")
     parser.add_argument("--events_out", default="processed/events.jsonl", help="Output JSONL for individual events")
     parser.add_argument("--chunks_out", default="processed/event_chunks.jsonl", help="Output JSONL for chunks (for embedding)")
+    parser.add_argument("--columnar", action="store_true", help="Parse, score and group with pandas/NumPy column ops")
+    parser.add_argument("--max_tokens", type=int, default=None,
+                        help="Token budget per chunk (default: model max_seq_length - special tokens; 0 = no splitting)")
+    parser.add_argument("--tokenizer", default=EMBED_TOKENIZER, help="Tokenizer used to measure the budget")
     args = parser.parse_args()
 
     input_path = Path(args.input)
-    events = parse_events_file(input_path)
-    print(f"Parsed {len(events)} events")
+    max_tokens, count_tokens = load_chunk_budget(args.tokenizer, args.max_tokens) if args.max_tokens != 0 else (0, None)
 
-    # Write events JSONL
-    with open(args.events_out, "w", encoding="utf-8") as f:
-        for ev in events:
-            f.write(json.dumps(ev) + "\n")
-    print(f"Wrote events JSONL -> {args.events_out}")
+    if args.columnar:
+        factors = {}
+        df = finish_frame(events_frame(iter_rows(input_path)), factors=factors)
+        print(f"Parsed {len(df)} events")
+        with open(args.events_out, "w", encoding="utf-8") as f:
+            for ev in df.to_dict("records"):
+                f.write(json.dumps({k: (None if v != v else v) for k, v in ev.items()}) + "\n")
+        print(f"Wrote events JSONL -> {args.events_out}")
+        chunks = group_frame_into_chunks(df, factors, max_tokens, count_tokens)
+    else:
+        # Write events JSONL while parsing
+        events = []
+        with open(args.events_out, "w", encoding="utf-8") as f:
+            for ev in iter_events(input_path):
+                f.write(json.dumps(ev) + "\n")
+                events.append(ev)
+        print(f"Parsed {len(events)} events")
+        print(f"Wrote events JSONL -> {args.events_out}")
+        chunks = group_into_chunks(events, max_tokens, count_tokens)
 
-    # Build chunks
-    chunks = group_into_chunks(events)
+    # Write chunks
     with open(args.chunks_out, "w", encoding="utf-8") as f:
         for ch in chunks:
             f.write(json.dumps(ch) + "\n")
-    print(f"Wrote chunks JSONL -> {args.chunks_out} (for embedding)")
+    print(f"Wrote {len(chunks)} chunks JSONL -> {args.chunks_out} (for embedding)")
 
 if __name__ == "__main__":
     main()
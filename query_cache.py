@@ -0,0 +1,67 @@
+# query_cache.py
+import time
+import threading
+from collections import OrderedDict
+
+
+def normalize_query(text: str) -> str:
+    # cache key only: MiniLM models are uncased, so case and spacing do not change the vector
+    return " ".join(text.split()).lower()
+
+
+class EmbeddingCache:
+    """Thread-safe, size-bounded LRU of normalized query text -> embedding (optional TTL)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored = entry
+                if self.ttl is None or time.monotonic() - stored < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, text: str, compute):
+        """Return the cached vector for `text`, calling compute(text) on a miss (the text as given)."""
+        key = normalize_query(text)
+        value = self.get(key)
+        if value is None:
+            # computed outside the lock so a slow encode never blocks other lookups
+            value = compute(text)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
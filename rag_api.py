@@ -1,39 +1,127 @@
 import os
 import json
-import requests
-from fastapi import FastAPI, HTTPException, Query
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pathlib import Path
 from pydantic import BaseModel
 from typing import Optional, List
 
-import chromadb
-from sentence_transformers import SentenceTransformer
+import embeddings
+import index_manifest
+import lexical_index
+import vector_store
 from utils_rag import extract_llm_text
+from query_cache import EmbeddingCache
+from llm_client import LLMClient, LLMBusyError, LLMError
+from diagnosis_cache import DiagnosisCache, diagnosis_fingerprint
+from diagnosis_jobs import JobQueue, QueueFullError
+from evidence_packer import pack_evidence
+import token_counter
+import incident
+from timestamps import parse_iso
 
 
 # ============================================================
 # FASTAPI APP
 # ============================================================
-app = FastAPI(title="AKS RAG API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up_models()
+    yield
+    await close_clients()
+
+
+app = FastAPI(title="AKS RAG API", lifespan=lifespan)
 
 
 # ============================================================
 # CONFIG / MODEL INITIALIZATION
 # ============================================================
-EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_MODEL = embeddings.DEFAULT_MODEL  # EMBED_MODEL env, shared with embed_index_events.py
+EMBED_WARMUP = os.getenv("EMBED_WARMUP", "1") == "1"  # load the model in the background at startup
 LLM_URL = os.getenv("LLM_URL", "http://localhost:4891/v1/chat/completions")
 LLM_MODEL = os.getenv("LLM_MODEL", "qwen2.5-3b-instruct-q4_k_m.gguf")
 CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_store")
+VECTOR_BACKEND = vector_store.VECTOR_BACKEND  # VECTOR_BACKEND env: chroma (default) | numpy
+LEXICAL_PATH = Path(os.getenv("LEXICAL_PATH", str(lexical_index.LEXICAL_PATH)))
+MANIFEST_PATH = Path(os.getenv("MANIFEST_PATH", str(index_manifest.MANIFEST_PATH)))  # facet counts live here
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")  # default for /logs?q= and /diagnose
+RRF_K = int(os.getenv("RRF_K", "60"))  # reciprocal-rank fusion constant for hybrid mode
+OVERFETCH_FACTOR = int(os.getenv("OVERFETCH_FACTOR", "2"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "1024"))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "0")) or None  # seconds, 0 = no expiry
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "2"))  # parallel generations the backend can run
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "120"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "180"))
+LLM_DETAILED_TIMEOUT = float(os.getenv("LLM_DETAILED_TIMEOUT", "240"))
+DIAGNOSIS_CACHE_PATH = os.getenv("DIAGNOSIS_CACHE_PATH", "./diagnosis_cache.db")
+DIAGNOSIS_CACHE_MAX_ENTRIES = int(os.getenv("DIAGNOSIS_CACHE_MAX_ENTRIES", "5000"))
+DIAGNOSIS_CACHE_MAX_AGE = float(os.getenv("DIAGNOSIS_CACHE_MAX_AGE", str(7 * 24 * 3600)))  # seconds
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "Qwen/Qwen2.5-3B-Instruct")  # "" = estimate chars/4
+EVIDENCE_TOKEN_BUDGET = int(os.getenv("EVIDENCE_TOKEN_BUDGET", "1200"))  # evidence tokens per /diagnose prompt
+# /diagnose/batch and /diagnose/incident map workers; one fewer than the LLM
+# slots so interactive /diagnose is never starved
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", str(max(1, LLM_CONCURRENCY - 1))))
+BATCH_QUEUE_SIZE = int(os.getenv("BATCH_QUEUE_SIZE", "200"))  # queued generations before 503
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))  # chunk ids + queries per request
+BATCH_JOB_TTL = float(os.getenv("BATCH_JOB_TTL", "3600"))  # seconds finished jobs stay pollable
+INCIDENT_MAX_CHUNKS = int(os.getenv("INCIDENT_MAX_CHUNKS", "200"))  # chunks one /diagnose/incident may cover
+INCIDENT_CLUSTER_CHUNKS = int(os.getenv("INCIDENT_CLUSTER_CHUNKS", str(incident.CLUSTER_MAX_CHUNKS)))
+INCIDENT_MAP_TOKEN_BUDGET = int(os.getenv("INCIDENT_MAP_TOKEN_BUDGET", "800"))  # evidence tokens per map prompt
+INCIDENT_REDUCE_TOKEN_BUDGET = int(os.getenv("INCIDENT_REDUCE_TOKEN_BUDGET", "1600"))  # summary tokens per reduce prompt
+
+# Token counts for the evidence budget, measured with the LLM's own tokenizer
+# once it has loaded in the background (chars/4 estimates until then)
+count_llm_tokens = token_counter.lazy_token_counter(LLM_TOKENIZER)
+
+# Query text -> embedding, shared by /logs and /diagnose
+query_cache = EmbeddingCache(maxsize=EMBED_CACHE_SIZE, ttl=EMBED_CACHE_TTL)
+
+
+def embed_query(text: str):
+    """
+    Query embedding from the shared model registry (loaded on first use).
+    Refuses collections stamped with another model: 409, or 503 if the model cannot load.
+    """
+    try:
+        embeddings.check_collection(collection, EMBED_MODEL)
+    except embeddings.EmbeddingModelMismatch as e:
+        raise HTTPException(409, str(e))
+
+    def compute(t):
+        # only a failed load is a 503; store and encode errors surface as they are
+        try:
+            model = embeddings.get_model(EMBED_MODEL)
+        except Exception as e:
+            raise HTTPException(503, f"Embedding model not available: {e}")
+        return model.encode(t).tolist()
+
+    return query_cache.get_or_compute(text, compute)
+
+
+# Pooled keep-alive session to the local LLM server
+llm = LLMClient(
+    LLM_URL,
+    max_concurrency=LLM_CONCURRENCY,
+    max_connections=LLM_CONCURRENCY * 2,
+    queue_timeout=LLM_QUEUE_TIMEOUT,
+)
 
-# Load embed model
-try:
-    embed_model = SentenceTransformer(EMBED_MODEL)
-except Exception as e:
-    embed_model = None
-    print("[WARN] Embedding model load failed:", e)
+# Evidence fingerprint -> finished LLM answer, persisted across restarts
+diagnosis_cache = DiagnosisCache(
+    DIAGNOSIS_CACHE_PATH,
+    max_entries=DIAGNOSIS_CACHE_MAX_ENTRIES,
+    max_age=DIAGNOSIS_CACHE_MAX_AGE,
+)
 
-# Connect to Chroma
-client = chromadb.PersistentClient(path=CHROMA_PATH)
-collection = client.get_or_create_collection("aks_chunks")
+# Vector store (Chroma by default, or the in-process NumPy index)
+collection = vector_store.open_collection("aks_chunks", VECTOR_BACKEND, chroma_path=CHROMA_PATH)
 
 
 # ============================================================
@@ -48,6 +136,307 @@ class DiagnoseByIdRequest(BaseModel):
     chunk_id: Optional[str] = None
     query: Optional[str] = None
     k: int = 5
+    mode: Optional[str] = None  # vector | lexical | hybrid (default SEARCH_MODE)
+    min_severity: Optional[int] = None  # query retrieval only: skip chunks below this severity_hint
+    since: Optional[str] = None  # epoch seconds or ISO-8601; chunks ending before are skipped
+    until: Optional[str] = None  # chunks starting after are skipped
+    force_refresh: bool = False
+
+
+class IncidentRequest(BaseModel):
+    query: Optional[str] = None  # omitted: the most recent chunks matching the filters
+    namespace: Optional[str] = None
+    pod: Optional[str] = None
+    reason: Optional[str] = None
+    k: int = 50
+    mode: Optional[str] = None
+    min_severity: Optional[int] = None
+    since: Optional[str] = None
+    until: Optional[str] = None
+    window_minutes: float = incident.INCIDENT_WINDOW / 60
+    force_refresh: bool = False
+
+
+class DiagnoseBatchRequest(BaseModel):
+    chunk_ids: List[str] = []
+    queries: List[str] = []
+    k: int = 5
+    mode: Optional[str] = None
+    min_severity: Optional[int] = None
+    since: Optional[str] = None
+    until: Optional[str] = None
+    force_refresh: bool = False
+
+
+# ============================================================
+# /logs helpers
+# ============================================================
+ITEM_KEYS = ["start_ts", "timestamp", "namespace", "pod", "node", "reason", "severity_hint"]
+# numeric metadata copies written by embed_index_events.py, used when sorting by these keys
+NUMERIC_SORT_KEYS = {"start_ts": "start_epoch", "end_ts": "end_epoch", "severity_hint": "severity"}
+
+
+def norm(s):
+    return s.strip().lower() if s else None
+
+
+def parse_time(value, name: str):
+    """since/until as epoch seconds: a number or an ISO-8601 timestamp (naive = UTC)."""
+    if value is None or not str(value).strip():
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return parse_iso(value).timestamp()
+    except ValueError:
+        raise HTTPException(400, f"{name} must be epoch seconds or an ISO-8601 timestamp")
+
+
+def build_where(namespace=None, pod=None, reason=None, min_severity=None, since=None, until=None):
+    """
+    Turn normalized filters into a Chroma `where` on the *_norm metadata
+    copies, plus range predicates on the numeric severity/start_epoch/end_epoch
+    copies so severity and time pre-filters narrow the candidates before ANN.
+    """
+    clauses = [
+        {f"{field}_norm": value}
+        for field, value in (("namespace", namespace), ("pod", pod), ("reason", reason))
+        if value
+    ]
+    if min_severity is not None:
+        clauses.append({"severity": {"$gte": min_severity}})
+    # overlap with [since, until]; start_epoch 0 means the chunk has no timestamp
+    if since is not None:
+        clauses.append({"end_epoch": {"$gte": since}})
+    if until is not None:
+        clauses += [{"start_epoch": {"$gt": 0}}, {"start_epoch": {"$lte": until}}]
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def retrieval_filters(namespace=None, pod=None, reason=None, min_severity=None, since=None, until=None):
+    """(Chroma where, lexical index filters) for one request's filter parameters."""
+    filters = {
+        "namespace": norm(namespace),
+        "pod": norm(pod),
+        "reason": norm(reason),
+        "min_severity": min_severity,
+        "since": parse_time(since, "since"),
+        "until": parse_time(until, "until"),
+    }
+    return build_where(**filters), filters
+
+
+def make_item(cid, doc, meta):
+    meta = dict(meta or {})
+    for k in ITEM_KEYS:
+        if meta.get(k) is None:
+            meta[k] = ""
+    return {"id": cid, "document": doc, "metadata": meta}
+
+
+def sort_items(items, sort_by, reverse):
+    numeric = NUMERIC_SORT_KEYS.get(sort_by)
+
+    def sort_val(it):
+        meta = it["metadata"]
+        return meta[numeric] if numeric in meta else meta.get(sort_by, "")
+
+    try:
+        return sorted(items, key=sort_val, reverse=reverse)
+    except TypeError:
+        return sorted(items, key=lambda x: x["id"], reverse=reverse)
+
+
+def count_where(where):
+    if where is None:
+        return collection.count()
+    return len(collection.get(where=where, include=[])["ids"])
+
+
+def fetch_page(where, sort_by, reverse, limit, offset):
+    """
+    Return (total, items) for a filtered listing without loading every document.
+
+    Filtering always runs inside Chroma. Without a sort key, limit/offset are
+    pushed down too; otherwise only the sort key column (metadatas) is scanned
+    and documents are fetched for the returned page alone.
+    """
+    if not sort_by:
+        got = collection.get(
+            where=where,
+            limit=limit,
+            offset=offset,
+            include=["documents", "metadatas"]
+        )
+        items = [make_item(c, d, m) for c, d, m in zip(got["ids"], got["documents"], got["metadatas"])]
+        return count_where(where), items
+
+    if sort_by == "id":
+        ids = sorted(collection.get(where=where, include=[])["ids"], reverse=reverse)
+    else:
+        got = collection.get(where=where, include=["metadatas"])
+        keyed = [make_item(c, None, m) for c, m in zip(got["ids"], got["metadatas"])]
+        ids = [it["id"] for it in sort_items(keyed, sort_by, reverse)]
+
+    page_ids = ids[offset: offset + limit]
+    if not page_ids:
+        return len(ids), []
+
+    got = collection.get(ids=page_ids, include=["documents", "metadatas"])
+    by_id = {c: make_item(c, d, m) for c, d, m in zip(got["ids"], got["documents"], got["metadatas"])}
+    return len(ids), [by_id[c] for c in page_ids if c in by_id]
+
+
+def dedup_group(cid, meta):
+    # a --dedup member stub (embed_index_events) shares its representative's vector
+    return (meta or {}).get("dup_of") or cid
+
+
+def vector_search(embedding, n, where=None, total=None, distinct=False):
+    """
+    Top-n hits for `embedding` among chunks matching `where`, nearest first.
+
+    Filters are applied by Chroma during the search. If the ANN index still
+    returns fewer than n matches (filtered HNSW can under-fill), n_results is
+    grown by OVERFETCH_FACTOR until n hits are found or every match is covered.
+    distinct=True keeps only the nearest chunk of each --dedup group.
+    """
+    if total is None:
+        total = count_where(where)
+    n = min(n, total)
+    if n <= 0:
+        return [], [], [], []
+
+    fetch = n
+    while True:
+        res = collection.query(
+            query_embeddings=[embedding],
+            n_results=fetch,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        rows = list(zip(res["ids"][0], res["documents"][0], res["metadatas"][0], res["distances"][0]))
+        if distinct:
+            best = {}
+            for row in rows:
+                best.setdefault(dedup_group(row[0], row[2]), row)
+            rows = list(best.values())
+        if len(rows) >= n or fetch >= total:
+            break
+        fetch = min(fetch * OVERFETCH_FACTOR, total)
+
+    rows = rows[:n]
+    return [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], [r[3] for r in rows]
+
+
+def check_mode(mode):
+    mode = (mode or SEARCH_MODE).lower()
+    if mode not in SEARCH_MODES:
+        raise HTTPException(400, f"mode must be one of {', '.join(SEARCH_MODES)}")
+    return mode
+
+
+def lexical_search(q, n, filters, distinct=False):
+    """([(id, bm25)], matched) from the inverted index built next to the collection."""
+    conn = lexical_index.open_readonly(LEXICAL_PATH)
+    if conn is None:  # nothing indexed yet
+        return [], 0
+    try:
+        return lexical_index.search(conn, q, n, distinct, **filters)
+    finally:
+        conn.close()
+
+
+def search_hits(q, n, where=None, filters=None, mode=SEARCH_MODE):
+    """
+    Top-n hits for `q` as ([{id, doc, meta, distance?, bm25?, score?}], total).
+
+    vector: filtered ANN search; lexical: BM25 over reason/message tokens;
+    hybrid: both lists (n each) fused by reciprocal rank, so an exact
+    Kubernetes reason and semantically close text both surface.
+
+    Near-duplicates collapsed by --dedup count once (the best-ranked copy),
+    unless a pod filter asks for that pod's own member stubs.
+    """
+    filters = filters or {}
+    hits, ranked, total = {}, [], None
+    distinct = not filters.get("pod")
+
+    if mode in ("vector", "hybrid"):
+        embedding = embed_query(q)
+        total = count_where(where)
+        ids, docs, metas, dists = vector_search(embedding, n, where, total, distinct)
+        for cid, doc, meta, dist in zip(ids, docs, metas, dists):
+            hits[cid] = {"id": cid, "doc": doc, "meta": meta or {}, "distance": dist}
+        ranked.append(ids)
+
+    if mode in ("lexical", "hybrid"):
+        lex, matched = lexical_search(q, n, filters, distinct)
+        for cid, score in lex:
+            hits.setdefault(cid, {"id": cid})["bm25"] = score
+        ranked.append([cid for cid, _ in lex])
+        if total is None:
+            total = matched
+
+    # lexical-only hits still need their document and metadata
+    missing = [cid for cid, h in hits.items() if "doc" not in h]
+    if missing:
+        got = collection.get(ids=missing, include=["documents", "metadatas"])
+        for cid, doc, meta in zip(got["ids"], got["documents"], got["metadatas"]):
+            hits[cid].update(doc=doc, meta=meta or {})
+        for cid in missing:
+            if "doc" not in hits[cid]:  # index ahead of the collection
+                del hits[cid]
+
+    if mode != "hybrid":
+        return [hits[cid] for cid in ranked[0] if cid in hits], total
+
+    fused = {}
+    for ids in ranked:
+        for rank, cid in enumerate(ids):
+            if cid in hits:
+                fused[cid] = fused.get(cid, 0.0) + 1.0 / (RRF_K + rank + 1)
+    order = sorted(fused, key=lambda cid: -fused[cid])
+    if distinct:  # the two lists may have picked different copies of one group
+        best = {}
+        for cid in order:
+            best.setdefault(dedup_group(cid, hits[cid]["meta"]), cid)
+        order = list(best.values())
+    order = order[:n]
+    for cid in order:
+        hits[cid]["score"] = fused[cid]
+    return [hits[cid] for cid in order], total
+
+
+def index_page(filters, sort_by, reverse, limit, offset):
+    """
+    (total, items) for a filtered listing paged by an indexed ORDER BY in the
+    inverted index (numeric start/end/severity columns), or None when it cannot
+    answer: index not built or not yet migrated, or a sort key it does not hold.
+    """
+    if sort_by not in lexical_index.ORDER_COLUMNS:
+        return None
+    conn = lexical_index.open_readonly(LEXICAL_PATH)
+    if conn is None:
+        return None
+    try:
+        if not lexical_index.count(conn) or not lexical_index.numeric_ready(conn):
+            return None
+        total, page_ids = lexical_index.page(conn, limit, offset, sort_by, reverse, **filters)
+    finally:
+        conn.close()
+    if not page_ids:
+        return total, []
+    got = collection.get(ids=page_ids, include=["documents", "metadatas"])
+    by_id = {c: make_item(c, d, m) for c, d, m in zip(got["ids"], got["documents"], got["metadatas"])}
+    return total, [by_id[c] for c in page_ids if c in by_id]
 
 
 # ============================================================
@@ -59,161 +448,107 @@ def list_logs(
     pod: Optional[str] = Query(None),
     reason: Optional[str] = Query(None),
     q: Optional[str] = Query(None),
+    mode: Optional[str] = Query(None, description="vector | lexical | hybrid"),
+    min_severity: Optional[int] = Query(None, ge=0, le=10),
+    since: Optional[str] = Query(None, description="epoch seconds or ISO-8601"),
+    until: Optional[str] = Query(None, description="epoch seconds or ISO-8601"),
     sort_by: Optional[str] = Query("start_ts"),
     order: Optional[str] = Query("desc"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0)
 ):
-    def norm(s):
-        return s.strip().lower() if s else None
-
-    ns_f = norm(namespace)
-    pod_f = norm(pod)
-    reason_f = norm(reason)
     q_f = q.strip() if q else None
+    reverse = (order.lower() == "desc")
+    mode = check_mode(mode)
 
-    items = []
-
-    # Vector search
-    if q_f and embed_model:
-        try:
-            res = collection.query(
-                query_embeddings=[embed_model.encode(q_f).tolist()],
-                n_results=limit + offset,
-                include=["documents", "metadatas", "distances"]
-            )
-        except Exception as e:
-            raise HTTPException(500, f"Chroma query failed: {e}")
-
-        docs = res["documents"][0]
-        metas = res["metadatas"][0]
-        ids = res["ids"][0]
-
-        for cid, doc, meta in zip(ids, docs, metas):
-            meta = meta or {}
-
-            if ns_f and norm(meta.get("namespace")) != ns_f:
-                continue
-            if pod_f and norm(meta.get("pod")) != pod_f:
-                continue
-            if reason_f and norm(meta.get("reason")) != reason_f:
-                continue
-
-            items.append({"id": cid, "document": doc, "metadata": meta})
+    where, filters = retrieval_filters(namespace, pod, reason, min_severity, since, until)
 
-    else:
-        # Full DB scan
+    # Filtered listing: predicates and paging run in the store
+    if not q_f:
+        if sort_by == "relevance":
+            sort_by = None
         try:
-            got = collection.get(include=["documents", "metadatas"])
+            # numeric sort keys and id order are paged by the inverted index
+            result = index_page(filters, sort_by, reverse, limit, offset)
+            total, page = result or fetch_page(where, sort_by, reverse, limit, offset)
         except Exception as e:
             raise HTTPException(500, f"Chroma get failed: {e}")
+        return {"count": total, "items": page}
 
-        ids = got["ids"]
-        docs = got["documents"]
-        metas = got["metadatas"]
-
-        for cid, doc, meta in zip(ids, docs, metas):
-            meta = meta or {}
-
-            if ns_f and norm(meta.get("namespace")) != ns_f:
-                continue
-            if pod_f and norm(meta.get("pod")) != pod_f:
-                continue
-            if reason_f and norm(meta.get("reason")) != reason_f:
-                continue
-
-            items.append({"id": cid, "document": doc, "metadata": meta})
-
-    # Normalize metadata
-    KEYS = ["start_ts", "timestamp", "namespace", "pod", "node", "reason", "severity_hint"]
-    for it in items:
-        meta = it["metadata"]
-        for k in KEYS:
-            if not meta.get(k):
-                meta[k] = ""
-        it["metadata"] = meta
-
-    # Sort
-    reverse = (order.lower() == "desc")
-
-    def sort_val(it):
-        return it["metadata"].get(sort_by, "")
-
+    # The page is a window over the relevance ranking of the chosen mode
     try:
-        items = sorted(items, key=sort_val, reverse=reverse)
-    except:
-        items = sorted(items, key=lambda x: x["id"], reverse=reverse)
+        hits, total = search_hits(q_f, offset + limit, where, filters, mode)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Search failed: {e}")
 
-    # Pagination
-    total = len(items)
-    page = items[offset: offset + limit]
+    page = []
+    for h in hits[offset:]:
+        item = make_item(h["id"], h["doc"], h["meta"])
+        item["distance"] = h.get("distance")
+        for key in ("bm25", "score"):
+            if key in h:
+                item[key] = h[key]
+        page.append(item)
+
+    if sort_by and sort_by != "relevance":
+        page = sort_items(page, sort_by, reverse)
 
     return {"count": total, "items": page}
 
 
 # ============================================================
-# /diagnose ENDPOINT — UPDATED WITH STRICT OUTPUT FORMAT
+# /diagnose + /detailed helpers
 # ============================================================
-@app.post("/diagnose")
-def diagnose(req: DiagnoseByIdRequest):
-
-    if not req.chunk_id and not req.query:
-        raise HTTPException(400, "Either chunk_id or query must be provided.")
+def fetch_chunk(chunk_id: str):
+    try:
+        got = collection.get(
+            ids=[chunk_id],
+            include=["documents", "metadatas"]
+        )
+    except Exception as e:
+        raise HTTPException(500, f"Chroma get failed: {e}")
 
-    # Case 1: direct fetch by ID
-    if req.chunk_id:
-        try:
-            got = collection.get(
-                ids=[req.chunk_id],
-                include=["documents", "metadatas"]
-            )
-        except Exception as e:
-            raise HTTPException(500, f"Chroma get failed: {e}")
+    if not got["ids"]:
+        raise HTTPException(404, "Chunk not found.")
 
-        ids = got["ids"]
-        docs = got["documents"]
-        metas = got["metadatas"]
+    return {
+        "id": got["ids"][0],
+        "doc": got["documents"][0],
+        "meta": got["metadatas"][0] or {}
+    }
 
-        if not ids:
-            raise HTTPException(404, "Chunk not found.")
 
-        evidence = [{
-            "id": ids[0],
-            "doc": docs[0],
-            "meta": metas[0] or {}
-        }]
+def gather_evidence(req: DiagnoseByIdRequest):
+    # Case 1: direct fetch by ID
+    if req.chunk_id:
+        return [fetch_chunk(req.chunk_id)]
 
-    # Case 2: vector search
-    else:
-        if not embed_model:
-            raise HTTPException(500, "Embedding model not configured.")
+    # Case 2: search (vector, lexical or hybrid)
+    mode = check_mode(req.mode)
+    where, filters = retrieval_filters(min_severity=req.min_severity, since=req.since, until=req.until)
+    try:
+        hits, _ = search_hits(req.query, req.k, where, filters, mode)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Search failed: {e}")
 
-        try:
-            res = collection.query(
-                query_embeddings=[embed_model.encode(req.query).tolist()],
-                n_results=req.k,
-                include=["documents", "metadatas"]
-            )
-        except Exception as e:
-            raise HTTPException(500, f"Chroma query failed: {e}")
+    return [{"id": h["id"], "doc": h["doc"], "meta": h["meta"]} for h in hits]
 
-        ids = res["ids"][0]
-        docs = res["documents"][0]
-        metas = res["metadatas"][0]
 
-        evidence = [{"id": cid, "doc": d, "meta": m or {}} for cid, d, m in zip(ids, docs, metas)]
+def evidence_header(e):
+    m = e["meta"]
+    ts = m.get("start_ts") or m.get("timestamp") or ""
+    # near-duplicates collapsed at index time (embed_index_events --dedup) still count as occurrences
+    dups = f"Occurrences: {m['dup_count']} (same events on other pods/objects)\n" if (m.get("dup_count") or 1) > 1 else ""
+    return f"ID: {e['id']}\nTimestamp: {ts}\nNamespace: {m.get('namespace')}\nPod: {m.get('pod')}\nNode: {m.get('node')}\n{dups}\n"
 
-    # Build LLM prompt
-    formatted = []
-    for e in evidence:
-        m = e["meta"]
-        ts = m.get("start_ts") or m.get("timestamp") or ""
-        formatted.append(
-            f"ID: {e['id']}\nTimestamp: {ts}\nNamespace: {m.get('namespace')}\nPod: {m.get('pod')}\nNode: {m.get('node')}\n\n{e['doc']}"
-        )
 
-    evidence_text = "\n\n---\n\n".join(formatted)
-    evidence_text = evidence_text[:3500]
+def build_diagnose_payload(evidence):
+    """Return (payload, packing): evidence is packed into EVIDENCE_TOKEN_BUDGET in relevance order."""
+    evidence_text, packing = pack_evidence(evidence, evidence_header, EVIDENCE_TOKEN_BUDGET, count_llm_tokens)
 
     # 🔥 STRICT OUTPUT FORMAT INSTRUCTION
     user_prompt = f"""
@@ -248,50 +583,16 @@ Analyze the following AKS logs:
         "max_tokens": 1000,
         "temperature": 0.5,
     }
+    return payload, packing
 
-    try:
-        resp = requests.post(LLM_URL, json=payload, timeout=180)
-    except Exception as e:
-        raise HTTPException(500, f"LLM call failed: {e}")
-
-    if resp.status_code != 200:
-        raise HTTPException(500, f"LLM error: {resp.text}")
-
-    text = extract_llm_text(resp.json())
-
-    return {
-        "diagnosis": text,
-        "evidence": evidence,
-        "matched": len(evidence)
-    }
-@app.post("/detailed")
-def detailed_review(req: dict):
-
-    chunk_id = req.get("chunk_id")
-    if not chunk_id:
-        raise HTTPException(status_code=400, detail="chunk_id required")
-
-    # Fetch same chunk
-    try:
-        got = collection.get(ids=[chunk_id], include=["ids", "documents", "metadatas"])
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Chroma get failed: {e}")
 
-    docs = got.get("documents", [])
-    metas = got.get("metadatas", [])
-    if not docs:
-        raise HTTPException(status_code=404, detail="Chunk not found")
-
-    doc = docs[0]
-    meta = metas[0] or {}
-
-    # Build evidence
+def build_detailed_payload(doc, meta):
     evidence_text = f"""
 Raw Log:
 {doc}
 
 Metadata:
-{json.dumps(meta, indent=2)}
+{json.dumps(meta, indent=2, sort_keys=True)}
 """
 
     # Deep review prompt
@@ -316,7 +617,7 @@ Evidence:
 {evidence_text}
 """
 
-    payload = {
+    return {
         "model": LLM_MODEL,
         "messages": [
             {"role": "system", "content": "You are a senior Kubernetes SRE providing deep technical insight."},
@@ -326,9 +627,585 @@ Evidence:
         "max_tokens": 1400
     }
 
-    resp = requests.post(LLM_URL, json=payload, timeout=240)
+
+async def call_llm(payload: dict, timeout: float, wait: bool = False):
+    try:
+        resp = await llm.chat(payload, timeout=timeout, wait=wait)
+    except LLMBusyError as e:
+        raise HTTPException(503, f"LLM busy: {e}")
+    except Exception as e:
+        raise HTTPException(500, f"LLM call failed: {e}")
+
     if resp.status_code != 200:
-        raise HTTPException(status_code=500, detail=resp.text)
+        raise HTTPException(500, f"LLM error: {resp.text}")
+
+    return extract_llm_text(resp.json())
+
+
+async def cached_llm(kind: str, evidence, payload: dict, timeout: float, force_refresh: bool = False):
+    """Return (text, cached): serve from the diagnosis cache unless force_refresh."""
+    fp = diagnosis_fingerprint(evidence, payload)
+    if not force_refresh:
+        hit = await run_in_threadpool(diagnosis_cache.get, fp)
+        if hit is not None:
+            return hit, True
+
+    started = time.perf_counter()
+    text = await call_llm(payload, timeout)
+    await run_in_threadpool(diagnosis_cache.put, fp, kind, text, time.perf_counter() - started)
+    return text, False
+
+
+# ============================================================
+# /diagnose ENDPOINT — UPDATED WITH STRICT OUTPUT FORMAT
+# ============================================================
+# Async so a slow generation waits on the event loop, not on a threadpool
+# worker that /logs needs; Chroma and embedding calls still run in the pool.
+@app.post("/diagnose")
+async def diagnose(req: DiagnoseByIdRequest):
+
+    if not req.chunk_id and not req.query:
+        raise HTTPException(400, "Either chunk_id or query must be provided.")
+
+    evidence = await run_in_threadpool(gather_evidence, req)
+    payload, packing = await run_in_threadpool(build_diagnose_payload, evidence)
+    text, cached = await cached_llm("diagnose", evidence, payload, LLM_TIMEOUT, req.force_refresh)
+
+    return {
+        "diagnosis": text,
+        "evidence": evidence,
+        "matched": len(evidence),
+        "packed": packing,
+        "cached": cached
+    }
 
-    output = extract_llm_text(resp.json())
-    return {"detailed_review": output}
+
+@app.post("/detailed")
+async def detailed_review(req: dict):
+
+    chunk_id = req.get("chunk_id")
+    if not chunk_id:
+        raise HTTPException(status_code=400, detail="chunk_id required")
+
+    # Fetch same chunk
+    chunk = await run_in_threadpool(fetch_chunk, chunk_id)
+
+    output, cached = await cached_llm(
+        "detailed",
+        [chunk],
+        build_detailed_payload(chunk["doc"], chunk["meta"]),
+        LLM_DETAILED_TIMEOUT,
+        bool(req.get("force_refresh")),
+    )
+    return {"detailed_review": output, "cached": cached}
+
+
+# ============================================================
+# Streaming (SSE) variants of /diagnose and /detailed
+# ============================================================
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(data: dict, event: str = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+
+async def relay_llm_stream(kind: str, evidence, payload: dict, timeout: float, key: str,
+                           extra: dict, force_refresh: bool = False):
+    """
+    Relay LLM tokens as `data: {"token": ...}` events, then one `event: done`
+    carrying the full text under `key` plus `extra`, or one `event: error`.
+    A diagnosis-cache hit is sent as a single token followed by `done`.
+    """
+    fp = diagnosis_fingerprint(evidence, payload)
+    if not force_refresh:
+        hit = await run_in_threadpool(diagnosis_cache.get, fp)
+        if hit is not None:
+            yield sse_event({"token": hit})
+            yield sse_event({key: hit, **extra, "cached": True}, event="done")
+            return
+
+    parts = []
+    started = time.perf_counter()
+    try:
+        async for delta in llm.stream_chat(payload, timeout):
+            parts.append(delta)
+            yield sse_event({"token": delta})
+    except LLMBusyError as e:
+        yield sse_event({"detail": f"LLM busy: {e}"}, event="error")
+        return
+    except LLMError as e:
+        yield sse_event({"detail": f"LLM error: {e}"}, event="error")
+        return
+    except Exception as e:
+        yield sse_event({"detail": f"LLM call failed: {e}"}, event="error")
+        return
+
+    text = "".join(parts)
+    if text:
+        await run_in_threadpool(diagnosis_cache.put, fp, kind, text, time.perf_counter() - started)
+    yield sse_event({key: text, **extra, "cached": False}, event="done")
+
+
+@app.post("/diagnose/stream")
+async def diagnose_stream(req: DiagnoseByIdRequest):
+
+    if not req.chunk_id and not req.query:
+        raise HTTPException(400, "Either chunk_id or query must be provided.")
+
+    # Retrieval errors (404/500) are raised before the stream opens
+    evidence = await run_in_threadpool(gather_evidence, req)
+    payload, packing = await run_in_threadpool(build_diagnose_payload, evidence)
+
+    return StreamingResponse(
+        relay_llm_stream(
+            "diagnose",
+            evidence,
+            payload,
+            LLM_TIMEOUT,
+            "diagnosis",
+            {"evidence": evidence, "matched": len(evidence), "packed": packing},
+            req.force_refresh,
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@app.post("/detailed/stream")
+async def detailed_review_stream(req: dict):
+
+    chunk_id = req.get("chunk_id")
+    if not chunk_id:
+        raise HTTPException(status_code=400, detail="chunk_id required")
+
+    chunk = await run_in_threadpool(fetch_chunk, chunk_id)
+
+    return StreamingResponse(
+        relay_llm_stream(
+            "detailed",
+            [chunk],
+            build_detailed_payload(chunk["doc"], chunk["meta"]),
+            LLM_DETAILED_TIMEOUT,
+            "detailed_review",
+            {},
+            bool(req.get("force_refresh")),
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+# ============================================================
+# /diagnose/incident — map (per cluster) + reduce
+# ============================================================
+def gather_incident_evidence(req: IncidentRequest):
+    where, filters = retrieval_filters(req.namespace, req.pod, req.reason, req.min_severity, req.since, req.until)
+    k = max(1, min(req.k, INCIDENT_MAX_CHUNKS))
+    try:
+        if req.query and req.query.strip():
+            hits, _ = search_hits(req.query.strip(), k, where, filters, check_mode(req.mode))
+            return [{"id": h["id"], "doc": h["doc"], "meta": h["meta"]} for h in hits]
+        _, items = index_page(filters, "start_ts", True, k, 0) or fetch_page(where, "start_ts", True, k, 0)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Search failed: {e}")
+    return [{"id": it["id"], "doc": it["document"], "meta": it["metadata"]} for it in items]
+
+
+def build_map_payload(cluster):
+    """Short per-cluster summary prompt; evidence packed into INCIDENT_MAP_TOKEN_BUDGET."""
+    evidence_text, _ = pack_evidence(
+        cluster["evidence"], evidence_header, INCIDENT_MAP_TOKEN_BUDGET, count_llm_tokens
+    )
+    prompt = f"""
+Summarize what these related AKS events show. They share a namespace, node and time window.
+
+{incident.cluster_label(cluster)}
+
+Respond in at most 6 lines:
+- What failed and where (pods / node)
+- The most likely cause, citing the REASON values seen
+- Whether it looks like a cause or a symptom of something else
+
+Events:
+
+{evidence_text}
+""".strip()
+    return {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are an expert Kubernetes incident analyst. Be brief and factual."},
+            {"role": "user", "content": prompt},
+        ],
+        "max_tokens": 300,
+        "temperature": 0.2,
+    }
+
+
+def section_text(section) -> str:
+    first, last = section["groups"]
+    tag = f"[{first}]" if first == last else f"[{first}–{last}]"
+    return f"{tag} {section['label']}\n{section['summary'].strip()}"
+
+
+def pack_sections(sections, budget: int):
+    """
+    Split summary sections into consecutive runs of at most `budget` tokens
+    (count_llm_tokens). A run always takes two sections when it can, so every
+    combine stage shrinks the list.
+    """
+    counts = count_llm_tokens([section_text(s) for s in sections])
+    runs, used = [], 0
+    for section, n in zip(sections, counts):
+        if runs and (used + n <= budget or len(runs[-1]) < 2):
+            runs[-1].append(section)
+            used += n
+        else:
+            runs.append([section])
+            used = n
+    return runs
+
+
+def build_combine_payload(sections):
+    """Fold several group summaries into one, for reduce prompts that would go over budget."""
+    text = "\n\n".join(section_text(s) for s in sections)
+    prompt = f"""
+Combine these summaries of related groups of AKS events into one summary.
+
+Respond in at most 8 lines. Keep the namespace, node and pod names, the REASON
+values and the group numbers, and say which group looks like the cause.
+
+{text}
+""".strip()
+    return {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are an expert Kubernetes incident analyst. Be brief and factual."},
+            {"role": "user", "content": prompt},
+        ],
+        "max_tokens": 400,
+        "temperature": 0.2,
+    }
+
+
+def build_reduce_payload(sections):
+    """Final prompt over group summaries that fit INCIDENT_REDUCE_TOKEN_BUDGET (pack_sections)."""
+    text = "\n\n".join(section_text(s) for s in sections)
+    groups = sections[-1]["groups"][1]
+    prompt = f"""
+You are an Azure Kubernetes troubleshooting assistant.
+
+Below are summaries of {groups} groups of related events from one incident.
+Find the root cause that explains them together and which groups are only symptoms.
+
+You MUST respond **ONLY** in the EXACT format below:
+
+Root Cause
+<short one-line reason>
+
+Affected Components
+<namespaces, nodes, pods – list only relevant ones>
+
+Timeline
+<ordered list of what happened, citing group numbers>
+
+Recommended Fix
+<step-by-step instructions + kubectl commands>
+
+Severity (0–10)
+
+---
+
+{text}
+""".strip()
+    return {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are an expert Kubernetes incident analyst."},
+            {"role": "user", "content": prompt},
+        ],
+        "max_tokens": 1000,
+        "temperature": 0.5,
+    }
+
+
+async def run_queued(specs):
+    """Submit job specs to the batch queue and wait for all of them; 503 if they do not fit."""
+    try:
+        _, plan = batch_jobs.submit_batch(specs)
+    except QueueFullError as e:
+        raise HTTPException(503, f"Batch queue full: {e}", headers={"Retry-After": "30"})
+    jobs = [job for job, _ in plan]
+    await asyncio.gather(*(job.done.wait() for job in jobs))
+    return jobs
+
+
+@app.post("/diagnose/incident")
+async def diagnose_incident(req: IncidentRequest):
+    """
+    Incident-wide diagnosis over up to INCIDENT_MAX_CHUNKS chunks: related
+    chunks are clustered by namespace/node/time window, each cluster is
+    summarized by its own small "map" prompt, and one "reduce" prompt
+    combines the summaries. Maps run on the batch job queue (BATCH_WORKERS),
+    so a large incident queues there instead of filling every LLM slot.
+    Summaries over INCIDENT_REDUCE_TOKEN_BUDGET are first combined in stages
+    (runs of summaries folded into one), so the reduce prompt stays small too.
+
+    Map and reduce outputs go through the diagnosis cache, so re-running
+    after new events only regenerates the clusters whose chunks changed.
+    """
+    evidence = await run_in_threadpool(gather_incident_evidence, req)
+    if not evidence:
+        raise HTTPException(404, "No chunks match this incident query.")
+
+    clusters = incident.cluster_chunks(evidence, req.window_minutes * 60, INCIDENT_CLUSTER_CHUNKS)
+    specs = await run_in_threadpool(
+        lambda: [job_spec("incident_map", c["evidence"], build_map_payload(c), {}, req.force_refresh)
+                 for c in clusters]
+    )
+
+    started = time.perf_counter()
+    jobs = await run_queued(specs)
+    map_seconds = time.perf_counter() - started
+
+    sections, report = [], []
+    for c, job in zip(clusters, jobs):
+        row = {"key": c["key"], "namespace": c["namespace"], "node": c["node"], "start": c["start"],
+               "end": c["end"], "pods": c["pods"], "chunk_ids": [e["id"] for e in c["evidence"]]}
+        if job.status == "error":
+            row["error"] = job.error
+        else:
+            row.update(summary=job.result, cached=job.cached)
+            n = len(sections) + 1
+            sections.append({"groups": (n, n), "label": incident.cluster_label(c), "summary": job.result})
+        report.append(row)
+
+    if not sections:
+        raise HTTPException(503, f"Every map summary failed: {report[0]['error']}")
+
+    # fold runs of summaries until one reduce prompt holds them all
+    stages = 0
+    runs = await run_in_threadpool(pack_sections, sections, INCIDENT_REDUCE_TOKEN_BUDGET)
+    while len(runs) > 1:
+        stages += 1
+        folds = [run for run in runs if len(run) > 1]  # a lone section passes through as is
+        specs = await run_in_threadpool(
+            lambda: [job_spec("incident_combine", [{"id": section_text(s), "doc": s["summary"]} for s in run],
+                              build_combine_payload(run), {}, req.force_refresh)
+                     for run in folds]
+        )
+        jobs = iter(await run_queued(specs))
+        sections = []
+        for run in runs:
+            if len(run) == 1:
+                sections.append(run[0])
+                continue
+            job = next(jobs)
+            if job.status == "error":
+                raise HTTPException(503, f"Combining map summaries failed: {job.error}")
+            sections.append({"groups": (run[0]["groups"][0], run[-1]["groups"][1]),
+                             "label": "combined summary", "summary": job.result})
+        runs = await run_in_threadpool(pack_sections, sections, INCIDENT_REDUCE_TOKEN_BUDGET)
+
+    # the summaries are the reduce step's evidence: unchanged clusters -> cached reduce
+    reduce_evidence = [{"id": section_text(s), "doc": s["summary"]} for s in sections]
+    payload = build_reduce_payload(sections)
+    text, cached = await cached_llm("incident_reduce", reduce_evidence, payload, LLM_TIMEOUT, req.force_refresh)
+
+    return {
+        "diagnosis": text,
+        "cached": cached,
+        "matched": len(evidence),
+        "clusters": report,
+        "map_cached": sum(1 for r in report if r.get("cached")),
+        "map_failed": sum(1 for r in report if "error" in r),
+        "map_seconds": round(map_seconds, 3),
+        "combine_stages": stages,
+    }
+
+
+# ============================================================
+# /diagnose/batch — job queue in front of the LLM
+# ============================================================
+async def run_batch_job(job):
+    # queued jobs wait for a slot as long as it takes: the queue is the backpressure
+    started = time.perf_counter()
+    text = await call_llm(job.payload, LLM_TIMEOUT, wait=True)
+    await run_in_threadpool(diagnosis_cache.put, job.fingerprint, job.kind, text, time.perf_counter() - started)
+    return text
+
+
+batch_jobs = JobQueue(run_batch_job, workers=BATCH_WORKERS, max_queued=BATCH_QUEUE_SIZE, retention=BATCH_JOB_TTL)
+
+
+def job_spec(kind: str, evidence, payload: dict, extra: dict, force_refresh: bool = False):
+    """JobQueue.submit_batch spec for one prompt, with its diagnosis-cache hit if any."""
+    fp = diagnosis_fingerprint(evidence, payload)
+    return {
+        "kind": kind,
+        "fingerprint": fp,
+        "evidence": evidence,
+        "payload": payload,
+        "extra": extra,
+        "cached": None if force_refresh else diagnosis_cache.get(fp),
+    }
+
+
+def prepare_batch_item(req: DiagnoseByIdRequest):
+    """Evidence, prompt and fingerprint of one batch item, plus its diagnosis-cache hit if any."""
+    evidence = gather_evidence(req)
+    payload, packing = build_diagnose_payload(evidence)
+    extra = {"evidence": evidence, "matched": len(evidence), "packed": packing}
+    return job_spec("diagnose", evidence, payload, extra, req.force_refresh)
+
+
+@app.post("/diagnose/batch")
+async def diagnose_batch(req: DiagnoseBatchRequest):
+    """
+    Enqueue one diagnosis per chunk id / query and return job ids at once.
+    Items with identical evidence and prompt (also across batches, while in
+    flight) share one generation; cache hits finish immediately. Poll
+    /diagnose/jobs/{job_id} or stream /diagnose/batch/{batch_id}/stream.
+    """
+    items = [DiagnoseByIdRequest(chunk_id=c, force_refresh=req.force_refresh) for c in req.chunk_ids]
+    items += [DiagnoseByIdRequest(query=q, k=req.k, mode=req.mode, min_severity=req.min_severity,
+                                  since=req.since, until=req.until, force_refresh=req.force_refresh)
+              for q in req.queries]
+    if not items:
+        raise HTTPException(400, "chunk_ids or queries must be provided.")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(413, f"At most {BATCH_MAX_ITEMS} items per batch.")
+    check_mode(req.mode)
+
+    # Retrieval runs concurrently in the threadpool; a missing chunk fails only its own item
+    prepared = await asyncio.gather(
+        *(run_in_threadpool(prepare_batch_item, item) for item in items), return_exceptions=True
+    )
+    try:
+        batch_id, plan = batch_jobs.submit_batch([None if isinstance(p, Exception) else p for p in prepared])
+    except QueueFullError as e:
+        raise HTTPException(503, f"Batch queue full: {e}", headers={"Retry-After": "30"})
+
+    out = []
+    for item, prep, entry in zip(items, prepared, plan):
+        row = {"chunk_id": item.chunk_id} if item.chunk_id else {"query": item.query}
+        if entry is None:
+            row.update({"job_id": None, "status": "error", "error": getattr(prep, "detail", None) or str(prep)})
+        else:
+            job, coalesced = entry
+            row.update({"job_id": job.id, "status": job.status, "coalesced": coalesced, "cached": job.cached})
+        out.append(row)
+
+    return {"batch_id": batch_id, "jobs": out, "queue": batch_jobs.stats()}
+
+
+@app.get("/diagnose/jobs/{job_id}")
+def diagnose_job(job_id: str):
+    job = batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found (unknown or expired).")
+    return job.to_dict()
+
+
+@app.get("/diagnose/batch/{batch_id}")
+def diagnose_batch_status(batch_id: str):
+    jobs = batch_jobs.batch(batch_id)
+    if jobs is None:
+        raise HTTPException(404, "Batch not found (unknown or expired).")
+    return {"batch_id": batch_id, "jobs": [j.to_dict() for j in jobs]}
+
+
+@app.get("/diagnose/batch/{batch_id}/stream")
+async def diagnose_batch_stream(batch_id: str):
+    """One `event: job` per finished job (result or error), then `event: done`."""
+    jobs = batch_jobs.batch(batch_id)
+    if jobs is None:
+        raise HTTPException(404, "Batch not found (unknown or expired).")
+
+    async def events():
+        failed = 0
+        async for job in batch_jobs.as_completed(jobs):
+            failed += job.status == "error"
+            yield sse_event(job.to_dict(), event="job")
+        yield sse_event({"batch_id": batch_id, "jobs": len(jobs), "failed": failed}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# Run from lifespan() at startup / shutdown
+def warm_up_models():
+    # Background load: /logs without q serves immediately, the first q waits for the model
+    if EMBED_WARMUP:
+        embeddings.registry.warm_up(EMBED_MODEL)
+    if LLM_TOKENIZER:
+        token_counter.tokenizers.warm_up(LLM_TOKENIZER)
+
+
+async def close_clients():
+    await batch_jobs.aclose()
+    await llm.aclose()
+
+
+# ============================================================
+# /facets ENDPOINT
+# ============================================================
+# Counts are maintained by the indexer in the manifest; the API keeps the last
+# snapshot in memory and only re-reads it when the manifest's version moves.
+_facets = {"etag": None, "body": None}
+_facets_lock = threading.Lock()
+
+
+def load_facets():
+    conn = index_manifest.open_readonly(MANIFEST_PATH)
+    if conn is None:  # nothing indexed yet (or not since the facet tables were added)
+        return '"empty"', {"total": 0, "namespaces": [], "pods": {}, "reasons": [], "severity": []}
+    try:
+        etag = index_manifest.facets_etag(conn)
+        if etag != _facets["etag"]:
+            with _facets_lock:
+                if etag != _facets["etag"]:
+                    body = index_manifest.facets(conn)
+                    _facets.update(etag=etag, body=body)
+        return _facets["etag"], _facets["body"]
+    finally:
+        conn.close()
+
+
+@app.get("/facets")
+def get_facets(request: Request, response: Response):
+    """
+    Namespaces, pods per namespace, reasons and the severity histogram with
+    chunk counts, for the dashboard filter dropdowns. Send the returned ETag
+    as If-None-Match to get a 304 while nothing was re-indexed.
+    """
+    etag, body = load_facets()
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return body
+
+
+# ============================================================
+# /metrics ENDPOINT
+# ============================================================
+@app.get("/metrics")
+def metrics():
+    return {
+        "embed_cache": query_cache.stats(),
+        "embed_model": {
+            "name": EMBED_MODEL,
+            "ready": embeddings.registry.is_ready(EMBED_MODEL),
+            "collection": embeddings.collection_model(collection)[0],
+            **embeddings.registry.status(),
+        },
+        "llm_tokenizer": {
+            "name": LLM_TOKENIZER,
+            "ready": token_counter.tokenizers.is_ready(LLM_TOKENIZER),
+            "errors": token_counter.tokenizers.status()["errors"],
+        },
+        "diagnosis_cache": diagnosis_cache.stats(),
+        "batch_jobs": batch_jobs.stats(),
+    }
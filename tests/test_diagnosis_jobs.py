@@ -0,0 +1,88 @@
+# tests/test_diagnosis_jobs.py
+"""
+JobQueue.submit_batch coalesces identical generations onto one job and
+leaves no trace of a batch it rejects with QueueFullError.
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from diagnosis_jobs import JobQueue, QueueFullError  # noqa: E402
+
+
+def spec(fp: str, cached: str = None, kind: str = "diagnose"):
+    return {"kind": kind, "fingerprint": fp, "evidence": [fp], "payload": {"fp": fp},
+            "extra": {"chunk_id": fp}, "cached": cached}
+
+
+class GatedRun:
+    """run(job) that blocks until released, recording each generation."""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.calls = []
+
+    async def __call__(self, job):
+        self.calls.append(job.fingerprint)
+        await self.gate.wait()
+        return f"diagnosis of {job.fingerprint}"
+
+
+def test_submit_batch_coalesces_identical_generations():
+    async def scenario():
+        run = GatedRun()
+        q = JobQueue(run, workers=2)
+        _, plan = q.submit_batch([spec("a"), spec("a"), None, spec("b"), spec("c", cached="from cache")])
+        (a, a_new), (a2, a2_coalesced), skipped, (b, _), (c, _) = plan
+        assert skipped is None
+        assert a is a2 and not a_new and a2_coalesced
+        assert a.requests == 2
+        assert c.status == "done" and c.cached and c.result == "from cache"
+
+        # a later batch joins the generation that is already queued or running
+        await asyncio.sleep(0)
+        batch_id, plan = q.submit_batch([spec("a"), spec("d")])
+        assert plan[0] == (a, True) and a.requests == 3
+        assert [j.fingerprint for j in q.batch(batch_id)] == ["a", "d"]
+
+        run.gate.set()
+        done = [j async for j in q.as_completed([a, b, plan[1][0]])]
+        await q.aclose()
+        return run, q, a, done
+
+    run, q, a, done = asyncio.run(scenario())
+    assert sorted(run.calls) == ["a", "b", "d"]  # one generation per fingerprint
+    assert a.to_dict()["diagnosis"] == "diagnosis of a" and a.payload is None
+    assert {j.status for j in done} == {"done"}
+    assert q.stats()["generated"] == 3 and q.stats()["coalesced"] == 2
+
+
+def test_queue_full_rolls_back_the_whole_batch():
+    async def scenario():
+        run = GatedRun()
+        q = JobQueue(run, workers=1, max_queued=2)
+        _, [(a, _)] = q.submit_batch([spec("a")])
+        await asyncio.sleep(0)  # the only worker picks a up and blocks on it
+        assert a.status == "running"
+
+        with pytest.raises(QueueFullError):
+            q.submit_batch([spec("a"), spec("b"), spec("c"), spec("d")])
+        assert a.requests == 1 and q.coalesced == 0
+        assert q.stats()["queued"] == 0
+        assert set(q._inflight) == {"a"} and len(q._jobs) == 1
+
+        # the slots are still free for a batch that fits
+        _, plan = q.submit_batch([spec("b"), spec("c")])
+        assert [coalesced for _, coalesced in plan] == [False, False]
+        assert q.stats()["queued"] == 2
+
+        run.gate.set()
+        _ = [j async for j in q.as_completed([a] + [j for j, _ in plan])]
+        await q.aclose()
+        return run
+
+    assert asyncio.run(scenario()).calls == ["a", "b", "c"]
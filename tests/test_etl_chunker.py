@@ -0,0 +1,91 @@
+# tests/test_etl_chunker.py
+"""
+The bounded-memory ETL paths must chunk exactly like make_chunks() over the
+same raw files: same incidents, ids, windows and context lines.
+"""
+import sys
+import json
+import random
+import importlib
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+PODS = [("web", "api-1"), ("web", "api-2"), ("payments", "api-1"), ("kube-system", "coredns-0")]
+MESSAGES = ["GET /healthz 200", "request served", "cache refreshed"]
+ERRORS = ["OOMKilled", "CrashLoopBackOff", "ERROR: upstream timeout"]
+
+
+@pytest.fixture
+def etl(tmp_path, monkeypatch):
+    # etl_chunker creates its output directory at import: keep it in tmp_path
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("etl_chunker")
+
+
+def write_raw(raw_dir: Path, files: int = 6, lines: int = 120, seed: int = 7):
+    """Raw log files whose incidents span files; many lines share a timestamp."""
+    rng = random.Random(seed)
+    raw_dir.mkdir()
+    paths = []
+    for f in range(files):
+        path = raw_dir / f"node-{f}.json"
+        with path.open("w", encoding="utf-8") as fh:
+            for i in range(lines):
+                ns, pod = rng.choice(PODS)
+                minute = rng.randrange(0, 600)
+                message = rng.choice(ERRORS if rng.random() < 0.08 else MESSAGES)
+                fh.write(json.dumps({
+                    "timestamp": f"2024-05-01T{minute // 60:02d}:{minute % 60:02d}:{rng.choice((0, 30)):02d}Z",
+                    "namespace": ns,
+                    "pod": pod,
+                    "node": f"node-{f}",
+                    "message": f"{message} #{f}-{i}",
+                }) + "\n")
+        paths.append(path)
+    return paths
+
+
+def batch_chunks(etl, paths):
+    logs = sorted((r for p in paths for r in etl.iter_file(p)), key=lambda r: r["timestamp"])
+    return etl.make_chunks(logs)
+
+
+def ordered(chunks):
+    # stream_chunks yields an incident when it closes; make_chunks sorts by start
+    return sorted(chunks, key=lambda c: (c["start_ts"], c["id"]))
+
+
+@pytest.mark.parametrize("run_size", [7, 50, 100_000])
+def test_stream_chunks_match_make_chunks(etl, tmp_path, run_size):
+    paths = write_raw(tmp_path / "raw")
+    expected = batch_chunks(etl, paths)
+    assert len(expected) > 20
+
+    streamed = list(etl.stream_chunks(etl.iter_logs(paths, run_size=run_size)))
+    assert ordered(streamed) == ordered(expected)
+
+
+def test_merge_runs_multi_pass_keeps_source_order(etl, tmp_path):
+    # more runs than the fan-in: intermediate merges must still be stable on equal timestamps
+    paths = write_raw(tmp_path / "raw", files=10)
+    records = [r for p in paths for r in etl.iter_file(p)]
+    runs = etl.sorted_runs(iter(records), tmp_path, run_size=25)
+    assert len(runs) > 9
+
+    merged = etl.merge_runs([lambda p=p: etl._read_run(p) for p in runs], tmp_path, fan_in=3)
+    expected = sorted(records, key=lambda r: r["timestamp"])
+    assert [r["message"] for r in merged] == [r["message"] for r in expected]
+    assert not list(tmp_path.glob("*.jsonl"))  # every spilled run was consumed and removed
+
+
+@pytest.mark.parametrize("workers,partitions", [(2, None), (3, 2)])
+def test_parallel_chunks_match_make_chunks(etl, tmp_path, workers, partitions):
+    # incidents cross file boundaries and pods share timestamps across workers
+    paths = write_raw(tmp_path / "raw", files=7)
+    expected = batch_chunks(etl, paths)
+
+    parallel = list(etl.parallel_chunks(paths, workers, partitions=partitions, run_size=20))
+    assert ordered(parallel) == ordered(expected)
@@ -0,0 +1,86 @@
+# tests/test_live_ingest.py
+"""
+LiveGroups keeps the newest copy of each event by parsed last_seen (relative
+or unparseable ages are oldest), trims and spans groups in time order, and
+evicts the least recently touched groups first, reloading them on return.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import parse_events  # noqa: E402
+from live_ingest import LiveGroups  # noqa: E402
+
+
+def event(pod: str, last_seen: str, message: str = "Back-off restarting failed container", ns: str = "web"):
+    return parse_events.finish_event({
+        "namespace": ns, "last_seen": last_seen, "type": "Warning",
+        "reason": "BackOff", "object": f"pod/{pod}", "message": message,
+    })
+
+
+def held(groups: LiveGroups, pod: str, ns: str = "web"):
+    return sorted((e["message"], e["last_seen"]) for e in groups.groups[(ns, f"pod/{pod}")].values())
+
+
+def test_newest_copy_wins_by_parsed_time():
+    groups = LiveGroups()
+    key = ("web", "pod/api-1")
+    assert groups.add([event("api-1", "2024-05-01T10:00:00Z")]) == {key}
+    # 10:30+02:00 is 08:30Z: older, although it sorts after "10:00:00Z" as a string
+    assert groups.add([event("api-1", "2024-05-01T10:30:00+02:00")]) == set()
+    # a relative age parses to the oldest time and never replaces a timestamp
+    assert groups.add([event("api-1", "5m")]) == set()
+    assert held(groups, "api-1") == [("Back-off restarting failed container", "2024-05-01T10:00:00Z")]
+
+    assert groups.add([event("api-1", "2024-05-01T10:00:01Z")]) == {key}
+    assert held(groups, "api-1") == [("Back-off restarting failed container", "2024-05-01T10:00:01Z")]
+
+
+def test_max_events_drops_the_oldest_by_parsed_time():
+    groups = LiveGroups(max_events=2)
+    groups.add([
+        event("api-1", "2024-05-01T09:00:00Z", message="second"),
+        event("api-1", "2024-05-01T10:30:00+02:00", message="first"),  # 08:30Z
+        event("api-1", "2024-05-01T09:30:00Z", message="third"),
+    ])
+    assert held(groups, "api-1") == [("second", "2024-05-01T09:00:00Z"), ("third", "2024-05-01T09:30:00Z")]
+
+
+def test_chunk_span_follows_parsed_time():
+    groups = LiveGroups()
+    touched = groups.add([
+        event("api-1", "2024-05-01T09:00:00Z", message="a"),
+        event("api-1", "2024-05-01T10:30:00+02:00", message="b"),  # 08:30Z
+        event("api-1", "<unknown>", message="c"),
+    ])
+    [chunk] = groups.chunks(touched)
+    assert (chunk["start_ts"], chunk["end_ts"]) == ("2024-05-01T10:30:00+02:00", "2024-05-01T09:00:00Z")
+
+
+def test_evicts_least_recently_touched_and_reloads():
+    loads = []
+
+    def load(key):
+        loads.append(key)
+        # what the index holds for a group that was flushed before
+        return [event("api-2", "2024-05-01T08:00:00Z", message="indexed")] if key == ("web", "pod/api-2") else []
+
+    groups = LiveGroups(load=load, max_groups=2)
+    groups.add([event("api-1", "2024-05-01T10:00:00Z")])
+    groups.add([event("api-2", "2024-05-01T10:00:00Z")])
+    groups.add([event("api-3", "2024-05-01T10:00:00Z")])
+    groups.add([event("api-1", "2024-05-01T10:05:00Z")])  # api-1 is now the most recent
+    assert groups.evict() == 1
+    assert list(groups.groups) == [("web", "pod/api-3"), ("web", "pod/api-1")]
+
+    # the evicted group comes back with its indexed history
+    groups.add([event("api-2", "2024-05-01T10:10:00Z")])
+    assert loads.count(("web", "pod/api-2")) == 2
+    assert held(groups, "api-2") == [
+        ("Back-off restarting failed container", "2024-05-01T10:10:00Z"),
+        ("indexed", "2024-05-01T08:00:00Z"),
+    ]
+    assert groups.evict() == 1
+    assert list(groups.groups) == [("web", "pod/api-1"), ("web", "pod/api-2")]
@@ -0,0 +1,80 @@
+# tests/test_near_dup.py
+"""
+find_duplicates() groups replica chunks that differ only in volatile tokens
+and keeps chunks of distinct pods, failures or namespaces apart.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import near_dup  # noqa: E402
+
+
+def replica(pod: str, ip: str, ts: str, count: int, reason: str = "BackOff", ns: str = "web",
+            probe: str = "connection refused"):
+    lines = [
+        f"NAMESPACE={ns} LAST_SEEN={ts} TYPE=Warning REASON={reason} OBJECT=pod/{pod} "
+        f"COUNT={count} MESSAGE=Back-off restarting failed container api in pod {pod}",
+        f"NAMESPACE={ns} LAST_SEEN={ts} TYPE=Warning REASON=Unhealthy OBJECT=pod/{pod} "
+        f"MESSAGE=Readiness probe failed: Get http://{ip}:8080/healthz: {probe}",
+        f"NAMESPACE={ns} LAST_SEEN={ts} TYPE=Normal REASON=Pulled OBJECT=pod/{pod} "
+        f"MESSAGE=Container image registry.local/api:1.4.2 already present on machine",
+    ]
+    lines += [
+        f"NAMESPACE={ns} LAST_SEEN={ts} TYPE=Normal REASON=Started OBJECT=pod/{pod} "
+        f"MESSAGE=Started container sidecar-{k} with args --port {9000 + k}"
+        for k in range(6)
+    ]
+    return "\n".join(lines)
+
+
+def test_replicas_merge_onto_most_severe_member():
+    items = [
+        ("web-pod/api-7c9f8d6b5-x2k4p", "web", 6, replica("api-7c9f8d6b5-x2k4p", "10.0.1.12", "2m", 14)),
+        ("web-pod/api-7c9f8d6b5-q8z7w", "web", 7, replica("api-7c9f8d6b5-q8z7w", "10.0.3.40", "5m", 3)),
+        ("web-pod/api-7c9f8d6b5-mn5tr", "web", 7, replica("api-7c9f8d6b5-mn5tr", "10.0.2.7", "2024-05-01T10:00:00Z", 9)),
+        # not a verbatim copy after normalization: matched by SimHash distance
+        ("web-pod/api-7c9f8d6b5-hj6vb", "web", 6, replica("api-7c9f8d6b5-hj6vb", "10.0.4.2", "1m", 2,
+                                                         probe="connection reset by peer")),
+    ]
+    assert near_dup.find_duplicates(items) == {
+        "web-pod/api-7c9f8d6b5-mn5tr": [
+            "web-pod/api-7c9f8d6b5-hj6vb", "web-pod/api-7c9f8d6b5-q8z7w", "web-pod/api-7c9f8d6b5-x2k4p",
+        ],
+    }
+
+
+def test_distinct_pods_and_namespaces_stay_apart():
+    items = [
+        ("web-pod/api-7c9f8d6b5-x2k4p", "web", 6, replica("api-7c9f8d6b5-x2k4p", "10.0.1.12", "2m", 14)),
+        # same workload in another namespace
+        ("staging-pod/api-7c9f8d6b5-x2k4p", "staging", 6,
+         replica("api-7c9f8d6b5-x2k4p", "10.0.1.12", "2m", 14, ns="staging")),
+        # another pod failing for another reason
+        ("web-pod/db-0", "web", 7, "\n".join([
+            "NAMESPACE=web LAST_SEEN=1m TYPE=Warning REASON=FailedMount OBJECT=pod/db-0 "
+            "MESSAGE=MountVolume.SetUp failed for volume pvc-data: timed out waiting for the condition",
+            "NAMESPACE=web LAST_SEEN=1m TYPE=Warning REASON=FailedScheduling OBJECT=pod/db-0 "
+            "MESSAGE=0/3 nodes are available: 3 node(s) had volume node affinity conflict",
+        ])),
+        # a different deployment: stable names are not volatile
+        ("web-pod/worker-5d8b7c9f4-x2k4p", "web", 6, replica("worker-5d8b7c9f4-x2k4p", "10.0.1.12", "2m", 14,
+                                                            reason="OOMKilled")),
+    ]
+    assert near_dup.find_duplicates(items) == {}
+
+
+def test_matches_do_not_chain(monkeypatch):
+    # b is 3 bits from a, c is 3 bits from b but 6 from a: c must open its own group
+    sigs = {"a": 0, "b": 0b111, "c": 0b111111}
+    monkeypatch.setattr(near_dup, "simhash", lambda norm: sigs[norm])
+    items = [(t, "web", 5, t) for t in ("a", "b", "c")]
+    assert near_dup.find_duplicates(items, max_distance=3) == {"a": ["b"]}
+
+
+def test_max_distance_must_fit_the_bands():
+    with pytest.raises(ValueError):
+        near_dup.find_duplicates([], max_distance=4, bands=4)
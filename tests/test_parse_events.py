@@ -0,0 +1,74 @@
+# tests/test_parse_events.py
+"""
+The --columnar path must produce the same chunks as group_into_chunks(),
+byte for byte, with and without a token budget.
+"""
+import sys
+import random
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("pandas")
+
+import parse_events  # noqa: E402
+from token_counter import estimate_tokens  # noqa: E402
+
+OBJECTS = ["pod/api-1", "pod/api-2", "pod/worker-0", "secretstore/vault", "node/aks-1", ""]  # parsers always set object
+REASONS = ["BackOff", "FailedMount", "Pulled", "ImagePullBackOff", "Scheduled", "", None]
+TYPES = ["Warning", "Normal", "", None]
+MESSAGES = [
+    "Back-off restarting failed container",
+    "MountVolume.SetUp failed for volume secrets",
+    "Successfully pulled image nginx:1.25 in 2.1s",
+    "Failed to pull image: ImagePullBackOff",
+    "Successfully assigned pod to aks-1",
+    "",
+    None,
+]
+
+
+def raw_rows(n: int = 400, seed: int = 3):
+    """Raw rows with repeats (COUNT=n lines), None/empty fields and non-pod objects."""
+    rng = random.Random(seed)
+    return [{
+        "namespace": rng.choice(["web", "payments", "", None]),
+        "last_seen": rng.choice(["2m", "5m", "2024-05-01T10:00:00Z", None]),
+        "type": rng.choice(TYPES),
+        "reason": rng.choice(REASONS),
+        "object": rng.choice(OBJECTS),
+        "message": rng.choice(MESSAGES),
+    } for _ in range(n)]
+
+
+def columnar_chunks(rows, **budget):
+    factors = {}
+    df = parse_events.finish_frame(parse_events.events_frame(rows), factors=factors)
+    return parse_events.group_frame_into_chunks(df, factors, **budget)
+
+
+def row_chunks(rows, **budget):
+    events = [parse_events.finish_event(dict(r)) for r in rows]
+    return parse_events.group_into_chunks(events, **budget)
+
+
+def test_columnar_matches_group_into_chunks():
+    rows = raw_rows()
+    expected = row_chunks(rows)
+    assert any("COUNT=" in c["context_text"] for c in expected)
+    assert columnar_chunks(rows) == expected
+
+
+@pytest.mark.parametrize("max_tokens", [40, 200])
+def test_columnar_matches_group_into_chunks_with_budget(max_tokens):
+    rows = raw_rows()
+    budget = {"max_tokens": max_tokens, "count_tokens": estimate_tokens}
+    expected = row_chunks(rows, **budget)
+    assert any(c["parts"] > 1 for c in expected)
+    assert columnar_chunks(rows, **budget) == expected
+
+
+def test_columnar_empty_frame():
+    assert columnar_chunks([]) == row_chunks([]) == []
@@ -0,0 +1,266 @@
+# tests/test_vector_backends.py
+"""
+The API must answer the same on VECTOR_BACKEND=chroma and VECTOR_BACKEND=numpy.
+
+Each backend gets its own working directory with a small index built by
+embed_index_events.index_chunks(); rag_api is imported fresh under that
+environment and exercised through FastAPI's TestClient. Embeddings come from
+a deterministic hashing encoder registered in the shared model registry, so
+no model is downloaded.
+"""
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import importlib
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import embeddings  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+BACKENDS = ("chroma", "numpy")
+FRESH_MODULES = ("rag_api", "embed_index_events", "vector_store")
+NAMESPACES = ("payments", "kube-system", "web")
+REASONS = ("BackOff", "FailedScheduling", "OOMKilling", "Pulled", "Unhealthy")
+
+
+class HashingEncoder:
+    """Bag-of-words feature hashing: same text, same vector, on every backend."""
+
+    dim = 64
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, convert_to_numpy=True, **kwargs):
+        single = isinstance(sentences, str)
+        out = []
+        for text in [sentences] if single else sentences:
+            v = np.zeros(self.dim, dtype=np.float32)
+            for word in re.findall(r"[a-z0-9]+", text.lower()):
+                v[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1.0
+            out.append(v / (np.linalg.norm(v) or 1.0))
+        out = np.array(out)
+        return out[0] if single else out
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+
+def sample_chunks():
+    chunks = []
+    for i in range(36):
+        ns = NAMESPACES[i % len(NAMESPACES)]
+        reason = REASONS[i % len(REASONS)]
+        pod = f"{ns}-api-{i % 4}"
+        chunks.append({
+            "id": f"{ns}-pod/{pod}-{i:02d}",
+            "namespace": ns,
+            "pod": pod,
+            "node": f"node-{i % 2}",
+            "object": f"pod/{pod}",
+            "reason": reason,
+            "severity_hint": 2 + i % 7,
+            "start_ts": f"2024-05-01T{i // 6:02d}:{(i * 7) % 60:02d}:00Z",
+            "end_ts": f"2024-05-01T{i // 6:02d}:{(i * 7) % 60:02d}:30Z",
+            # the filler run gives every chunk its own vector norm: no distance ties
+            "context_text": f"TYPE=Warning REASON={reason} OBJECT=pod/{pod} "
+                            f"MESSAGE={reason.lower()} event {i} on node-{i % 2}" + " detail" * i,
+        })
+    return chunks
+
+
+def replica_chunks():
+    """One Deployment's replicas failing the same way: near-duplicates for --dedup."""
+    chunks = []
+    for i, pod in enumerate(("checkout-5d8f7c9b4-x2kqz", "checkout-5d8f7c9b4-m7vtp", "checkout-5d8f7c9b4-q9wzr")):
+        chunks.append({
+            "id": f"web-pod/{pod}",
+            "namespace": "web",
+            "pod": pod,
+            "node": "node-0",
+            "object": f"pod/{pod}",
+            "reason": "BackOff",
+            "severity_hint": 6 + (i == 1),
+            "start_ts": f"2024-05-01T07:0{i}:00Z",
+            "end_ts": f"2024-05-01T07:0{i}:30Z",
+            "context_text": f"TYPE=Warning REASON=BackOff OBJECT=pod/{pod} "
+                            f"MESSAGE=back-off restarting failed container checkout in pod {pod}",
+        })
+    return chunks
+
+
+@contextmanager
+def serve(backend: str, workdir: Path, monkeypatch, chunks=None, dedup: bool = False):
+    """TestClient for rag_api on `backend`, over an index built in `workdir`."""
+    monkeypatch.chdir(workdir)
+    monkeypatch.setenv("VECTOR_BACKEND", backend)
+    # absolute: chromadb caches clients by path, and every test has its own directory
+    monkeypatch.setenv("CHROMA_PATH", str(workdir / "chroma_store"))
+    monkeypatch.setenv("EMBED_WARMUP", "0")
+    monkeypatch.setenv("LLM_TOKENIZER", "")
+    monkeypatch.setitem(embeddings.registry._models, embeddings.DEFAULT_MODEL, HashingEncoder())
+
+    # module-level config (paths, backend) is read at import: import under this env
+    for name in FRESH_MODULES:
+        sys.modules.pop(name, None)
+    try:
+        embed_index_events = importlib.import_module("embed_index_events")
+        monkeypatch.setattr(embed_index_events, "PERSIST_DIR", workdir / "chroma_store")
+        src = workdir / "chunks.jsonl"
+        src.write_text("".join(json.dumps(c) + "\n" for c in chunks or sample_chunks()), encoding="utf-8")
+        embed_index_events.index_chunks(src, vector_backend=backend, dedup=dedup)
+
+        rag_api = importlib.import_module("rag_api")
+        assert rag_api.VECTOR_BACKEND == backend
+        with TestClient(rag_api.app) as c:
+            c.rag_api = rag_api
+            yield c
+    finally:
+        for name in FRESH_MODULES:
+            sys.modules.pop(name, None)
+
+
+@pytest.fixture(params=BACKENDS)
+def client(request, tmp_path, monkeypatch):
+    with serve(request.param, tmp_path, monkeypatch) as c:
+        yield c
+
+
+# (params) for GET /logs; every response must match across backends
+LOGS_QUERIES = [
+    {},
+    {"limit": 5, "offset": 3},
+    {"namespace": "Payments"},
+    {"namespace": "web", "sort_by": "pod", "order": "asc"},
+    {"reason": "backoff", "sort_by": "severity"},
+    {"min_severity": 6, "sort_by": "start_ts", "order": "asc"},
+    {"since": "2024-05-01T02:00:00Z", "until": "2024-05-01T04:00:00Z", "sort_by": "id"},
+    {"q": "oomkilling event", "mode": "vector", "limit": 5},
+    {"q": "oomkilling event", "mode": "vector", "namespace": "kube-system", "min_severity": 4},
+    {"q": "unhealthy node-1", "mode": "hybrid", "sort_by": "relevance", "limit": 8},
+    {"q": "failedscheduling", "mode": "lexical", "pod": "web-api-1"},
+]
+
+
+def snapshot(client):
+    out = {}
+    for params in LOGS_QUERIES:
+        r = client.get("/logs", params=params)
+        assert r.status_code == 200, (params, r.text)
+        out[json.dumps(params, sort_keys=True)] = r.json()
+    facets = client.get("/facets")
+    assert facets.status_code == 200, facets.text
+    out["facets"] = facets.json()
+    return out
+
+
+def test_logs_filters(client):
+    body = client.get("/logs", params={"namespace": "Payments", "min_severity": 5, "limit": 100}).json()
+    assert body["count"] == len(body["items"]) > 0
+    assert all(it["metadata"]["namespace"] == "payments" for it in body["items"])
+    assert all(it["metadata"]["severity"] >= 5 for it in body["items"])
+
+    page = client.get("/logs", params={"sort_by": "start_ts", "order": "asc", "limit": 4, "offset": 2}).json()
+    assert page["count"] == 36
+    starts = [it["metadata"]["start_epoch"] for it in page["items"]]
+    assert len(starts) == 4 and starts == sorted(starts)
+
+
+def test_vector_search(client):
+    params = {"q": "oomkilling event", "mode": "vector", "sort_by": "relevance", "limit": 5}
+    body = client.get("/logs", params=params).json()
+    assert len(body["items"]) == 5
+    assert body["items"][0]["metadata"]["reason"] == "OOMKilling"
+    distances = [it["distance"] for it in body["items"]]
+    assert distances == sorted(distances)
+
+    filtered = client.get("/logs", params={"q": "oomkilling", "mode": "vector", "namespace": "web"}).json()
+    assert filtered["items"] and all(it["metadata"]["namespace"] == "web" for it in filtered["items"])
+
+
+def test_facets(client):
+    r = client.get("/facets")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["total"] == 36
+    assert {f["name"]: f["count"] for f in body["namespaces"]} == {ns: 12 for ns in NAMESPACES}
+    assert client.get("/facets", headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+
+
+def test_backends_agree(tmp_path, monkeypatch):
+    snapshots = {}
+    for backend in BACKENDS:
+        workdir = tmp_path / backend
+        workdir.mkdir()
+        with monkeypatch.context() as mp, serve(backend, workdir, mp) as c:
+            snapshots[backend] = snapshot(c)
+
+    chroma, numpy_ = snapshots["chroma"], snapshots["numpy"]
+    assert chroma.keys() == numpy_.keys()
+    for key in chroma:
+        if key == "facets":
+            assert chroma[key] == numpy_[key]
+            continue
+        a, b = chroma[key], numpy_[key]
+        assert a["count"] == b["count"], key
+        assert [it["id"] for it in a["items"]] == [it["id"] for it in b["items"]], key
+        for x, y in zip(a["items"], b["items"]):
+            if x.get("distance") is not None:
+                assert x["distance"] == pytest.approx(y["distance"], abs=1e-4), key
+
+
+def test_facets_during_index_write(client):
+    # the indexer holds the manifest's write lock mid-batch; /facets still answers at once
+    writer = sqlite3.connect("index_manifest.db")
+    try:
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute("UPDATE manifest_meta SET value = value WHERE key = 'epoch'")
+        started = time.perf_counter()
+        r = client.get("/facets")
+        assert r.status_code == 200, r.text
+        assert r.json()["total"] == 36
+        assert time.perf_counter() - started < 1.0
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_dedup_members_stay_filterable(backend, tmp_path, monkeypatch):
+    replicas = replica_chunks()
+    with serve(backend, tmp_path, monkeypatch, sample_chunks() + replicas, dedup=True) as c:
+        rep, *members = sorted(replicas, key=lambda ch: (-ch["severity_hint"], ch["id"]))
+        got = c.rag_api.collection.get(ids=[rep["id"]])
+        assert got["metadatas"][0]["dup_count"] == 3
+
+        # members are stubs: their pod filters, facets and ids still resolve
+        member = members[0]
+        body = c.get("/logs", params={"pod": member["pod"]}).json()
+        assert [it["id"] for it in body["items"]] == [member["id"]]
+        assert body["items"][0]["metadata"]["dup_of"] == rep["id"]
+        web_pods = {p["name"] for p in c.get("/facets").json()["pods"]["web"]}
+        assert {ch["pod"] for ch in replicas} <= web_pods
+        assert c.rag_api.fetch_chunk(member["id"])["doc"] == member["context_text"]
+
+        # relevance search returns one copy of the group
+        group = {ch["id"] for ch in replicas}
+        for mode in ("vector", "lexical", "hybrid"):
+            params = {"q": "back-off restarting failed container checkout", "mode": mode, "limit": 10}
+            ids = [it["id"] for it in c.get("/logs", params=params).json()["items"]]
+            assert len(group & set(ids)) == 1, (mode, ids)
+
+
+def test_missing_lexical_index(client):
+    # readers never create the index: lexical search is empty, listings fall back to the collection
+    Path("lexical_index.db").unlink()
+    body = client.get("/logs", params={"q": "failedscheduling", "mode": "lexical"}).json()
+    assert body["items"] == []
+    page = client.get("/logs", params={"sort_by": "start_ts", "order": "asc", "limit": 4}).json()
+    assert page["count"] == 36 and len(page["items"]) == 4
+    assert not Path("lexical_index.db").exists()
@@ -0,0 +1,62 @@
+# tests/test_vector_store.py
+"""
+NumpyCollection persistence: each persist() is one generation (vector file
+plus rows) that readers in other processes pick up whole, and many small
+upserts build the same store as one large one.
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from vector_store import NumpyCollection  # noqa: E402
+
+DIM = 8
+
+
+def unit(i: int):
+    v = np.zeros(DIM, dtype=np.float32)
+    v[i % DIM] = 1.0
+    return v
+
+
+def test_reader_pairs_rows_with_their_generation(tmp_path):
+    writer = NumpyCollection(tmp_path, "tst")
+    writer.upsert(ids=["a", "b"], embeddings=[unit(0), unit(1)], documents=["a0", "b1"], metadatas=[{"n": 0}, {"n": 1}])
+    writer.persist()
+
+    reader = NumpyCollection(tmp_path, "tst")
+    assert reader.query([unit(0)], n_results=1)["ids"] == [["a"]]
+
+    # same row count, new vectors and documents: the reader must not mix generations
+    writer.upsert(ids=["a", "b"], embeddings=[unit(2), unit(0)], documents=["a2", "b0"], metadatas=[{"n": 2}, {"n": 0}])
+    writer.persist()
+    assert len(list(tmp_path.glob("embeddings*.npy"))) == 1
+
+    got = reader.query([unit(0)], n_results=1, include=["documents", "distances"])
+    assert got["ids"] == [["b"]] and got["documents"] == [["b0"]]
+    assert got["distances"][0][0] == np.float32(0.0)
+
+
+def test_batched_upserts_match_one_upsert(tmp_path):
+    ids = [f"id-{i:03d}" for i in range(300)]
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(len(ids), DIM)).astype(np.float32)
+
+    one = NumpyCollection(tmp_path / "one", "tst")
+    one.upsert(ids=ids, embeddings=vectors, documents=ids)
+    many = NumpyCollection(tmp_path / "many", "tst")
+    for i in range(0, len(ids), 7):
+        many.upsert(ids=ids[i:i + 7], embeddings=vectors[i:i + 7], documents=ids[i:i + 7])
+    many.delete(ids=["id-010"])
+    many.upsert(ids=["id-010"], embeddings=vectors[10:11], documents=["id-010"])
+    assert len(many._buf) < 2 * len(many._ids)  # capacity grows geometrically, not per batch
+
+    for store in (one, many):
+        store.persist()
+    one, many = NumpyCollection(tmp_path / "one", "tst"), NumpyCollection(tmp_path / "many", "tst")
+    assert many.count() == one.count() == len(ids)
+    queries = rng.normal(size=(5, DIM)).astype(np.float32)
+    assert many.query(queries, n_results=10)["ids"] == one.query(queries, n_results=10)["ids"]
@@ -0,0 +1,21 @@
+# timestamps.py
+# The one ISO-8601 parser shared by raw logs (etl_chunker.py), chunk and
+# event times (embed_index_events.py, live_ingest.py, incident.py) and the
+# since/until query parameters (rag_api.py). Naive times are taken as UTC.
+from datetime import datetime, timezone
+
+
+def parse_iso(ts) -> datetime:
+    """ISO-8601 timestamp ("Z" suffix allowed) -> aware datetime; ValueError if unparseable."""
+    dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def to_epoch(ts) -> float:
+    """Epoch seconds of a number or ISO-8601 timestamp; 0.0 when missing or unparseable."""
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    try:
+        return parse_iso(ts).timestamp()
+    except ValueError:
+        return 0.0
@@ -0,0 +1,73 @@
+# token_counter.py
+# Token counts for chunk budgets (parse_events.py, live_ingest.py: the
+# embedding model's tokenizer) and prompt budgets (rag_api.py: the LLM's).
+# A counter maps a list of texts to their counts, special tokens excluded.
+from embeddings import ModelRegistry
+
+CHARS_PER_TOKEN = 4  # estimate used when no tokenizer is configured or it cannot be loaded
+
+
+def estimate_tokens(texts):
+    return [(len(t) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN for t in texts]
+
+
+def from_pretrained(name: str):
+    # transformers is only imported here, on the first load
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(name)
+
+
+# Tokenizers for long-running processes: loaded once, in the background
+tokenizers = ModelRegistry(loader=from_pretrained, kind="tokenizer")
+
+
+def load_tokenizer(name: str):
+    """Hugging Face tokenizer for `name`, or None (with a warning) when it cannot be loaded."""
+    if not name:
+        return None
+    try:
+        return from_pretrained(name)
+    except Exception as e:
+        print(f"[WARN] Tokenizer {name} unavailable ({e.__class__.__name__}); estimating tokens as chars/{CHARS_PER_TOKEN}")
+        return None
+
+
+def counter_for(tok):
+    """texts -> token counts under `tok`; chars/4 estimates when tok is None."""
+    if tok is None:
+        return estimate_tokens
+
+    def count(texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        return [len(ids) for ids in tok(texts, add_special_tokens=False)["input_ids"]]
+
+    return count
+
+
+def load_token_counter(name: str):
+    """texts -> token counts under `name`'s tokenizer ("" or unavailable = chars/4 estimate)."""
+    return counter_for(load_tokenizer(name))
+
+
+def lazy_token_counter(name: str):
+    """
+    Counter that never waits on a load: chars/4 estimates until `tokenizers`
+    has `name`. The first call starts a background load if nothing else
+    (tokenizers.warm_up at startup) has; a failed load keeps the estimate.
+    """
+    started = False
+
+    def count(texts):
+        nonlocal started
+        if not name:
+            return estimate_tokens(texts)
+        if not tokenizers.is_ready(name):
+            if not started:
+                started = True
+                tokenizers.warm_up(name)
+            return estimate_tokens(texts)
+        return counter_for(tokenizers.get(name))(texts)
+
+    return count
@@ -35,3 +35,27 @@ def extract_llm_text(llm_out: dict):
 
     # ---- 5) Fallback to readable JSON ----
     return json.dumps(llm_out, indent=2)
+
+
+def extract_stream_delta(chunk: dict) -> str:
+    """Text carried by one streamed completion chunk ("" for role/stop-only chunks)."""
+
+    if not isinstance(chunk, dict):
+        return ""
+
+    # ---- OpenAI / LM Studio / GPT4All chat.completions stream ----
+    if chunk.get("choices"):
+        choice = chunk["choices"][0]
+        delta = choice.get("delta") or {}
+        if delta.get("content"):
+            return delta["content"]
+        # legacy completions stream
+        if choice.get("text"):
+            return choice["text"]
+        return ""
+
+    # ---- Ollama-style {"response": "..."} stream ----
+    if isinstance(chunk.get("response"), str):
+        return chunk["response"]
+
+    return ""
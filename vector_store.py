@@ -0,0 +1,387 @@
+# vector_store.py
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# "chroma" (default) or "numpy" (in-process brute force over a memory-mapped .npy)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_BACKENDS = ("chroma", "numpy")
+NUMPY_STORE_PATH = Path(os.getenv("NUMPY_STORE_PATH", "./vector_store"))
+
+NUMERIC_OPS = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}
+
+
+def open_collection(name: str, backend: str = VECTOR_BACKEND, chroma_path=None, numpy_path=None):
+    """The named collection on `backend`; both expose the same Chroma-style API."""
+    if backend == "numpy":
+        return NumpyCollection(Path(numpy_path or NUMPY_STORE_PATH) / name, name)
+    if backend != "chroma":
+        raise ValueError(f"unknown vector backend {backend!r} (expected one of {VECTOR_BACKENDS})")
+    import chromadb
+    return chromadb.PersistentClient(path=str(chroma_path)).get_or_create_collection(name=name)
+
+
+def drop_collection(name: str, backend: str = VECTOR_BACKEND, chroma_path=None, numpy_path=None):
+    """Delete the named collection and return a fresh, empty one."""
+    if backend == "numpy":
+        NumpyCollection(Path(numpy_path or NUMPY_STORE_PATH) / name, name).reset()
+    else:
+        import chromadb
+        chromadb.PersistentClient(path=str(chroma_path)).delete_collection(name)
+    return open_collection(name, backend, chroma_path, numpy_path)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def _is_number(v) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+class NumpyCollection:
+    """
+    Chroma-compatible collection held in process memory.
+
+    Embeddings are L2-normalized float32 rows in `embeddings-<generation>.npy`
+    (memory-mapped on load); ids, documents and metadata live in a parallel
+    SQLite table with the same row order, which names the vector file of its
+    generation. Queries are one matrix multiply over the rows that pass
+    the `where` mask, then argpartition for the top-k. Distances are squared L2
+    between unit vectors (2 - 2 * cosine), so smaller is nearer, as in Chroma.
+
+    Writes stay in memory until persist(); readers in other processes pick up
+    a persisted store on their next call.
+    """
+
+    def __init__(self, path: Path, name: str):
+        self.path = Path(path)
+        self.name = name
+        self._lock = threading.RLock()
+        self._loaded_stamp = None
+        self._dirty = False
+        self._clear()
+        self._reload_if_changed()
+
+    # ---- storage ----
+    @property
+    def _db(self) -> Path:
+        return self.path / "rows.db"
+
+    def _clear(self):
+        self._ids = []
+        self._docs = []
+        self._metas = []
+        self._row = {}
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._buf = self._alive_buf = None  # upsert growth buffers; _vectors/_alive are views
+        self._collection_meta = None
+        self._columns = {}
+
+    def _stamp(self):
+        try:
+            return self._db.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _reload_if_changed(self):
+        with self._lock:
+            stamp = self._stamp()
+            if stamp is None or stamp == self._loaded_stamp or self._dirty:
+                return
+            conn = sqlite3.connect(self._db)
+            try:
+                # one read transaction: the rows and the vector file of the same generation
+                conn.execute("BEGIN")
+                rows = conn.execute("SELECT id, document, metadata FROM rows ORDER BY row").fetchall()
+                meta = dict(conn.execute("SELECT key, value FROM collection").fetchall())
+            finally:
+                conn.close()
+            try:
+                # stores written before generations keep one embeddings.npy
+                vectors = np.load(self.path / (meta.get("vectors") or "embeddings.npy"), mmap_mode="r")
+            except FileNotFoundError:
+                return  # a newer generation replaced it meanwhile; pick that up on the next call
+            self._clear()
+            self._ids = [r[0] for r in rows]
+            self._docs = [r[1] for r in rows]
+            self._metas = [json.loads(r[2]) if r[2] else None for r in rows]
+            self._row = {cid: i for i, cid in enumerate(self._ids)}
+            self._vectors = vectors
+            self._alive = np.ones(len(rows), dtype=bool)
+            self._collection_meta = json.loads(meta["metadata"]) if meta.get("metadata") else None
+            self._loaded_stamp = stamp
+
+    def persist(self):
+        """
+        Write live rows (compacted, in order) as a new generation: the vectors
+        go to a fresh .npy first, then one SQLite transaction swaps in the rows
+        together with that file's name, so readers see either generation whole.
+        """
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            keep = np.flatnonzero(self._alive)
+            vectors = np.ascontiguousarray(self._vectors[keep]) if len(keep) else np.zeros((0, 0), np.float32)
+            npy = self.path / f"embeddings-{uuid.uuid4().hex}.npy"
+            np.save(npy, vectors)
+
+            conn = sqlite3.connect(self._db)
+            try:
+                conn.execute("CREATE TABLE IF NOT EXISTS rows (row INTEGER PRIMARY KEY, id TEXT UNIQUE, document TEXT, metadata TEXT)")
+                conn.execute("CREATE TABLE IF NOT EXISTS collection (key TEXT PRIMARY KEY, value TEXT)")
+                conn.execute("DELETE FROM rows")
+                conn.executemany(
+                    "INSERT INTO rows (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                    [(n, self._ids[i], self._docs[i], json.dumps(self._metas[i]) if self._metas[i] is not None else None)
+                     for n, i in enumerate(keep)]
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO collection (key, value) VALUES (?, ?)",
+                    [("metadata", json.dumps(self._collection_meta) if self._collection_meta else None),
+                     ("vectors", npy.name)]
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            # older generations: readers that already mapped one keep their mapping
+            for old in self.path.glob("embeddings*.npy"):
+                if old != npy:
+                    old.unlink(missing_ok=True)
+
+            self._ids = [self._ids[i] for i in keep]
+            self._docs = [self._docs[i] for i in keep]
+            self._metas = [self._metas[i] for i in keep]
+            self._row = {cid: i for i, cid in enumerate(self._ids)}
+            self._vectors = np.load(npy, mmap_mode="r")
+            self._alive = np.ones(len(keep), dtype=bool)
+            self._buf = self._alive_buf = None
+            self._columns = {}
+            self._dirty = False
+            self._loaded_stamp = self._stamp()
+
+    def reset(self):
+        with self._lock:
+            for p in [self._db, *self.path.glob("embeddings*.npy")]:
+                p.unlink(missing_ok=True)
+            self._clear()
+            self._dirty = False
+            self._loaded_stamp = None
+
+    # ---- collection metadata ----
+    @property
+    def metadata(self):
+        self._reload_if_changed()
+        return dict(self._collection_meta) if self._collection_meta else None
+
+    def modify(self, name: str = None, metadata: dict = None):
+        with self._lock:
+            if metadata is not None:
+                self._collection_meta = dict(metadata)
+            self.persist()
+
+    # ---- where filters ----
+    def _column(self, key: str):
+        col = self._columns.get(key)
+        if col is None:
+            col = np.array([m.get(key) if m else None for m in self._metas], dtype=object)
+            self._columns[key] = col
+        return col
+
+    def _numeric_column(self, key: str):
+        col = self._columns.get(("num", key))
+        if col is None:
+            col = np.array([v if _is_number(v) else np.nan for v in self._column(key)], dtype=np.float64)
+            self._columns[("num", key)] = col
+        return col
+
+    def _mask(self, where) -> np.ndarray:
+        mask = self._alive.copy()
+        if where:
+            mask &= self._eval(where)
+        return mask
+
+    def _eval(self, where: dict) -> np.ndarray:
+        n = len(self._ids)
+        out = np.ones(n, dtype=bool)
+        for key, cond in where.items():
+            if key == "$and":
+                for sub in cond:
+                    out &= self._eval(sub)
+            elif key == "$or":
+                any_ = np.zeros(n, dtype=bool)
+                for sub in cond:
+                    any_ |= self._eval(sub)
+                out &= any_
+            elif isinstance(cond, dict):
+                for op, value in cond.items():
+                    out &= self._compare(key, op, value)
+            else:
+                out &= self._compare(key, "$eq", cond)
+        return out
+
+    def _compare(self, key: str, op: str, value) -> np.ndarray:
+        if op in NUMERIC_OPS:
+            with np.errstate(invalid="ignore"):
+                return NUMERIC_OPS[op](self._numeric_column(key), value)
+        col = self._column(key)
+        present = np.array([v is not None for v in col], dtype=bool)
+        if op == "$eq":
+            return present & (col == value)
+        if op == "$ne":
+            return present & (col != value)
+        if op in ("$in", "$nin"):
+            hit = np.array([v in value for v in col], dtype=bool)
+            return present & (hit if op == "$in" else ~hit)
+        raise ValueError(f"unsupported where operator {op!r}")
+
+    # ---- reads ----
+    def count(self) -> int:
+        self._reload_if_changed()
+        return int(self._alive.sum())
+
+    def _result(self, rows, include, extra=None):
+        res = {"ids": [self._ids[i] for i in rows]}
+        if "documents" in include:
+            res["documents"] = [self._docs[i] for i in rows]
+        if "metadatas" in include:
+            res["metadatas"] = [self._metas[i] for i in rows]
+        if "embeddings" in include:
+            res["embeddings"] = np.asarray(self._vectors[rows]) if len(rows) else np.zeros((0, 0), np.float32)
+        res.update(extra or {})
+        return res
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        self._reload_if_changed()
+        with self._lock:
+            if ids is not None:
+                rows = [self._row[c] for c in ids if c in self._row and self._alive[self._row[c]]]
+                if where:
+                    mask = self._mask(where)
+                    rows = [i for i in rows if mask[i]]
+            else:
+                rows = np.flatnonzero(self._mask(where)).tolist()
+            start = offset or 0
+            rows = rows[start: start + limit if limit is not None else None]
+            return self._result(rows, include)
+
+    def query(self, query_embeddings, n_results: int = 10, where=None,
+              include=("documents", "metadatas", "distances")):
+        self._reload_if_changed()
+        with self._lock:
+            candidates = np.flatnonzero(self._mask(where))
+            queries = _normalize(query_embeddings)
+            out = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+            if len(candidates) == 0 or n_results <= 0:
+                return {k: [[] for _ in queries] for k in ["ids", *include]}
+
+            # one matrix multiply for all queries against the filtered rows
+            if len(candidates) == len(self._ids):
+                sims = queries @ self._vectors.T
+            else:
+                sims = queries @ self._vectors[candidates].T
+            k = min(n_results, len(candidates))
+            for row_sims in sims:
+                top = np.argpartition(-row_sims, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+                top = top[np.argsort(-row_sims[top], kind="stable")]
+                rows = candidates[top].tolist()
+                res = self._result(rows, include, {"distances": (2.0 - 2.0 * row_sims[top]).tolist()})
+                for key in out:
+                    if key in res:
+                        out[key].append(res[key])
+            return {k: v for k, v in out.items() if k == "ids" or k in include}
+
+    # ---- writes ----
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        vectors = _normalize(embeddings)
+        with self._lock:
+            self._reload_if_changed()
+            if len(self._ids) and vectors.shape[1] != self._vectors.shape[1]:
+                raise ValueError(
+                    f"embedding dimension {vectors.shape[1]} does not match collection dimension {self._vectors.shape[1]}"
+                )
+            new_rows = []
+            for j, cid in enumerate(ids):
+                doc = documents[j] if documents is not None else None
+                meta = metadatas[j] if metadatas is not None else None
+                i = self._row.get(cid)
+                if i is not None and self._alive[i]:
+                    self._docs[i], self._metas[i] = doc, meta
+                    new_rows.append((i, j))
+                else:
+                    self._row[cid] = len(self._ids)
+                    self._ids.append(cid)
+                    self._docs.append(doc)
+                    self._metas.append(meta)
+                    new_rows.append((self._row[cid], j))
+
+            if len(self._ids) > len(self._vectors):
+                self._grow(len(self._ids), vectors.shape[1])
+            elif not self._vectors.flags.writeable:
+                self._vectors = np.array(self._vectors)  # copy-on-write off the memory map
+            rows, src = zip(*new_rows) if new_rows else ((), ())
+            self._vectors[list(rows)] = vectors[list(src)]
+            self._columns = {}
+            self._dirty = True
+
+    add = upsert
+
+    def _grow(self, n: int, dim: int):
+        """
+        Extend _vectors/_alive to n rows. They are views of buffers that double
+        when full, so a long run of upsert batches copies each row O(1) times.
+        """
+        have = len(self._vectors)
+        if self._buf is None or len(self._buf) < n:
+            cap = max(n, 2 * have)
+            buf = np.zeros((cap, dim), np.float32)
+            alive = np.zeros(cap, dtype=bool)
+            if have:
+                buf[:have] = self._vectors
+                alive[:have] = self._alive
+            self._buf, self._alive_buf = buf, alive
+        self._alive_buf[have:n] = True
+        self._vectors = self._buf[:n]
+        self._alive = self._alive_buf[:n]
+
+    def update(self, ids, metadatas=None, documents=None, embeddings=None):
+        with self._lock:
+            self._reload_if_changed()
+            rows = [self._row.get(c) for c in ids]
+            for j, i in enumerate(rows):
+                if i is None or not self._alive[i]:
+                    continue
+                if metadatas is not None:
+                    self._metas[i] = metadatas[j]
+                if documents is not None:
+                    self._docs[i] = documents[j]
+            if embeddings is not None:
+                keep = [(i, j) for j, i in enumerate(rows) if i is not None and self._alive[i]]
+                if keep:
+                    if not self._vectors.flags.writeable:
+                        self._vectors = np.array(self._vectors)
+                    vectors = _normalize(embeddings)
+                    self._vectors[[i for i, _ in keep]] = vectors[[j for _, j in keep]]
+            self._columns = {}
+            self._dirty = True
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            self._reload_if_changed()
+            rows = set()
+            if ids is not None:
+                rows.update(self._row[c] for c in ids if c in self._row)
+            if where:
+                rows.update(np.flatnonzero(self._mask(where)).tolist())
+            for i in rows:
+                self._alive[i] = False
+                self._row.pop(self._ids[i], None)
+            self._dirty = True